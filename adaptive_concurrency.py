@@ -0,0 +1,190 @@
+"""
+Adaptive Concurrency Controller for Theta Data Downloader
+
+AIMD-style controller that picks how many requests the download engine
+keeps in flight against a Theta Terminal. It reacts to time-to-first-byte,
+aggregate throughput (MB/s), timeouts and HTTP errors, and remembers the
+learned level per terminal host between runs.
+"""
+
+import json
+import logging
+import os
+import statistics
+import time
+from datetime import datetime
+from typing import Optional
+
+from retry_policy import TIMEOUT, SERVER_ERROR, RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_FILE = "results/adaptive_concurrency.json"
+
+# Failure kinds that mean the terminal is overloaded and we should back off
+OVERLOAD_ERRORS = {TIMEOUT, SERVER_ERROR, RATE_LIMITED}
+
+
+class AdaptiveConcurrencyController:
+    """
+    Additive-increase / multiplicative-decrease concurrency limit.
+
+    The controller only decides ``limit``; TerminalPool hands out at most
+    that many request slots on its terminal and feeds every settled request
+    back through record_success/record_failure. After every window of
+    completed requests the controller compares throughput and TTFB with the
+    previous window:
+
+    - throughput improved (and TTFB is not inflated): add one slot
+    - TTFB inflated well past the best seen, or throughput dropped: remove one
+    - timeouts / 5xx / 429: cut the limit multiplicatively straight away
+    """
+
+    INCREASE_GAIN = 1.05       # Window throughput must beat the last by 5% to grow
+    DECREASE_LOSS = 0.90       # Dropping 10% below the last window shrinks
+    TTFB_INFLATION = 2.0       # Median TTFB this far over the best seen means queueing
+    TTFB_SLACK = 0.5           # ...and at least this many seconds over it (ignores jitter)
+    BACKOFF_FACTOR = 0.7       # Multiplicative decrease on overload errors
+    PROBE_AFTER_STEADY = 3     # Probe one slot higher after this many flat windows
+
+    def __init__(self, host: str, min_limit: int, max_limit: int,
+                 initial: Optional[int] = None,
+                 state_file: str = DEFAULT_STATE_FILE):
+        self.host = host
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.state_file = state_file
+
+        learned = self._load_learned_limit()
+        start = learned if learned is not None else (initial or self.min_limit)
+        self.limit = self._clamp(start)
+
+        self.best_ttfb = None
+        self.prev_throughput = None
+        self.steady_windows = 0
+        self._reset_window()
+
+        source = "learned" if learned is not None else "initial"
+        print(f"🧠 Adaptive concurrency for {host}: starting at {self.limit} "
+              f"({source}, range {self.min_limit}-{self.max_limit})")
+
+    def _clamp(self, value: int) -> int:
+        return max(self.min_limit, min(self.max_limit, int(value)))
+
+    def _reset_window(self):
+        self.window_start = time.time()
+        self.window_bytes = 0
+        self.window_ttfbs = []
+        self.window_completions = 0
+
+    # ------------------------------------------------------------------
+    # Feedback
+    # ------------------------------------------------------------------
+
+    def record_success(self, ttfb: Optional[float], nbytes: int):
+        """Feed back one completed request."""
+        if ttfb is not None:
+            self.window_ttfbs.append(ttfb)
+        self.window_bytes += nbytes
+        self.window_completions += 1
+        if self.window_completions >= max(self.limit, 4):
+            self._end_window()
+
+    def record_failure(self, kind: str):
+        """Feed back one failed request; overload errors cut the limit."""
+        if kind not in OVERLOAD_ERRORS:
+            return
+        new_limit = self._clamp(self.limit * self.BACKOFF_FACTOR)
+        if new_limit == self.limit and self.limit > self.min_limit:
+            new_limit = self.limit - 1
+        self._set_limit(new_limit, f"{kind}")
+        # Start a fresh measurement at the lower level
+        self.prev_throughput = None
+        self.steady_windows = 0
+        self._reset_window()
+
+    def _end_window(self):
+        elapsed = time.time() - self.window_start
+        throughput = self.window_bytes / elapsed / 1024 / 1024 if elapsed > 0 else 0.0
+        median_ttfb = statistics.median(self.window_ttfbs) if self.window_ttfbs else None
+        if median_ttfb is not None and (self.best_ttfb is None or median_ttfb < self.best_ttfb):
+            self.best_ttfb = median_ttfb
+
+        reason = None
+        new_limit = self.limit
+        if (median_ttfb is not None and self.best_ttfb
+                and median_ttfb > self.best_ttfb * self.TTFB_INFLATION
+                and median_ttfb - self.best_ttfb > self.TTFB_SLACK):
+            new_limit = self.limit - 1
+            reason = f"TTFB {median_ttfb:.2f}s vs best {self.best_ttfb:.2f}s"
+        elif self.prev_throughput is None or throughput >= self.prev_throughput * self.INCREASE_GAIN:
+            new_limit = self.limit + 1
+            reason = f"throughput {throughput:.1f} MB/s"
+        elif throughput < self.prev_throughput * self.DECREASE_LOSS:
+            new_limit = self.limit - 1
+            reason = f"throughput fell to {throughput:.1f} MB/s from {self.prev_throughput:.1f}"
+        else:
+            self.steady_windows += 1
+            if self.steady_windows >= self.PROBE_AFTER_STEADY:
+                new_limit = self.limit + 1
+                reason = f"probing after {self.steady_windows} steady windows"
+
+        if self._clamp(new_limit) != self.limit:
+            self.steady_windows = 0
+            self._set_limit(self._clamp(new_limit), reason)
+        self.prev_throughput = throughput
+        self._reset_window()
+
+    def _set_limit(self, new_limit: int, reason: str):
+        if new_limit == self.limit:
+            return
+        direction = "⬆️" if new_limit > self.limit else "⬇️"
+        # WARNING so it shows at the default LOG_LEVEL, drawn above the progress bar
+        logger.warning(f"{direction}  Concurrency {self.limit} → {new_limit} on {self.host} ({reason})")
+        self.limit = new_limit
+        self.save()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _load_state(self) -> dict:
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.warning(f"Could not load adaptive concurrency state: {e}")
+        return {}
+
+    def _load_learned_limit(self) -> Optional[int]:
+        entry = self._load_state().get(self.host)
+        return entry.get("limit") if entry else None
+
+    def save(self):
+        """Persist the current limit for this terminal host."""
+        state = self._load_state()
+        state[self.host] = {
+            "limit": self.limit,
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        directory = os.path.dirname(self.state_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            temp_path = self.state_file + ".tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(state, f, indent=2)
+            os.replace(temp_path, self.state_file)
+        except Exception as e:
+            logger.warning(f"Could not save adaptive concurrency state: {e}")
+
+    def get_status_summary(self) -> dict:
+        return {
+            "host": self.host,
+            "current_concurrency": self.limit,
+            "min_concurrency": self.min_limit,
+            "max_concurrency": self.max_limit,
+            "best_ttfb": self.best_ttfb,
+            "last_throughput_mbps": self.prev_throughput,
+        }
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Mock Theta Terminal for Benchmarks
+
+Local aiohttp server that mimics the parts of the Theta Terminal REST API
+the downloader uses, serving synthetic option quote CSV:
+
+- /v3/option/history/quote   streamed CSV body of a configurable size
+                             (rounded up to a complete row)
+- /v3/option/list/expirations
+- /stats                     requests served and peak concurrency seen
+
+Per-request latency (time to first byte), a per-connection bandwidth cap
+and a concurrency limit make it behave like a loaded terminal. Requests
+beyond the limit queue by default, as the real terminal does, or get a 429
+with --reject-over-limit.
+
+Usage:
+    python benchmarks/mock_terminal.py --port 25510 --body-mb 40 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import time
+import zlib
+
+from aiohttp import web
+
+HEADER = ("symbol,expiration,strike,right,timestamp,bid_size,bid_exchange,bid,"
+          "bid_condition,ask_size,ask_exchange,ask,ask_condition\n")
+EXPIRATIONS = ["2025-01-17", "2025-02-21", "2025-03-21", "2025-06-20", "2025-12-19"]
+WRITE_SIZE = 64 * 1024
+
+
+class MockTerminal:
+    """Synthetic quote server with latency, bandwidth and concurrency knobs."""
+
+    def __init__(self, body_mb=4.0, latency=0.1, bandwidth_mbps=0.0, max_concurrent=8,
+                 reject_over_limit=False, size_jitter=0.0, no_data_every=0):
+        """
+        Args:
+            body_mb: Body size of a day in MB
+            latency: Seconds before the first byte of each response
+            bandwidth_mbps: Per-connection cap in MB/s (0 = unlimited)
+            max_concurrent: Requests processed at once; the rest wait
+            reject_over_limit: Answer 429 instead of queueing over the limit
+            size_jitter: Vary day sizes by up to this fraction (deterministic per date)
+            no_data_every: Answer 472 for every Nth date (0 = never)
+        """
+        self.body_bytes = int(body_mb * 1024 * 1024)
+        self.latency = latency
+        self.bandwidth = bandwidth_mbps * 1024 * 1024
+        self.max_concurrent = max_concurrent
+        self.reject_over_limit = reject_over_limit
+        self.size_jitter = size_jitter
+        self.no_data_every = no_data_every
+
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.peak_active = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.started = time.time()
+
+    def day_bytes(self, date):
+        if not self.size_jitter:
+            return self.body_bytes
+        # Stable pseudo-random factor in [-jitter, +jitter] per date
+        fraction = (zlib.crc32(date.encode()) % 2001) / 1000 - 1
+        return int(self.body_bytes * (1 + fraction * self.size_jitter))
+
+    def body_block(self, symbol, date):
+        """One block of CSV rows, repeated until the body size is reached."""
+        day = f"{date[:4]}-{date[4:6]}-{date[6:]}"
+        lines = []
+        for expiration in EXPIRATIONS:
+            for strike in (400.0, 405.0, 410.0):
+                for right in ("CALL", "PUT"):
+                    for minute in range(0, 390, 13):
+                        hour, mins = divmod(9 * 60 + 30 + minute, 60)
+                        lines.append(f"{symbol},{expiration},{strike:.3f},{right},"
+                                     f"{day}T{hour:02d}:{mins:02d}:00.000,"
+                                     f"12,47,1.23,50,9,47,1.27,50\n")
+        return "".join(lines).encode()
+
+    async def quote(self, request):
+        query = request.query
+        date = query.get("date", "")
+        self.requests += 1
+        if self.no_data_every and self.requests % self.no_data_every == 0:
+            return web.Response(status=472, text="No data for the specified timeframe")
+        if self.reject_over_limit and self._semaphore.locked():
+            return web.Response(status=429, text="Too many requests")
+
+        async with self._semaphore:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            try:
+                return await self._stream(request, query.get("symbol", "SYM"), date)
+            finally:
+                self.active -= 1
+
+    async def _stream(self, request, symbol, date):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response = web.StreamResponse()
+        response.content_type = "text/csv"
+        await response.prepare(request)
+
+        block = self.body_block(symbol, date)
+        remaining = self.day_bytes(date)
+        payload = HEADER.encode()
+        sent_at = time.monotonic()
+        while remaining > 0:
+            while len(payload) < WRITE_SIZE:
+                payload += block
+            size = min(WRITE_SIZE, remaining)
+            if size == remaining:
+                # End the body on a complete row, as the real terminal does
+                size = payload.index(b"\n", size - 1) + 1
+            piece, payload = payload[:size], payload[size:]
+            await response.write(piece)
+            remaining -= len(piece)
+            self.bytes_sent += len(piece)
+            if self.bandwidth:
+                # Pace the connection to the configured rate
+                sent_at += len(piece) / self.bandwidth
+                delay = sent_at - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        await response.write_eof()
+        return response
+
+    async def expirations(self, request):
+        symbol = request.query.get("symbol", "SYM")
+        rows = "".join(f"{symbol},{expiration}\n" for expiration in EXPIRATIONS)
+        return web.Response(text="symbol,expiration\n" + rows, content_type="text/csv")
+
+    async def stats(self, request):
+        return web.json_response({
+            "requests": self.requests,
+            "bytes_sent": self.bytes_sent,
+            "peak_active": self.peak_active,
+            "max_concurrent": self.max_concurrent,
+            "uptime": time.time() - self.started,
+        })
+
+    async def root(self, request):
+        return web.Response(text="mock theta terminal")
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get("/v3/option/history/quote", self.quote)
+        app.router.add_get("/v3/option/list/expirations", self.expirations)
+        app.router.add_get("/stats", self.stats)
+        app.router.add_get("/", self.root)
+        return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Theta Terminal for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=25510)
+    parser.add_argument("--body-mb", type=float, default=4.0)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0)
+    parser.add_argument("--max-concurrent", type=int, default=8)
+    parser.add_argument("--reject-over-limit", action="store_true")
+    parser.add_argument("--size-jitter", type=float, default=0.0)
+    parser.add_argument("--no-data-every", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    terminal = MockTerminal(
+        body_mb=args.body_mb,
+        latency=args.latency,
+        bandwidth_mbps=args.bandwidth_mbps,
+        max_concurrent=args.max_concurrent,
+        reject_over_limit=args.reject_over_limit,
+        size_jitter=args.size_jitter,
+        no_data_every=args.no_data_every,
+    )
+    print(f"🧪 Mock Theta Terminal on http://{args.host}:{args.port} "
+          f"({args.body_mb} MB days, {args.latency}s latency, "
+          f"{args.bandwidth_mbps or 'unlimited'} MB/s, {args.max_concurrent} concurrent)", flush=True)
+    web.run_app(terminal.make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Download Throughput Benchmarks
+
+Runs the real download engine (download_date_range and the
+multi_symbol_downloader shared-pool run) against benchmarks/mock_terminal.py
+and reports files/s, MB/s, p50/p99 request latency and TTFB, peak RSS,
+CPU and slot utilization.
+
+Each scenario runs in its own child process inside a scratch directory, so
+peak RSS and CPU belong to that scenario alone and no manifest, learned
+concurrency or no-data state leaks between runs. The mock terminal runs in
+a separate process and does not count towards the downloader's CPU.
+
+Usage:
+    python benchmarks/run_benchmarks.py                  # all scenarios
+    python benchmarks/run_benchmarks.py single_large     # selected scenarios
+    python benchmarks/run_benchmarks.py --save-baseline  # record a baseline
+    python benchmarks/run_benchmarks.py --compare        # diff against it
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+DEFAULT_BASELINE = REPO_DIR / "results" / "benchmark_baseline.json"
+
+SCENARIOS = {
+    "single_small": {
+        "description": "One symbol, many small days (per-request overhead)",
+        "runner": "date_range",
+        "symbols": ["QQQ"],
+        "start": "2024-01-02",
+        "end": "2024-03-28",
+        "mock": {"body_mb": 1, "latency": 0.05, "max_concurrent": 8},
+    },
+    "single_large": {
+        "description": "One symbol, large bandwidth-capped days (streaming and disk)",
+        "runner": "date_range",
+        "symbols": ["QQQ"],
+        "start": "2024-01-02",
+        "end": "2024-01-31",
+        "mock": {"body_mb": 24, "latency": 0.5, "bandwidth_mbps": 40,
+                 "max_concurrent": 8, "size_jitter": 0.3},
+    },
+    "slow_terminal": {
+        "description": "High TTFB and a terminal limited to 4 requests (queueing)",
+        "runner": "date_range",
+        "symbols": ["QQQ"],
+        "start": "2024-01-02",
+        "end": "2024-02-29",
+        "mock": {"body_mb": 2, "latency": 1.5, "max_concurrent": 4},
+    },
+    "multi_symbol": {
+        "description": "Four symbols through multi_symbol_downloader's shared pool",
+        "runner": "multi_symbol",
+        "symbols": ["AAA", "BBB", "CCC", "DDD"],
+        "start": "2024-01-02",
+        "end": "2024-02-29",
+        "mock": {"body_mb": 4, "latency": 0.2, "bandwidth_mbps": 80,
+                 "max_concurrent": 8, "size_jitter": 0.5, "no_data_every": 25},
+    },
+}
+
+# Metrics reported and compared; True means higher is better
+METRICS = [
+    ("files_per_s", "files/s", True),
+    ("mb_per_s", "MB/s", True),
+    ("latency_p50", "p50 s", False),
+    ("latency_p99", "p99 s", False),
+    ("ttfb_p50", "TTFB p50", False),
+    ("peak_rss_mb", "RSS MB", False),
+    ("cpu_percent", "CPU %", False),
+    ("slot_utilization", "slots %", True),
+    ("limit_utilization", "limit %", True),
+]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[int(round(fraction * (len(ordered) - 1)))]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and KB on Linux
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# ----------------------------------------------------------------------
+# Child: run one scenario against an already running mock terminal
+# ----------------------------------------------------------------------
+
+async def run_scenario(scenario, base_url):
+    """Run the download engine for one scenario and return its raw results."""
+    sys.path.insert(0, str(REPO_DIR))
+    import simple_downloader
+    import multi_symbol_downloader
+
+    simple_downloader.BASE_URL = base_url
+    simple_downloader.TERMINALS = [base_url]
+    simple_downloader.DISCOVER_BOUNDARIES = False
+    for name, value in scenario.get("settings", {}).items():
+        setattr(simple_downloader, name, value)
+
+    # Time every request the engine makes
+    requests = []
+    download_single_date = simple_downloader.download_single_date
+
+    async def timed_download(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await download_single_date(*args, **kwargs)
+        finally:
+            request_stats = args[6] if len(args) > 6 else kwargs.get("request_stats") or {}
+            requests.append((time.perf_counter() - started, request_stats.get("ttfb")))
+
+    simple_downloader.download_single_date = timed_download
+
+    output_dir = Path("output")
+    if scenario["runner"] == "multi_symbol":
+        msd = multi_symbol_downloader
+        msd.SYMBOLS = scenario["symbols"]
+        msd.START_DATE = scenario["start"]
+        msd.END_DATE = scenario["end"]
+        msd.BASE_OUTPUT_DIR = str(output_dir)
+        msd.DISCOVER_BOUNDARIES = False
+        msd.TERMINALS = [base_url]
+        summary = await msd.main()
+    else:
+        summary = await simple_downloader.download_date_range(
+            scenario["symbols"][0], scenario["start"], scenario["end"], "1m", output_dir
+        )
+
+    total_bytes = sum(path.stat().st_size for path in output_dir.rglob("*.csv"))
+    return summary, requests, total_bytes
+
+
+def child_main(name, base_url):
+    scenario = SCENARIOS[name]
+    wall_start = time.time()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        summary, requests, total_bytes = asyncio.run(run_scenario(scenario, base_url))
+    wall = time.time() - wall_start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    elapsed = summary["elapsed"] if summary else wall
+    workers = len(summary["worker_busy"]) if summary else 0
+    latencies = [latency for latency, _ in requests]
+    ttfbs = [ttfb for _, ttfb in requests if ttfb is not None]
+    result = {
+        "files": summary["successful"] if summary else 0,
+        "no_data": summary["no_data"] if summary else 0,
+        "failed": summary["failed"] if summary else 0,
+        "requests": len(requests),
+        "mb": total_bytes / 1024 / 1024,
+        "elapsed": elapsed,
+        "files_per_s": (summary["successful"] / elapsed) if summary and elapsed else 0.0,
+        "mb_per_s": total_bytes / 1024 / 1024 / elapsed if elapsed else 0.0,
+        "latency_p50": percentile(latencies, 0.50),
+        "latency_p99": percentile(latencies, 0.99),
+        "ttfb_p50": percentile(ttfbs, 0.50),
+        "ttfb_p99": percentile(ttfbs, 0.99),
+        "peak_rss_mb": peak_rss_mb(),
+        "cpu_percent": (usage.ru_utime + usage.ru_stime) / wall * 100 if wall else 0.0,
+        "workers": workers,
+        "slot_utilization": (sum(summary["worker_busy"]) / (elapsed * workers) * 100
+                             if summary and elapsed and workers else 0.0),
+        "limit_utilization": (sum(summary["worker_busy"]) / summary["limit_seconds"] * 100
+                              if summary and summary["limit_seconds"] else 0.0),
+    }
+    print(json.dumps(result))
+
+
+# ----------------------------------------------------------------------
+# Parent: start the mock, run each scenario in a child, report
+# ----------------------------------------------------------------------
+
+def mock_args(port, settings):
+    args = [sys.executable, str(BENCH_DIR / "mock_terminal.py"), "--port", str(port)]
+    for key, value in settings.items():
+        flag = "--" + key.replace("_", "-")
+        if value is True:
+            args.append(flag)
+        elif value is not False:
+            args += [flag, str(value)]
+    return args
+
+
+def wait_for_mock(base_url, timeout=15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/stats", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"mock terminal at {base_url} did not start")
+
+
+def run_in_child(name):
+    """Run one scenario in a scratch directory and return its metrics."""
+    scenario = SCENARIOS[name]
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    scratch = tempfile.mkdtemp(prefix=f"theta_bench_{name}_")
+    mock = subprocess.Popen(mock_args(port, scenario["mock"]),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_mock(base_url)
+        child = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "--child", name, "--url", base_url],
+            cwd=scratch, capture_output=True, text=True,
+        )
+        if child.returncode != 0:
+            raise RuntimeError(f"scenario {name} failed:\n{child.stderr[-2000:]}")
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        with urllib.request.urlopen(f"{base_url}/stats", timeout=5) as response:
+            result["server"] = json.loads(response.read())
+        return result
+    finally:
+        mock.terminate()
+        mock.wait()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def format_value(value):
+    if value is None:
+        return "-"
+    return f"{value:.2f}" if abs(value) < 100 else f"{value:.0f}"
+
+
+def print_result(name, result, baseline=None):
+    print(f"\n📊 {name}: {SCENARIOS[name]['description']}")
+    print(f"   {result['files']} files, {result['no_data']} no data, {result['failed']} failed, "
+          f"{result['mb']:.0f} MB in {result['elapsed']:.1f}s with {result['workers']} workers "
+          f"(terminal peak {result['server']['peak_active']}/{result['server']['max_concurrent']})")
+    for key, label, higher_is_better in METRICS:
+        line = f"   {label:>9}: {format_value(result.get(key)):>8}"
+        old = (baseline or {}).get(key)
+        new = result.get(key)
+        if old and new is not None:
+            change = (new - old) / old * 100
+            better = change >= 0 if higher_is_better else change <= 0
+            marker = "✅" if abs(change) < 5 or better else "⚠️ "
+            line += f"   baseline {format_value(old):>8}  {change:+6.1f}% {marker}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download throughput benchmarks")
+    parser.add_argument("scenarios", nargs="*", help=f"Subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Record these results as the new baseline")
+    parser.add_argument("--compare", action="store_true",
+                        help="Compare against the recorded baseline")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child_main(args.child, args.url)
+        return
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    baseline = {}
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            parser.error(f"no baseline at {args.baseline} (run with --save-baseline first)")
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(f"🏁 Running {len(names)} benchmark scenario(s) against the mock terminal")
+    results = {}
+    for name in names:
+        results[name] = run_in_child(name)
+        print_result(name, results[name], baseline.get(name))
+
+    if args.save_baseline:
+        saved = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                saved = json.load(f)
+        saved.update(results)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(saved, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
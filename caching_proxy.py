@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""
+Caching Proxy in front of the Theta Terminal
+
+Downloaders, probe scripts and interactive clients all ask the terminal for
+historical data that is already on disk, and every request takes one of
+the subscription's few concurrent connections. This proxy sits on
+PROXY_PORT and answers what it can locally:
+
+- /v3/option/history/* for a past date: whole-day quote requests of the
+  downloader's own shape (symbol, expiration=*, date, interval) come from
+  the day files the downloader fetched, or are passed through if the
+  store lacks the day (or only has it resampled or imported); anything
+  else from the response cache.
+- /v3/option/list/*: from the response cache, immutable when the request
+  names a past date, otherwise reused for PROXY_LIST_TTL seconds.
+- Requests naming one of the newest UPDATE_RECHECK_SESSIONS sessions are
+  cached for PROXY_RECENT_TTL seconds only: the terminal may not have
+  published those days yet, so a no-data answer for them is not final.
+- Everything else (today's data, other endpoints, /mcp/sse) is streamed
+  through unchanged.
+
+Cached bodies are stored by SHA-256 of their content (identical responses,
+such as the many no-data answers, are kept once) and referenced by a hash
+of the request. A miss is streamed to the client while it is written to
+the cache, identical requests that miss at the same time follow the same
+upstream fetch, and at most MAX_CONCURRENT misses are forwarded at once.
+
+    python caching_proxy.py
+    # then use http://localhost:25510 wherever http://localhost:25503 was used
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+import aiohttp
+from aiohttp import web
+
+from compression import codec_for_path, open_day_file
+from download_manifest import STATUS_COMPLETE
+from progress import format_bytes
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PREFIX = "/v3/option/history/"
+LIST_PREFIX = "/v3/option/list/"
+DATE_PARAMS = ("date", "start_date", "end_date")
+CACHEABLE_STATUSES = (200, 472)   # Data, and Theta's "no data" answer
+STORE_PARAMS = {"symbol", "expiration", "date", "interval"}
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+CHUNK_SIZE = 1024 * 1024
+UPSTREAM_READ_TIMEOUT = 600.0     # Seconds without body bytes before a miss is abandoned
+
+# Headers that describe one hop and must not be forwarded
+HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te",
+    "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+    "content-encoding",
+}
+
+
+def request_key(path: str, query) -> str:
+    """Identity of a request: path plus its parameters in sorted order."""
+    items = sorted((key, value) for key, value in query.items())
+    return hashlib.sha256(json.dumps([path, items]).encode()).hexdigest()
+
+
+def _today() -> str:
+    return datetime.now(MARKET_TIMEZONE).strftime("%Y%m%d")
+
+
+def _query_dates(query) -> list:
+    return [query[name].replace("-", "") for name in DATE_PARAMS if name in query]
+
+
+def _past_dates(query) -> Optional[bool]:
+    """True if every date parameter is before today, None if there are none."""
+    dates = _query_dates(query)
+    if not dates:
+        return None
+    today = _today()
+    return all(date < today for date in dates)
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of upstream responses on disk.
+
+        {cache_dir}/blobs/ab/abcdef...   response bodies, named by SHA-256
+        {cache_dir}/refs/12/1234...      request hash -> status, type, blob
+
+    Blobs are touched when served; beyond ``max_bytes`` the least recently
+    served are removed, and references to removed blobs count as misses.
+    """
+
+    def __init__(self, cache_dir, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        (self.cache_dir / "blobs").mkdir(parents=True, exist_ok=True)
+        (self.cache_dir / "refs").mkdir(parents=True, exist_ok=True)
+        self._stored_since_evict = 0
+
+    def _ref_path(self, key: str) -> Path:
+        return self.cache_dir / "refs" / key[:2] / key
+
+    def blob_path(self, digest: str) -> Path:
+        return self.cache_dir / "blobs" / digest[:2] / digest
+
+    def lookup(self, key: str, max_age: Optional[float] = None) -> Optional[dict]:
+        """
+        The cached entry for a request, or None if absent, expired or evicted.
+        With no ``max_age`` only entries stored as final are returned.
+        """
+        try:
+            with open(self._ref_path(key)) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if max_age is None:
+            if not entry.get("final", True):
+                return None   # Stored while its date was recent; ask once more
+        elif time.time() - entry["stored_at"] > max_age:
+            return None
+        blob = self.blob_path(entry["blob"])
+        try:
+            os.utime(blob)
+        except FileNotFoundError:
+            return None
+        entry["path"] = str(blob)
+        return entry
+
+    def temp_blob(self) -> Path:
+        return self.cache_dir / "blobs" / f".incoming.{os.getpid()}.{time.monotonic_ns()}"
+
+    def store(self, key: str, temp_path: Path, digest: str, status: int,
+              content_type: str, final: bool = True) -> dict:
+        """
+        Move a fetched body into place and point the request at it.
+        ``final`` responses may be served forever, the others only until
+        their ``max_age``.
+        """
+        blob = self.blob_path(digest)
+        blob.parent.mkdir(exist_ok=True)
+        if blob.exists():
+            # Same content already cached for another request
+            temp_path.unlink(missing_ok=True)
+        else:
+            os.replace(temp_path, blob)
+        entry = {"status": status, "content_type": content_type, "blob": digest,
+                 "stored_at": time.time(), "final": final}
+        ref = self._ref_path(key)
+        ref.parent.mkdir(exist_ok=True)
+        temp_ref = ref.with_name(ref.name + ".part")
+        with open(temp_ref, "w") as f:
+            json.dump(entry, f)
+        os.replace(temp_ref, ref)
+
+        self._stored_since_evict += blob.stat().st_size
+        if self._stored_since_evict > self.max_bytes // 100:
+            self.evict()
+        entry["path"] = str(blob)
+        return entry
+
+    def evict(self):
+        """Remove least recently served blobs until the cache fits its cap."""
+        self._stored_since_evict = 0
+        blobs = []
+        for path in (self.cache_dir / "blobs").glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in blobs)
+        for _, size, path in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+class _Fetch:
+    """An upstream fetch in progress, followed by every request waiting on it."""
+
+    def __init__(self, temp_path: Path):
+        self.temp_path = temp_path
+        self.head = asyncio.get_running_loop().create_future()   # Status and content type
+        self.written = 0
+        self.finished = False
+        self.entry = None     # Cache entry once stored
+        self.error = None     # Exception the fetch ended with
+        self.changed = asyncio.Condition()
+        self.readers = 0
+        self.task = None
+
+
+class CachingProxy:
+    """aiohttp application answering terminal requests from store and cache."""
+
+    def __init__(self, upstream: str, cache: ResponseCache, manifest=None,
+                 max_upstream: int = 4, list_ttl: float = 6 * 3600, market_cal=None,
+                 recent_sessions: int = 3, recent_ttl: float = 30 * 60):
+        self.upstream = upstream.rstrip("/")
+        self.cache = cache
+        self.manifest = manifest
+        self.list_ttl = list_ttl
+        self.market_cal = market_cal
+        self.recent_sessions = recent_sessions
+        self.recent_ttl = recent_ttl
+        self._recent_cutoff = (None, None)   # (today, first recent session)
+        self.upstream_slots = asyncio.Semaphore(max_upstream)
+        self.in_flight = {}
+        self.session = None
+        self.stats = {"store": 0, "cache": 0, "coalesced": 0, "fetched": 0,
+                      "passed_through": 0, "served_bytes": 0}
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/proxy/stats", self._handle_stats)
+        app.router.add_route("*", "/{path:.*}", self._handle)
+        app.on_startup.append(self._start)
+        app.on_cleanup.append(self._stop)
+        return app
+
+    async def _start(self, app):
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=None), auto_decompress=False
+        )
+
+    async def _stop(self, app):
+        await self.session.close()
+
+    async def _handle_stats(self, request):
+        return web.json_response(self.stats)
+
+    def _max_age(self, path: str, query) -> Optional[float]:
+        """
+        How long a cached response stays valid: 0 = not cacheable,
+        None = forever (historical).
+        """
+        past = _past_dates(query)
+        settled = None if past and not self._names_recent_session(query) else self.recent_ttl
+        if path.startswith(HISTORY_PREFIX):
+            return settled if past else 0
+        if path.startswith(LIST_PREFIX):
+            if past is False:
+                return 0
+            return settled if past else self.list_ttl
+        return 0
+
+    def _names_recent_session(self, query) -> bool:
+        """True if a date parameter is one of the newest ``recent_sessions`` sessions."""
+        if self.market_cal is None:
+            return False
+        today = _today()
+        if self._recent_cutoff[0] != today:
+            day = f"{today[:4]}-{today[4:6]}-{today[6:]}"
+            for _ in range(self.recent_sessions):
+                previous = self.market_cal.previous_trading_day(day)
+                if previous is None:
+                    break
+                day = previous
+            self._recent_cutoff = (today, day.replace("-", ""))
+        cutoff = self._recent_cutoff[1]
+        return any(date >= cutoff for date in _query_dates(query))
+
+    async def _handle(self, request: web.Request):
+        path = request.path
+        if request.method != "GET":
+            return await self._pass_through(request)
+        max_age = self._max_age(path, request.query)
+        if max_age == 0:
+            return await self._pass_through(request)
+
+        store_file = self._store_file(path, request.query)
+        if store_file is not None:
+            self.stats["store"] += 1
+            return await self._serve_store_file(request, store_file)
+
+        if path == HISTORY_PREFIX + "quote" and request.query.get("expiration") == "*":
+            # Whole-day misses are what the downloader fetches into the store;
+            # caching them would keep every day twice
+            return await self._pass_through(request)
+
+        key = request_key(path, request.query)
+        entry = self.cache.lookup(key, max_age)
+        if entry is not None:
+            self.stats["cache"] += 1
+            self.stats["served_bytes"] += os.path.getsize(entry["path"])
+            return web.FileResponse(entry["path"], status=entry["status"],
+                                    headers={"Content-Type": entry["content_type"]})
+
+        fetch = self.in_flight.get(key)
+        if fetch is None:
+            fetch = _Fetch(self.cache.temp_blob())
+            fetch.task = asyncio.create_task(
+                self._fetch(key, path, request.query, fetch, final=max_age is None)
+            )
+            self.in_flight[key] = fetch
+            fetch.task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+            # Waiters read the outcome from fetch.error, not from the task
+            fetch.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        else:
+            self.stats["coalesced"] += 1
+        return await self._serve_fetch(request, fetch)
+
+    async def _serve_fetch(self, request: web.Request, fetch: "_Fetch"):
+        """
+        Stream a miss to one client while it is being written to the cache.
+
+        Every waiter follows the temp blob as it grows; once the last one
+        disconnects an unfinished fetch is cancelled.
+        """
+        fetch.readers += 1
+        try:
+            try:
+                head = await asyncio.shield(fetch.head)
+            except asyncio.TimeoutError as e:
+                return web.Response(status=504, text=f"Upstream terminal timed out: {e}\n")
+            except aiohttp.ClientError as e:
+                return web.Response(status=502, text=f"Upstream terminal error: {e}\n")
+            if "body" in head:
+                return web.Response(status=head["status"], body=head["body"],
+                                    headers={"Content-Type": head["content_type"]})
+            if fetch.finished:
+                # Finished before this waiter got here: the temp blob is gone
+                if fetch.error is not None:
+                    return web.Response(status=502,
+                                        text=f"Upstream terminal error: {fetch.error!r}\n")
+                return web.FileResponse(fetch.entry["path"], status=fetch.entry["status"],
+                                        headers={"Content-Type": fetch.entry["content_type"]})
+
+            response = web.StreamResponse(status=head["status"],
+                                          headers={"Content-Type": head["content_type"]})
+            await response.prepare(request)
+            sent = 0
+            # Opened before the fetch can finish, so the later rename is harmless
+            with open(fetch.temp_path, "rb") as f:
+                while True:
+                    async with fetch.changed:
+                        await fetch.changed.wait_for(lambda: fetch.written > sent or fetch.finished)
+                    if sent == fetch.written:
+                        break
+                    chunk = f.read(min(fetch.written - sent, CHUNK_SIZE))
+                    sent += len(chunk)
+                    self.stats["served_bytes"] += len(chunk)
+                    try:
+                        await response.write(chunk)
+                    except ConnectionResetError:
+                        return response   # Client went away
+
+            if fetch.error is not None:
+                # Status already sent; dropping the connection without the
+                # final chunk tells the client the body is incomplete
+                logger.warning(f"Upstream failed mid-transfer for {request.path_qs}: {fetch.error!r}")
+                if request.transport is not None:
+                    request.transport.close()
+                return response
+            await response.write_eof()
+            return response
+        finally:
+            fetch.readers -= 1
+            if not fetch.readers and not fetch.finished:
+                fetch.task.cancel()
+
+    # ------------------------------------------------------------------
+    # Sources
+    # ------------------------------------------------------------------
+
+    def _store_file(self, path: str, query) -> Optional[str]:
+        """Downloaded day file answering a whole-day quote request, if the store has it."""
+        if self.manifest is None or path != HISTORY_PREFIX + "quote":
+            return None
+        if set(query) - {"format"} != STORE_PARAMS or query.get("format", "csv") != "csv":
+            return None
+        if query["expiration"] != "*":
+            return None
+        date = query["date"].replace("-", "")
+        row = self.manifest.get(query["symbol"], query["interval"],
+                                f"{date[:4]}-{date[4:6]}-{date[6:]}")
+        # Only days the terminal itself returned (downloads record HTTP 200);
+        # resampled days and unverified imports are passed through instead
+        if (not row or row["status"] != STATUS_COMPLETE or row["http_status"] != 200
+                or not row["path"]):
+            return None
+        return row["path"] if os.path.exists(row["path"]) else None
+
+    async def _serve_store_file(self, request: web.Request, path: str):
+        if codec_for_path(path) is None:
+            self.stats["served_bytes"] += os.path.getsize(path)
+            return web.FileResponse(path, headers={"Content-Type": "text/csv"})
+        # Compressed day files are decompressed on the fly
+        response = web.StreamResponse(headers={"Content-Type": "text/csv"})
+        await response.prepare(request)
+        f = await asyncio.to_thread(open_day_file, path)
+        try:
+            while True:
+                chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.stats["served_bytes"] += len(chunk)
+                await response.write(chunk)
+        finally:
+            f.close()
+        await response.write_eof()
+        return response
+
+    async def _fetch(self, key: str, path: str, query, fetch: "_Fetch",
+                     final: bool = True) -> dict:
+        """Fetch one miss from the terminal into the cache (shared by coalesced waiters)."""
+        try:
+            async with self.upstream_slots:
+                self.stats["fetched"] += 1
+                timeout = aiohttp.ClientTimeout(total=None, sock_read=UPSTREAM_READ_TIMEOUT)
+                async with self.session.get(self.upstream + path, params=query,
+                                            timeout=timeout) as response:
+                    content_type = response.headers.get("Content-Type", "text/csv")
+                    if response.status not in CACHEABLE_STATUSES:
+                        # Errors are passed on to every waiter but never cached
+                        entry = {"status": response.status, "content_type": content_type,
+                                 "body": await response.read()}
+                        fetch.head.set_result(entry)
+                        return entry
+                    digest = hashlib.sha256()
+                    # Unbuffered, so waiters reading the temp blob see every chunk
+                    with open(fetch.temp_path, "wb", buffering=0) as f:
+                        fetch.head.set_result({"status": response.status,
+                                               "content_type": content_type})
+                        async for chunk in response.content.iter_any():
+                            digest.update(chunk)
+                            f.write(chunk)
+                            fetch.written += len(chunk)
+                            async with fetch.changed:
+                                fetch.changed.notify_all()
+                    fetch.entry = self.cache.store(key, fetch.temp_path, digest.hexdigest(),
+                                                   response.status, content_type, final)
+                    return fetch.entry
+        except BaseException as e:
+            fetch.error = e
+            fetch.temp_path.unlink(missing_ok=True)
+            if not fetch.head.done():
+                if isinstance(e, Exception):
+                    fetch.head.set_exception(e)
+                else:
+                    fetch.head.cancel()
+            raise
+        finally:
+            fetch.finished = True
+            async with fetch.changed:
+                fetch.changed.notify_all()
+
+    async def _pass_through(self, request: web.Request):
+        """Stream a request to the terminal and its response back unchanged."""
+        self.stats["passed_through"] += 1
+        headers = {name: value for name, value in request.headers.items()
+                   if name.lower() not in HOP_HEADERS}
+        body = await request.read() if request.can_read_body else None
+        try:
+            upstream = await self.session.request(
+                request.method, self.upstream + request.path, params=request.query,
+                headers=headers, data=body,
+            )
+        except asyncio.TimeoutError as e:
+            return web.Response(status=504, text=f"Upstream terminal timed out: {e}\n")
+        except aiohttp.ClientError as e:
+            return web.Response(status=502, text=f"Upstream terminal error: {e}\n")
+        async with upstream:
+            response = web.StreamResponse(
+                status=upstream.status,
+                headers={name: value for name, value in upstream.headers.items()
+                         if name.lower() not in HOP_HEADERS},
+            )
+            await response.prepare(request)
+            # iter_any forwards each piece as it arrives (needed for SSE)
+            try:
+                async for chunk in upstream.content.iter_any():
+                    await response.write(chunk)
+            except ConnectionResetError:
+                return response   # Client went away; leaving closes the upstream request
+            await response.write_eof()
+            return response
+
+    def print_summary(self):
+        local = self.stats["store"] + self.stats["cache"] + self.stats["coalesced"]
+        total = local + self.stats["fetched"]
+        rate = local / total * 100 if total else 0.0
+        print(f"📊 Proxy: {self.stats['store']} from store, {self.stats['cache']} from cache, "
+              f"{self.stats['coalesced']} coalesced, {self.stats['fetched']} fetched "
+              f"({rate:.0f}% served locally), {self.stats['passed_through']} passed through, "
+              f"{format_bytes(self.stats['served_bytes'])} served")
+
+
+def main():
+    from download_manifest import DownloadManifest
+    from market_calendar import MarketCalendar
+    from progress import setup_logging
+    from simple_config import (
+        LOG_LEVEL, MANIFEST_PATH, MAX_CONCURRENT, PROXY_CACHE_DIR, PROXY_CACHE_MAX_GB,
+        PROXY_LIST_TTL, PROXY_PORT, PROXY_RECENT_TTL, PROXY_UPSTREAM, UPDATE_RECHECK_SESSIONS
+    )
+
+    parser = argparse.ArgumentParser(description="Caching proxy in front of the Theta Terminal")
+    parser.add_argument("--port", type=int, default=PROXY_PORT)
+    parser.add_argument("--upstream", default=PROXY_UPSTREAM)
+    parser.add_argument("--cache-dir", default=PROXY_CACHE_DIR)
+    parser.add_argument("--no-store", action="store_true",
+                        help="Do not answer from downloaded day files")
+    args = parser.parse_args()
+    setup_logging(LOG_LEVEL)
+
+    manifest = None if args.no_store else DownloadManifest(MANIFEST_PATH)
+    cache = ResponseCache(args.cache_dir, int(PROXY_CACHE_MAX_GB * 1024 ** 3))
+    proxy = CachingProxy(args.upstream, cache, manifest, MAX_CONCURRENT, PROXY_LIST_TTL,
+                         MarketCalendar(), UPDATE_RECHECK_SESSIONS, PROXY_RECENT_TTL)
+    print(f"🛰️  Caching proxy on http://127.0.0.1:{args.port} -> {args.upstream}")
+    print(f"   Cache: {args.cache_dir} (up to {PROXY_CACHE_MAX_GB} GB)")
+    try:
+        web.run_app(proxy.application(), host="127.0.0.1", port=args.port,
+                    access_log=None, print=None)
+    finally:
+        proxy.print_summary()
+        if manifest is not None:
+            manifest.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compressed Day Files for Theta Data Downloader
+
+Streaming compression for day CSVs written as they arrive from the socket
+(zstd when the ``zstandard`` package is installed, gzip otherwise), plus a
+reader that opens plain or compressed day files transparently.
+"""
+
+import gzip
+import io
+import logging
+import zlib
+from pathlib import Path
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# File suffix appended to ".csv" per codec
+CODEC_SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+
+_warned_fallback = False
+
+
+def resolve_codec(codec: Optional[str]) -> Optional[str]:
+    """
+    Return the codec that will actually be used for ``codec``.
+
+    zstd falls back to gzip (with a warning) if zstandard is not installed.
+    """
+    global _warned_fallback
+    if not codec:
+        return None
+    codec = codec.lower()
+    if codec not in CODEC_SUFFIXES:
+        raise ValueError(f"Unknown compression codec {codec!r} (use 'zstd' or 'gzip')")
+    if codec == "zstd" and zstandard is None:
+        if not _warned_fallback:
+            logger.warning("⚠️  zstandard is not installed - compressing with gzip instead")
+            _warned_fallback = True
+        return "gzip"
+    return codec
+
+
+def codec_for_path(path) -> Optional[str]:
+    """Codec of an existing day file from its suffix (None for plain CSV)."""
+    suffix = Path(path).suffix
+    for codec, codec_suffix in CODEC_SUFFIXES.items():
+        if suffix == codec_suffix:
+            return codec
+    return None
+
+
+class StreamCompressor:
+    """Incremental compressor; feed chunks in order, then call flush()."""
+
+    def __init__(self, codec: str, level: int = 3):
+        self.codec = codec
+        if codec == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            # wbits=31 writes a gzip header readable by gzip/zcat
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+def open_day_file(path):
+    """Open a plain, .zst or .gz day file for binary reading."""
+    codec = codec_for_path(path)
+    if codec == "gzip":
+        return gzip.open(path, "rb")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        # Buffered so callers can iterate lines as with a plain file
+        return io.BufferedReader(reader)
+    return open(path, "rb")
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Byte-Range Index for Raw Day CSVs
+
+The terminal returns a day's quotes grouped by contract and in time order
+within each contract, so the rows of one contract over one stretch of the
+session sit in a single contiguous byte range. The index records those
+ranges in a small sidecar next to each plain day CSV:
+
+    QQQ_options_2024-01-02_1m.csv
+    QQQ_options_2024-01-02_1m.csv.idx     (Parquet, around 1% of the CSV)
+
+One index row per (expiration, strike, right, time bucket) segment holds its
+byte range, row count and first/last timestamp. A reader filters the index
+with the same contract/time expression it would apply to the quotes, then
+reads and parses only the matching ranges instead of the whole file.
+
+Compressed day files (.csv.zst / .csv.gz) cannot be seeked into and are not
+indexed. Build indexes inline (CSV_INDEX = True) or over the existing store:
+
+    python csv_index.py QQQ SPY --interval 1m
+"""
+
+import argparse
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from compression import codec_for_path
+from parquet_ingest import COLUMN_TYPES, CSV_BLOCK_SIZE, open_csv_batches
+
+INDEX_SUFFIX = ".idx"
+TEMP_SUFFIX = ".part"
+DEFAULT_BUCKET_MINUTES = 30
+NEWLINE_SCAN_BYTES = 64 * 1024 * 1024  # Bytes scanned for newlines at a time
+
+KEY_COLUMNS = ["expiration", "strike", "right", "timestamp"]
+
+INDEX_SCHEMA = pa.schema([
+    ("expiration", pa.date32()),
+    ("strike", pa.float64()),
+    ("right", pa.string()),
+    ("bucket_start", pa.timestamp("ms")),
+    ("first_ts", pa.timestamp("ms")),
+    ("last_ts", pa.timestamp("ms")),
+    ("start", pa.int64()),
+    ("end", pa.int64()),
+    ("rows", pa.int32()),
+])
+
+
+def index_path(csv_path) -> Path:
+    csv_path = Path(csv_path)
+    return csv_path.with_name(csv_path.name + INDEX_SUFFIX)
+
+
+def _line_bounds(csv_path) -> Tuple[int, np.ndarray, np.ndarray]:
+    """Header length and the start/end byte offsets of every data line."""
+    size = os.path.getsize(csv_path)
+    with open(csv_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = np.frombuffer(mm, dtype=np.uint8)
+        newlines = np.concatenate([
+            np.flatnonzero(data[offset:offset + NEWLINE_SCAN_BYTES] == 0x0A) + offset
+            for offset in range(0, size, NEWLINE_SCAN_BYTES)
+        ] or [np.empty(0, dtype=np.int64)])
+        complete_last_line = size > 0 and data[-1] == 0x0A
+        del data
+    if not len(newlines):
+        raise ValueError(f"{csv_path} has no complete header line")
+    ends = newlines[1:] + 1
+    if not complete_last_line:
+        ends = np.append(ends, size)
+    starts = np.concatenate([[newlines[0] + 1], ends[:-1]]) if len(ends) else ends
+    return int(newlines[0] + 1), starts.astype(np.int64), ends.astype(np.int64)
+
+
+def build_index(csv_path, bucket_minutes: int = DEFAULT_BUCKET_MINUTES) -> dict:
+    """
+    Write the sidecar index for one plain day CSV, atomically.
+
+    Returns:
+        Dict with path, segments, rows and bytes of the index
+    """
+    csv_path = Path(csv_path)
+    if codec_for_path(csv_path):
+        raise ValueError(f"{csv_path} is compressed; only plain CSVs can be indexed")
+    stat = csv_path.stat()
+    header_bytes, line_starts, line_ends = _line_bounds(csv_path)
+    bucket_ms = bucket_minutes * 60 * 1000
+
+    segments = {name: [] for name in ("expiration", "strike", "call", "bucket",
+                                      "first_ts", "last_ts", "start", "end", "rows")}
+    previous_key = None
+    row = 0
+    for batch in open_csv_batches(csv_path, KEY_COLUMNS):
+        n = batch.num_rows
+        if not n:
+            continue
+        expiration = batch.column("expiration").cast(pa.int32()).to_numpy(zero_copy_only=False)
+        strike = batch.column("strike").to_numpy(zero_copy_only=False)
+        call = pc.equal(batch.column("right"), "CALL").to_numpy(zero_copy_only=False)
+        timestamp = batch.column("timestamp").cast(pa.int64()).to_numpy(zero_copy_only=False)
+        bucket = timestamp // bucket_ms
+
+        changed = np.ones(n, dtype=bool)
+        changed[1:] = ((expiration[1:] != expiration[:-1]) | (strike[1:] != strike[:-1])
+                       | (call[1:] != call[:-1]) | (bucket[1:] != bucket[:-1]))
+        first_key = (expiration[0], strike[0], call[0], bucket[0])
+        continues = previous_key == first_key
+        if continues:
+            changed[0] = False
+
+        starts = np.flatnonzero(changed)
+        bounds = np.append(starts, n)
+        if continues:
+            # The batch opens by extending the last segment of the previous one
+            head = bounds[0]
+            segments["end"][-1][-1] = line_ends[row + head - 1]
+            segments["rows"][-1][-1] += head
+            segments["last_ts"][-1][-1] = max(segments["last_ts"][-1][-1],
+                                              timestamp[:head].max())
+        if len(starts):
+            segments["expiration"].append(expiration[starts])
+            segments["strike"].append(strike[starts])
+            segments["call"].append(call[starts])
+            segments["bucket"].append(bucket[starts])
+            segments["first_ts"].append(np.minimum.reduceat(timestamp, starts))
+            segments["last_ts"].append(np.maximum.reduceat(timestamp, starts))
+            segments["start"].append(line_starts[row + starts])
+            segments["end"].append(line_ends[row + bounds[1:] - 1])
+            segments["rows"].append(np.diff(bounds))
+        previous_key = (expiration[-1], strike[-1], call[-1], bucket[-1])
+        row += n
+
+    if row != len(line_starts):
+        raise ValueError(f"{csv_path}: parsed {row} rows but found {len(line_starts)} lines "
+                         f"(embedded newlines or blank lines)")
+
+    columns = {name: (np.concatenate(parts) if parts else np.empty(0))
+               for name, parts in segments.items()}
+    table = pa.table({
+        "expiration": pa.array(columns["expiration"].astype(np.int32), pa.int32()).cast(pa.date32()),
+        "strike": pa.array(columns["strike"], pa.float64()),
+        "right": pa.array(np.where(columns["call"].astype(bool), "CALL", "PUT"), pa.string()),
+        "bucket_start": pa.array(columns["bucket"].astype(np.int64) * bucket_ms, pa.timestamp("ms")),
+        "first_ts": pa.array(columns["first_ts"].astype(np.int64), pa.timestamp("ms")),
+        "last_ts": pa.array(columns["last_ts"].astype(np.int64), pa.timestamp("ms")),
+        "start": pa.array(columns["start"], pa.int64()),
+        "end": pa.array(columns["end"], pa.int64()),
+        "rows": pa.array(columns["rows"], pa.int32()),
+    }, schema=INDEX_SCHEMA).replace_schema_metadata({
+        "csv_bytes": str(stat.st_size),
+        "csv_mtime_ns": str(stat.st_mtime_ns),
+        "header_bytes": str(header_bytes),
+        "bucket_minutes": str(bucket_minutes),
+    })
+
+    out_path = index_path(csv_path)
+    temp_path = out_path.with_name(out_path.name + TEMP_SUFFIX)
+    try:
+        pq.write_table(table, temp_path, compression="zstd")
+        os.replace(temp_path, out_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return {
+        "path": str(out_path),
+        "segments": table.num_rows,
+        "rows": row,
+        "bytes": out_path.stat().st_size,
+    }
+
+
+def has_current_index(csv_path) -> bool:
+    """True if the CSV has an index built from its current contents."""
+    try:
+        metadata = pq.read_schema(index_path(csv_path)).metadata or {}
+        stat = os.stat(csv_path)
+    except FileNotFoundError:
+        return False
+    return (metadata.get(b"csv_bytes") == str(stat.st_size).encode()
+            and metadata.get(b"csv_mtime_ns") == str(stat.st_mtime_ns).encode())
+
+
+def load_index(csv_path, expression: Optional[pc.Expression] = None) -> Optional[pa.Table]:
+    """
+    Index rows matching ``expression``, or None if the CSV has no index or
+    has changed since it was indexed.
+    """
+    if not has_current_index(csv_path):
+        return None
+    return pq.read_table(index_path(csv_path), filters=expression)
+
+
+def lookup(csv_path, expression: Optional[pc.Expression] = None) -> Optional[List[Tuple[int, int]]]:
+    """
+    Byte ranges holding the rows the index says may match, adjacent ranges
+    merged, in file order. None when there is no usable index.
+
+    ``expression`` may refer to expiration, strike, right, bucket_start,
+    first_ts and last_ts.
+    """
+    table = load_index(csv_path, expression)
+    if table is None:
+        return None
+    ranges = []
+    order = pc.sort_indices(table, sort_keys=[("start", "ascending")])
+    starts = table.column("start").take(order).to_pylist()
+    ends = table.column("end").take(order).to_pylist()
+    for start, end in zip(starts, ends):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return [tuple(byte_range) for byte_range in ranges]
+
+
+def read_ranges(csv_path, ranges: Sequence[Tuple[int, int]],
+                columns: Optional[Sequence[str]] = None) -> Iterator[pa.RecordBatch]:
+    """Parse only the given byte ranges of a day CSV, about one block at a time."""
+    header_bytes = int(pq.read_schema(index_path(csv_path)).metadata[b"header_bytes"])
+    convert_options = pa_csv.ConvertOptions(column_types=COLUMN_TYPES,
+                                            include_columns=list(columns) if columns else None)
+    fd = os.open(csv_path, os.O_RDONLY)
+    try:
+        header = os.pread(fd, header_bytes, 0)
+        pending, pending_bytes = [header], 0
+        for start, end in list(ranges) + [(None, None)]:
+            if start is not None:
+                pending.append(os.pread(fd, end - start, start))
+                pending_bytes += end - start
+                if pending_bytes < CSV_BLOCK_SIZE:
+                    continue
+            if pending_bytes:
+                table = pa_csv.read_csv(pa.py_buffer(b"".join(pending)),
+                                        convert_options=convert_options)
+                yield from table.to_batches()
+            pending, pending_bytes = [header], 0
+    finally:
+        os.close(fd)
+
+
+def index_symbol(manifest, symbol: str, interval: str, workers: Optional[int] = None,
+                 bucket_minutes: int = DEFAULT_BUCKET_MINUTES) -> dict:
+    """Index every plain day CSV of a symbol that has no current index."""
+    pending = [
+        day for day in manifest.day_files(symbol, interval)
+        if day["path"] and not codec_for_path(day["path"]) and Path(day["path"]).exists()
+        and not has_current_index(day["path"])
+    ]
+    totals = {"indexed": 0, "failed": 0, "csv_bytes": 0, "index_bytes": 0}
+    if not pending:
+        print(f"✅ {symbol}: All plain {interval} CSVs already indexed")
+        return totals
+
+    print(f"🗂️  {symbol}: Indexing {len(pending)} {interval} day CSVs...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(build_index, day["path"], bucket_minutes): day for day in pending}
+        for future in as_completed(futures):
+            day = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                totals["failed"] += 1
+                print(f"❌ {symbol} {day['date']}: Indexing failed - {e}")
+                continue
+            totals["indexed"] += 1
+            totals["csv_bytes"] += os.path.getsize(day["path"])
+            totals["index_bytes"] += result["bytes"]
+
+    share = totals["index_bytes"] / totals["csv_bytes"] * 100 if totals["csv_bytes"] else 0
+    print(f"✅ {symbol}: {totals['indexed']} days indexed "
+          f"(indexes are {share:.2f}% of the CSV bytes)")
+    return totals
+
+
+def main():
+    from download_manifest import DownloadManifest
+    from simple_config import CSV_INDEX_BUCKET_MINUTES, INTERVAL, MANIFEST_PATH
+
+    parser = argparse.ArgumentParser(description="Build byte-range indexes for day CSVs")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--interval", default=INTERVAL)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--bucket-minutes", type=int, default=CSV_INDEX_BUCKET_MINUTES)
+    args = parser.parse_args()
+
+    with DownloadManifest(MANIFEST_PATH) as manifest:
+        for symbol in args.symbols:
+            index_symbol(manifest, symbol, args.interval, args.workers, args.bucket_minutes)
+
+
+if __name__ == "__main__":
+    main()
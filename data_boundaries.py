@@ -0,0 +1,289 @@
+"""
+Data Availability Boundary Finder for Theta Data Downloader
+
+Finds each symbol's first and last trading day with options data by
+binary-searching the NYSE session array with cheap probe requests, and
+caches the result per symbol so the planner never schedules dates outside
+a symbol's known coverage. Probes go through a TerminalPool like every
+other request, so they use the TERMINALS list and fail over between them.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from datetime import date as date_cls, datetime
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from market_calendar import MarketCalendar
+from simple_config import (
+    BOUNDARY_SEARCH_START, MAX_CONCURRENT, PROBE_INTERVAL, TERMINAL_PROBE_INTERVAL, TERMINALS
+)
+from terminal_pool import TerminalPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_FILE = "results/data_boundaries.json"
+
+# A probe that says "no data" is double-checked on this many neighbouring
+# sessions, so an unscheduled closure is not mistaken for a boundary
+CONFIRM_SESSIONS = 3
+
+# Attempts per probe before the search for a symbol is abandoned
+PROBE_ATTEMPTS = 3
+
+# Seconds to wait for a terminal to come back before a probe gives up
+PROBE_MAX_WAIT = 60.0
+
+# When the newest session has no data, sample this many evenly spaced
+# sessions (newest first) to find a date inside the coverage
+ANCHOR_SAMPLES = 24
+
+
+async def probe_date(session, base_url: str, symbol: str, date: str) -> Optional[bool]:
+    """
+    Cheaply check whether ``symbol`` has options data on ``date``.
+
+    Uses the coarse PROBE_INTERVAL and reads only the first chunk of the
+    body (enough to tell data from a bare CSV header) before closing.
+
+    Returns:
+        True/False for data/no data, None if the probe itself failed
+
+    Raises:
+        aiohttp.ClientConnectorError: if the terminal refused the connection
+    """
+    url = f"{base_url}/v3/option/history/quote"
+    params = {
+        'symbol': symbol,
+        'expiration': '*',
+        'date': date.replace("-", ""),
+        'interval': PROBE_INTERVAL
+    }
+    try:
+        async with session.get(url, params=params) as response:
+            if response.status == 472:
+                return False
+            if response.status != 200:
+                return None
+            head = b""
+            async for chunk in response.content.iter_chunked(4096):
+                head += chunk
+                if len(head) > 100:
+                    break
+            # Don't pull the rest of the body
+            response.close()
+            return len(head) > 100
+    except aiohttp.ClientConnectorError:
+        raise
+    except Exception as e:
+        logger.warning(f"Probe {symbol} {date} failed: {e}")
+        return None
+
+
+class BoundaryFinder:
+    """Binary search over the session array for a symbol's coverage."""
+
+    def __init__(self, session, market_cal: MarketCalendar, pool: TerminalPool):
+        self.session = session
+        self.market_cal = market_cal
+        self.pool = pool
+        self.probes = 0
+
+    async def _find_data(self, symbol: str, days: List[str], index: int, step: int) -> Optional[int]:
+        """
+        Probe ``days[index]``; on no data also try up to CONFIRM_SESSIONS
+        further sessions in the ``step`` direction.
+
+        Returns:
+            Index of the first probed session with data, or None
+        """
+        for offset in range(CONFIRM_SESSIONS + 1):
+            i = index + offset * step
+            if not 0 <= i < len(days):
+                break
+            if await self._probe(symbol, days[i]):
+                return i
+        return None
+
+    async def _probe(self, symbol: str, date: str) -> bool:
+        for attempt in range(PROBE_ATTEMPTS):
+            if not await self.pool.wait_until_available(PROBE_MAX_WAIT):
+                break
+            self.probes += 1
+            async with self.pool.acquire() as endpoint:
+                if endpoint is None:
+                    break
+                try:
+                    result = await probe_date(self.session, endpoint.base_url, symbol, date)
+                except aiohttp.ClientConnectorError as e:
+                    logger.warning(f"Probe {symbol} {date} failed: {e}")
+                    # Fail over to the other terminals, if any
+                    self.pool.mark_down(endpoint, self.session)
+                    continue
+            if result is not None:
+                return result
+            await asyncio.sleep(2 ** attempt)
+        raise RuntimeError(f"probe failed for {symbol} {date}")
+
+    async def _find_anchor(self, symbol: str, days: List[str]) -> Optional[int]:
+        """Index of some session with data (newest first), or None."""
+        found = await self._find_data(symbol, days, len(days) - 1, -1)
+        if found is not None:
+            return found
+        stride = max(1, len(days) // ANCHOR_SAMPLES)
+        for index in range(len(days) - 1 - stride, -1, -stride):
+            if await self._probe(symbol, days[index]):
+                return index
+        return None
+
+    async def find(self, symbol: str, start: str, end: str) -> Optional[dict]:
+        """
+        Find first and last dates with data between ``start`` and ``end``.
+
+        Assumes coverage is one contiguous run of sessions. A coverage
+        shorter than len(days) / ANCHOR_SAMPLES sessions that ended before
+        ``end`` can be missed. Returns None if no data was found at all.
+        """
+        days = self.market_cal.get_trading_days(start, end)
+        if not days:
+            return None
+
+        anchor = await self._find_anchor(symbol, days)
+        if anchor is None:
+            return None
+
+        # Bisect on "any data within the next CONFIRM_SESSIONS sessions",
+        # which stays monotonic across short unscheduled closures. The first
+        # date is where data was found for the smallest index that passes.
+        lo, hi, first = -1, anchor, anchor
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            found = await self._find_data(symbol, days, mid, +1)
+            if found is None:
+                lo = mid
+            else:
+                hi, first = mid, found
+
+        # Same from the other side for the last date
+        lo, hi, last = anchor, len(days), anchor
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            found = await self._find_data(symbol, days, mid, -1)
+            if found is None:
+                hi = mid
+            else:
+                lo, last = mid, found
+
+        return {
+            "first": days[first],
+            "last": days[last],
+            # Coverage reaching the end of the searched range may continue.
+            # The newest sessions may just not be published yet (e.g. a run
+            # before today's close), so "near the end" counts as well.
+            "open_ended": last >= len(days) - 1 - CONFIRM_SESSIONS,
+            "searched_through": days[-1],
+            "searched_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+
+def load_boundaries(cache_file: str = DEFAULT_CACHE_FILE) -> Dict[str, dict]:
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not load data boundaries: {e}")
+    return {}
+
+
+def save_boundaries(boundaries: Dict[str, dict], cache_file: str = DEFAULT_CACHE_FILE):
+    os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+    temp_path = cache_file + ".tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(boundaries, f, indent=2)
+    os.replace(temp_path, cache_file)
+
+
+async def discover_boundaries(symbols: List[str], market_cal: Optional[MarketCalendar] = None,
+                              refresh: bool = False,
+                              cache_file: str = DEFAULT_CACHE_FILE,
+                              terminals: Optional[List] = None) -> Dict[str, dict]:
+    """
+    Return cached coverage for each symbol, probing any that are unknown.
+
+    Symbols whose search fails (e.g. terminal down) are simply left out, so
+    the planner falls back to the configured date range for them.
+
+    Args:
+        terminals: Terminals to probe (default TERMINALS)
+    """
+    if market_cal is None:
+        market_cal = MarketCalendar()
+    boundaries = load_boundaries(cache_file)
+    todo = [symbol for symbol in symbols if refresh or symbol not in boundaries]
+    if not todo:
+        return {symbol: boundaries[symbol] for symbol in symbols if symbol in boundaries}
+
+    end = date_cls.today().isoformat()
+    timeout = aiohttp.ClientTimeout(total=120)
+    pool = TerminalPool(terminals or TERMINALS, MAX_CONCURRENT,
+                        probe_interval=TERMINAL_PROBE_INTERVAL)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        finder = BoundaryFinder(session, market_cal, pool)
+        try:
+            await _discover(finder, todo, boundaries, end, cache_file)
+        finally:
+            await pool.close()
+
+    return {symbol: boundaries[symbol] for symbol in symbols if symbol in boundaries}
+
+
+async def _discover(finder: BoundaryFinder, todo: List[str], boundaries: Dict[str, dict],
+                    end: str, cache_file: str):
+    """Search each symbol in turn, saving the cache after every result."""
+    for symbol in todo:
+        print(f"🔎 {symbol}: Searching for first/last dates with data...")
+        probes_before = finder.probes
+        try:
+            found = await finder.find(symbol, BOUNDARY_SEARCH_START, end)
+        except RuntimeError as e:
+            print(f"⚠️  {symbol}: Boundary search skipped ({e})")
+            continue
+        if found is None:
+            print(f"⚠️  {symbol}: No options data found between {BOUNDARY_SEARCH_START} and {end}")
+            continue
+        boundaries[symbol] = found
+        save_boundaries(boundaries, cache_file)
+        print(f"📍 {symbol}: Data from {found['first']} to {found['last']} "
+              f"({finder.probes - probes_before} probes)")
+
+
+def clip_to_coverage(start_date: str, end_date: str, coverage: Optional[dict]):
+    """
+    Narrow a requested date range to a symbol's known coverage.
+
+    Returns:
+        (start, end) tuple, or None if the range lies entirely outside it
+    """
+    if not coverage:
+        return start_date, end_date
+    start = max(start_date, coverage["first"])
+    end = end_date
+    if not coverage.get("open_ended"):
+        end = min(end_date, coverage["last"])
+    if start > end:
+        return None
+    return start, end
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    symbols = sys.argv[1:] or ["QQQ"]
+    results = asyncio.run(discover_boundaries(symbols, refresh=True))
+    for symbol, coverage in results.items():
+        print(f"{symbol}: {coverage['first']} to {coverage['last']}")
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Decoded-Day Cache for the Local Option Store
+
+Parsing a 300 MB day CSV costs seconds every time it is read. The cache
+keeps each decoded day once as an uncompressed Arrow IPC file:
+
+    {DAY_CACHE_DIR}/{interval}/{symbol}/{date}.arrow
+
+which later reads open through a memory map, so loading is near-instant and
+every process reading the same hot day shares one copy in the page cache.
+
+Each file carries the manifest checksum of the day it was decoded from; a
+re-downloaded day has a new checksum, so its stale entry is discarded on the
+next read. Reads touch the file's mtime, and once the cache grows past its
+size cap the least recently read days are removed.
+
+Used by quote_query when DAY_CACHE = True, or warmed ahead of a research job:
+
+    python day_cache.py QQQ 2024-01-02 2024-03-28 --interval 1m
+"""
+
+import argparse
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pyarrow as pa
+
+from progress import format_bytes
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = ".arrow"
+SOURCE_KEY = b"theta_source_checksum"
+
+
+def source_key(day: dict) -> str:
+    """Identity of the downloaded day a cache entry was decoded from."""
+    if day.get("checksum"):
+        return day["checksum"]
+    # Days imported from disk have no checksum; their size is the next best thing
+    return f"bytes:{day.get('bytes')}"
+
+
+class DayCache:
+    """
+    Size-capped LRU cache of decoded days as memory-mapped Arrow IPC files.
+
+    Safe to share between processes: entries are written to a temporary
+    name and renamed into place, and an entry removed while another process
+    has it mapped stays readable until that process drops it.
+    """
+
+    def __init__(self, cache_dir, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, symbol: str, interval: str, date: str) -> Path:
+        return self.cache_dir / interval / symbol / f"{date}{CACHE_SUFFIX}"
+
+    def get(self, symbol: str, interval: str, date: str, key: str) -> Optional[pa.Table]:
+        """
+        Memory-map a cached day, or return None if it is missing or stale.
+
+        The returned table references the mapped file directly; no data is
+        copied until it is filtered or converted.
+        """
+        path = self.path(symbol, interval, date)
+        try:
+            reader = pa.ipc.open_file(pa.memory_map(str(path)))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except pa.ArrowInvalid:
+            logger.warning(f"⚠️  Discarding unreadable cache entry {path}")
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        metadata = reader.schema.metadata or {}
+        if metadata.get(SOURCE_KEY) != key.encode():
+            logger.info(f"♻️  {symbol} {date}: cache entry is stale (day re-downloaded)")
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        # mtime is the LRU clock (atime is unreliable on noatime mounts)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return reader.read_all()
+
+    def put(self, symbol: str, interval: str, date: str, key: str,
+            schema: pa.Schema, batches: Iterable[pa.RecordBatch]) -> pa.Table:
+        """
+        Write a decoded day batch by batch, evict down to the size cap and
+        return the new entry memory-mapped.
+        """
+        path = self.path(symbol, interval, date)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.part")
+        schema = schema.with_metadata({**(schema.metadata or {}), SOURCE_KEY: key.encode()})
+        try:
+            with pa.OSFile(str(temp_path), "wb") as sink:
+                with pa.ipc.new_file(sink, schema) as writer:
+                    for batch in batches:
+                        writer.write_batch(batch)
+            os.replace(temp_path, path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+        self.evict()
+        return table
+
+    def entries(self) -> list:
+        """(mtime, bytes, path) of every cached day, least recently read first."""
+        entries = []
+        for path in self.cache_dir.glob(f"*/*/*{CACHE_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def size(self) -> int:
+        return sum(nbytes for _, nbytes, _ in self.entries())
+
+    def evict(self):
+        """Remove least recently read days until the cache fits its cap."""
+        entries = self.entries()
+        total = sum(nbytes for _, nbytes, _ in entries)
+        for _, nbytes, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= nbytes
+            logger.debug(f"Evicted {path} from the day cache")
+
+    def clear(self) -> int:
+        """Remove every cached day; returns the number removed."""
+        entries = self.entries()
+        for _, _, path in entries:
+            path.unlink(missing_ok=True)
+        return len(entries)
+
+
+def default_cache(force: bool = False) -> Optional[DayCache]:
+    """
+    The cache configured in simple_config, or None when DAY_CACHE is off
+    (unless ``force`` asks for it regardless).
+    """
+    from simple_config import DAY_CACHE, DAY_CACHE_DIR, DAY_CACHE_MAX_GB
+
+    if not (DAY_CACHE or force):
+        return None
+    return DayCache(DAY_CACHE_DIR, int(DAY_CACHE_MAX_GB * 1024 ** 3))
+
+
+def main():
+    from download_manifest import DownloadManifest
+    from quote_query import decode_day
+    from simple_config import DAY_CACHE_DIR, DAY_CACHE_MAX_GB, INTERVAL, MANIFEST_PATH
+
+    parser = argparse.ArgumentParser(description="Warm or clear the decoded-day cache")
+    parser.add_argument("symbol", nargs="?")
+    parser.add_argument("start", nargs="?", help="First date (YYYY-MM-DD)")
+    parser.add_argument("end", nargs="?", help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--interval", default=INTERVAL)
+    parser.add_argument("--cache-dir", default=DAY_CACHE_DIR)
+    parser.add_argument("--clear", action="store_true", help="Remove every cached day")
+    args = parser.parse_args()
+
+    cache = DayCache(args.cache_dir, int(DAY_CACHE_MAX_GB * 1024 ** 3))
+    if args.clear:
+        print(f"🧹 Removed {cache.clear()} cached days from {args.cache_dir}")
+        return
+    if not (args.symbol and args.start and args.end):
+        entries = cache.entries()
+        print(f"📦 {len(entries)} cached days, {format_bytes(cache.size())} "
+              f"of {DAY_CACHE_MAX_GB} GB in {args.cache_dir}")
+        return
+
+    with DownloadManifest(MANIFEST_PATH) as manifest:
+        days = manifest.day_files(args.symbol, args.interval, args.start, args.end)
+    print(f"🔥 Warming {len(days)} {args.symbol} {args.interval} days...")
+    for day in days:
+        if cache.get(args.symbol, args.interval, day["date"], source_key(day)) is None:
+            decode_day(cache, args.symbol, args.interval, day)
+    print(f"✅ {cache.hits} already cached, {cache.misses} decoded "
+          f"({format_bytes(cache.size())} in cache)")
+
+
+if __name__ == "__main__":
+    main()
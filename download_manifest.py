@@ -0,0 +1,377 @@
+"""
+Persistent Download Manifest for Theta Data Downloader
+
+SQLite index of every (symbol, interval, date) the downloader has touched.
+Planning and resume query this index instead of stat-ing or globbing
+thousands of files on the external SSD.
+"""
+
+import os
+import sqlite3
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST_PATH = "results/download_manifest.db"
+
+# Row status values
+STATUS_COMPLETE = "complete"
+STATUS_NO_DATA = "no_data"
+STATUS_FAILED = "failed"
+
+# Statuses that need no further download attempts
+RESOLVED_STATUSES = (STATUS_COMPLETE, STATUS_NO_DATA)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    symbol       TEXT NOT NULL,
+    interval     TEXT NOT NULL,
+    date         TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    path         TEXT,
+    bytes        INTEGER,
+    rows         INTEGER,
+    checksum     TEXT,
+    http_status  INTEGER,
+    started_at   TEXT,
+    completed_at TEXT,
+    updated_at   TEXT NOT NULL,
+    PRIMARY KEY (symbol, interval, date)
+);
+CREATE INDEX IF NOT EXISTS idx_downloads_status
+    ON downloads (symbol, interval, status);
+CREATE TABLE IF NOT EXISTS parquet_files (
+    symbol       TEXT NOT NULL,
+    interval     TEXT NOT NULL,
+    date         TEXT NOT NULL,
+    path         TEXT NOT NULL,
+    rows         INTEGER,
+    bytes        INTEGER,
+    source_bytes INTEGER,
+    ingested_at  TEXT NOT NULL,
+    PRIMARY KEY (symbol, interval, date)
+);
+CREATE TABLE IF NOT EXISTS validations (
+    symbol     TEXT NOT NULL,
+    interval   TEXT NOT NULL,
+    date       TEXT NOT NULL,
+    path       TEXT NOT NULL,
+    bytes      INTEGER,
+    mtime_ns   INTEGER,
+    status     TEXT NOT NULL,
+    problems   TEXT,
+    rows       INTEGER,
+    checked_at TEXT NOT NULL,
+    PRIMARY KEY (symbol, interval, date)
+);
+CREATE TABLE IF NOT EXISTS imports (
+    symbol      TEXT NOT NULL,
+    interval    TEXT NOT NULL,
+    directory   TEXT NOT NULL,
+    files       INTEGER NOT NULL,
+    imported_at TEXT NOT NULL,
+    PRIMARY KEY (symbol, interval, directory)
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class DownloadManifest:
+    """
+    Persistent index of downloaded option days keyed by symbol/interval/date.
+
+    Each row records the download status, byte size, row count, checksum,
+    HTTP status and timestamps of the last attempt.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_MANIFEST_PATH):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        # WAL lets readers (e.g. a second process planning) run during writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def record(self, symbol: str, interval: str, date: str, status: str,
+               path: Optional[str] = None, size: Optional[int] = None,
+               rows: Optional[int] = None, checksum: Optional[str] = None,
+               http_status: Optional[int] = None,
+               started_at: Optional[str] = None,
+               completed_at: Optional[str] = None):
+        """Insert or replace the manifest row for one symbol/interval/date."""
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO downloads
+                (symbol, interval, date, status, path, bytes, rows, checksum,
+                 http_status, started_at, completed_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (symbol, interval, date, status, path, size, rows, checksum,
+             http_status, started_at, completed_at, _now()),
+        )
+        self.conn.commit()
+
+    def set_status(self, symbol: str, interval: str, date: str, status: str) -> bool:
+        """
+        Change the status of an existing row, keeping its path, size, row
+        count and checksum. Returns False if there is no such row.
+        """
+        cursor = self.conn.execute(
+            "UPDATE downloads SET status = ?, updated_at = ? "
+            "WHERE symbol = ? AND interval = ? AND date = ?",
+            (status, _now(), symbol, interval, date),
+        )
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def get(self, symbol: str, interval: str, date: str) -> Optional[dict]:
+        """Return the manifest row for one day, or None if never attempted."""
+        row = self.conn.execute(
+            "SELECT * FROM downloads WHERE symbol = ? AND interval = ? AND date = ?",
+            (symbol, interval, date),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def dates_with_status(self, symbol: str, interval: str,
+                          statuses: Iterable[str]) -> Set[str]:
+        """Return all dates for a symbol/interval whose status is in ``statuses``."""
+        statuses = list(statuses)
+        placeholders = ",".join("?" for _ in statuses)
+        rows = self.conn.execute(
+            f"SELECT date FROM downloads WHERE symbol = ? AND interval = ? "
+            f"AND status IN ({placeholders})",
+            (symbol, interval, *statuses),
+        ).fetchall()
+        return {row["date"] for row in rows}
+
+    def completed_dates(self, symbol: str, interval: str) -> Set[str]:
+        """Return all dates with a complete download for a symbol/interval."""
+        return self.dates_with_status(symbol, interval, [STATUS_COMPLETE])
+
+    def missing_dates(self, symbol: str, interval: str,
+                      dates: Iterable[str]) -> List[str]:
+        """
+        Return the dates from ``dates`` that still need downloading, in order.
+
+        A date is resolved once it is complete or known to have no data.
+        """
+        resolved = self.dates_with_status(symbol, interval, RESOLVED_STATUSES)
+        return [date for date in dates if date not in resolved]
+
+    def nearby_sizes(self, symbol: str, interval: str, date: str,
+                     sample: int = 20) -> List[int]:
+        """
+        Return byte sizes of the ``sample`` complete days closest to ``date``.
+
+        Option chains grow over the years, so nearby days are a far better
+        size estimate than the symbol's overall average.
+        """
+        rows = self.conn.execute(
+            "SELECT bytes FROM downloads "
+            "WHERE symbol = ? AND interval = ? AND status = ? AND bytes IS NOT NULL "
+            "ORDER BY ABS(julianday(date) - julianday(?)) LIMIT ?",
+            (symbol, interval, STATUS_COMPLETE, date, sample),
+        ).fetchall()
+        return [row["bytes"] for row in rows]
+
+    def size_history(self, symbol: str, interval: str) -> List[tuple]:
+        """Return (date, bytes) of every complete day for a symbol/interval, by date."""
+        rows = self.conn.execute(
+            "SELECT date, bytes FROM downloads "
+            "WHERE symbol = ? AND interval = ? AND status = ? AND bytes IS NOT NULL "
+            "ORDER BY date",
+            (symbol, interval, STATUS_COMPLETE),
+        ).fetchall()
+        return [(row["date"], row["bytes"]) for row in rows]
+
+    def record_parquet(self, symbol: str, interval: str, date: str, path: str,
+                       rows: int, size: int, source_bytes: Optional[int]):
+        """Record the Parquet file ingested from one day's CSV."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO parquet_files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (symbol, interval, date, path, rows, size, source_bytes, _now()),
+        )
+        self.conn.commit()
+
+    def parquet_pending(self, symbol: str, interval: str) -> List[dict]:
+        """
+        Return complete downloads with no Parquet copy, or whose CSV changed
+        size since it was ingested (e.g. the day was re-downloaded).
+        """
+        rows = self.conn.execute(
+            "SELECT d.date, d.path, d.bytes FROM downloads d "
+            "LEFT JOIN parquet_files p "
+            "ON p.symbol = d.symbol AND p.interval = d.interval AND p.date = d.date "
+            "WHERE d.symbol = ? AND d.interval = ? AND d.status = ? AND d.path IS NOT NULL "
+            "AND (p.date IS NULL OR p.source_bytes IS NOT d.bytes) "
+            "ORDER BY d.date",
+            (symbol, interval, STATUS_COMPLETE),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def last_complete_day(self, symbol: str, interval: str) -> Optional[dict]:
+        """Return the manifest row of the latest complete day, or None."""
+        row = self.conn.execute(
+            "SELECT * FROM downloads WHERE symbol = ? AND interval = ? AND status = ? "
+            "ORDER BY date DESC LIMIT 1",
+            (symbol, interval, STATUS_COMPLETE),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def day_files(self, symbol: str, interval: str, start_date: str = "0000-01-01",
+                  end_date: str = "9999-12-31") -> List[dict]:
+        """
+        Return the stored files of every complete day in a date range
+        (all complete days by default).
+
+        Each dict has ``date``, ``path`` (the day CSV), ``bytes``,
+        ``checksum`` and ``parquet_path`` (None unless the day's Parquet copy
+        is current), in date order.
+        """
+        rows = self.conn.execute(
+            "SELECT d.date, d.path, d.bytes, d.checksum, p.path AS parquet_path FROM downloads d "
+            "LEFT JOIN parquet_files p "
+            "ON p.symbol = d.symbol AND p.interval = d.interval AND p.date = d.date "
+            "AND p.source_bytes IS d.bytes "
+            "WHERE d.symbol = ? AND d.interval = ? AND d.status = ? "
+            "AND d.date BETWEEN ? AND ? ORDER BY d.date",
+            (symbol, interval, STATUS_COMPLETE, start_date, end_date),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def symbols(self, interval: str) -> List[str]:
+        """Return every symbol with at least one complete day at ``interval``."""
+        rows = self.conn.execute(
+            "SELECT DISTINCT symbol FROM downloads WHERE interval = ? AND status = ? "
+            "ORDER BY symbol",
+            (interval, STATUS_COMPLETE),
+        ).fetchall()
+        return [row["symbol"] for row in rows]
+
+    def record_validation(self, symbol: str, interval: str, date: str, path: str,
+                          size: int, mtime_ns: int, status: str,
+                          problems: Optional[str] = None, rows: Optional[int] = None):
+        """Record the result of validating one day file as it was on disk."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO validations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (symbol, interval, date, path, size, mtime_ns, status, problems, rows, _now()),
+        )
+        self.conn.commit()
+
+    def validations(self, symbol: str, interval: str) -> Dict[str, dict]:
+        """Return {date: validation row} for a symbol/interval."""
+        rows = self.conn.execute(
+            "SELECT * FROM validations WHERE symbol = ? AND interval = ?",
+            (symbol, interval),
+        ).fetchall()
+        return {row["date"]: dict(row) for row in rows}
+
+    def status_counts(self, symbol: str, interval: str) -> Dict[str, int]:
+        """Return a {status: count} summary for a symbol/interval."""
+        rows = self.conn.execute(
+            "SELECT status, COUNT(*) AS n FROM downloads "
+            "WHERE symbol = ? AND interval = ? GROUP BY status",
+            (symbol, interval),
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def import_existing_files(self, symbol: str, interval: str,
+                              output_dir: Path) -> int:
+        """
+        Seed the manifest from files already on disk (one-time migration).
+
+        Each directory is only scanned once; afterwards the manifest is the
+        source of truth. Imported rows have no checksum or row count since
+        computing them would mean re-reading the whole archive, so they
+        stay unverified until validate_store.py checks them.
+
+        Files may predate atomic writes, so a plain CSV that does not end in
+        a complete line is recorded as failed (queued for re-download), the
+        same rule validate_store.py applies; the downloader always ends day
+        files with a newline.
+        Compressed files are recorded without a size: their on-disk size is
+        not the uncompressed byte count downloads record.
+
+        Returns:
+            Number of files imported (0 if the directory was already imported)
+        """
+        output_dir = Path(output_dir)
+        directory = str(output_dir.resolve())
+        already = self.conn.execute(
+            "SELECT 1 FROM imports WHERE symbol = ? AND interval = ? AND directory = ?",
+            (symbol, interval, directory),
+        ).fetchone()
+        if already or not output_dir.exists():
+            return 0
+
+        completed = self.completed_dates(symbol, interval)
+        prefix = f"{symbol}_options_"
+        suffix = f"_{interval}.csv"
+        # Plain and compress-on-write (.csv.zst / .csv.gz) day files
+        suffixes = (suffix, suffix + ".zst", suffix + ".gz")
+        imported = 0
+        truncated = 0
+        now = _now()
+        for entry in os.scandir(output_dir):
+            name = entry.name
+            if not name.startswith(prefix):
+                continue
+            matched = next((s for s in suffixes if name.endswith(s)), None)
+            if matched is None:
+                continue
+            date = name[len(prefix):-len(matched)]
+            if date in completed:
+                continue
+            size = entry.stat().st_size
+            # Same "more than just the header" rule the downloader uses
+            if size <= 100:
+                continue
+            status, completed_at = STATUS_COMPLETE, now
+            if matched == suffix:
+                with open(entry.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        status, completed_at = STATUS_FAILED, None
+                        truncated += 1
+            else:
+                size = None
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO downloads
+                    (symbol, interval, date, status, path, bytes, completed_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (symbol, interval, date, status, entry.path, size, completed_at, now),
+            )
+            imported += 1
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO imports VALUES (?, ?, ?, ?, ?)",
+            (symbol, interval, directory, imported, now),
+        )
+        self.conn.commit()
+        if imported:
+            logger.info(f"Imported {imported} existing {symbol} {interval} files from {output_dir}")
+        if truncated:
+            print(f"⚠️  {symbol}: {truncated} existing files end mid-line and will be downloaded again")
+        return imported
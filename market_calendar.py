@@ -5,16 +5,260 @@ Provides intelligent holiday detection and trading day filtering to avoid
 unnecessary API calls on market holidays and weekends.
 """
 
+import numpy as np
 import pandas as pd
 import pandas_market_calendars as mcal
-from datetime import datetime, timedelta
-from typing import List, Set
+from datetime import date as date_cls, datetime, timedelta
+from typing import List, Optional, Set
 import json
 import os
 import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
+# Range covered by the precomputed schedule (options data starts in 2012;
+# NYSE holidays are published well ahead, so cover a year past today)
+SCHEDULE_START = "2012-01-01"
+SCHEDULE_YEARS_AHEAD = 1
+
+# Ordinal of 1970-01-01, for converting ordinals to numpy datetime64[D]
+_EPOCH_ORDINAL = date_cls(1970, 1, 1).toordinal()
+
+
+def _to_ordinal(date: str) -> int:
+    """YYYY-MM-DD string to proleptic Gregorian ordinal."""
+    return date_cls.fromisoformat(date).toordinal()
+
+
+def _ordinals_to_strings(ordinals: np.ndarray) -> List[str]:
+    """Vectorized ordinal array to YYYY-MM-DD strings."""
+    days = (ordinals - _EPOCH_ORDINAL).astype("datetime64[D]")
+    return np.datetime_as_string(days, unit="D").tolist()
+
+
+class TradingSchedule:
+    """
+    NYSE schedule for SCHEDULE_START..(today + SCHEDULE_YEARS_AHEAD),
+    computed once per process and stored as compact NumPy arrays.
+
+    - ``ordinals``: sorted int32 date ordinals of every session
+    - ``is_session``: bitmap indexed by (ordinal - base), for O(1) checks
+    - ``rank``: sessions on or before each calendar day, for O(1)
+      next/previous lookups
+    - ``open_minutes`` / ``close_minutes``: session open/close in minutes
+      after midnight US/Eastern (early closes included)
+    """
+
+    _instance = None
+
+    def __init__(self, calendar):
+        start = pd.Timestamp(SCHEDULE_START)
+        end = pd.Timestamp.today().normalize() + pd.DateOffset(years=SCHEDULE_YEARS_AHEAD)
+        schedule = calendar.schedule(start_date=start, end_date=end)
+
+        self.first_ordinal = start.date().toordinal()
+        self.last_ordinal = end.date().toordinal()
+        self.ordinals = np.fromiter(
+            (day.toordinal() for day in schedule.index.date), dtype=np.int32, count=len(schedule)
+        )
+        self.is_session = np.zeros(self.last_ordinal - self.first_ordinal + 1, dtype=bool)
+        self.is_session[self.ordinals - self.first_ordinal] = True
+        self.rank = np.cumsum(self.is_session, dtype=np.int32)
+
+        opens = schedule["market_open"].dt.tz_convert("America/New_York")
+        closes = schedule["market_close"].dt.tz_convert("America/New_York")
+        self.open_minutes = (opens.dt.hour * 60 + opens.dt.minute).to_numpy(dtype=np.int16)
+        self.close_minutes = (closes.dt.hour * 60 + closes.dt.minute).to_numpy(dtype=np.int16)
+
+    @classmethod
+    def get(cls, calendar) -> "TradingSchedule":
+        """Shared per-process instance (built on first use)."""
+        if cls._instance is None:
+            cls._instance = cls(calendar)
+        return cls._instance
+
+    def covers(self, ordinal: int) -> bool:
+        return self.first_ordinal <= ordinal <= self.last_ordinal
+
+    def sessions_between(self, start_ordinal: int, end_ordinal: int) -> np.ndarray:
+        """Session ordinals in [start, end] via binary search (no copying)."""
+        lo = np.searchsorted(self.ordinals, start_ordinal, side="left")
+        hi = np.searchsorted(self.ordinals, end_ordinal, side="right")
+        return self.ordinals[lo:hi]
+
+    def is_trading(self, ordinal: int) -> bool:
+        return bool(self.is_session[ordinal - self.first_ordinal])
+
+    def index_of(self, ordinal: int) -> Optional[int]:
+        """Position of a session in ``ordinals`` (None if not a session)."""
+        if not self.is_trading(ordinal):
+            return None
+        return int(self.rank[ordinal - self.first_ordinal]) - 1
+
+    def next_session(self, ordinal: int) -> Optional[int]:
+        """First session strictly after ``ordinal``."""
+        position = int(self.rank[ordinal - self.first_ordinal])
+        return int(self.ordinals[position]) if position < len(self.ordinals) else None
+
+    def previous_session(self, ordinal: int) -> Optional[int]:
+        """Last session strictly before ``ordinal``."""
+        position = int(self.rank[ordinal - self.first_ordinal]) - 1
+        if self.is_trading(ordinal):
+            position -= 1
+        return int(self.ordinals[position]) if position >= 0 else None
+
+class NoDataStore:
+    """
+    Set of (symbol, date) pairs known to return no data.
+
+    The symbol ``"*"`` marks a date with no data for every symbol (e.g. an
+    unscheduled market closure). The set lives in memory and is persisted
+    as an append-only JSON-lines log: marking a date appends one line
+    instead of rewriting the file, discarding one appends a ``"removed"``
+    line, and the log is compacted once it holds many more lines than
+    distinct entries.
+
+    For a symbol's own days the download manifest is authoritative; this
+    store only spares planning a request per known no-data day and is kept
+    in step with it (a day that later downloads is discarded here).
+
+    Appends and compactions hold an exclusive ``flock`` on a sidecar lock
+    file, so any number of coroutines, threads and processes can mark
+    dates at once without corrupting the log.
+    """
+    
+    ALL_SYMBOLS = "*"
+    COMPACT_MIN_LINES = 1000     # Never compact logs smaller than this
+    COMPACT_RATIO = 2.0          # Compact when lines > ratio * distinct entries
+    
+    def __init__(self, log_file: str):
+        self.log_file = log_file
+        self.lock_file = log_file + ".lock"
+        self._thread_lock = threading.Lock()
+        self.entries: Set[tuple] = set()
+        self.log_lines = 0
+        self.reload()
+    
+    @contextmanager
+    def _locked(self):
+        """Hold the in-process and cross-process lock."""
+        with self._thread_lock:
+            os.makedirs(os.path.dirname(self.log_file) or ".", exist_ok=True)
+            fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+    
+    def _read_log(self):
+        entries = set()
+        lines = 0
+        if os.path.exists(self.log_file):
+            with open(self.log_file, 'r') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        record = json.loads(line)
+                        key = (record["symbol"], record["date"])
+                        if record.get("removed"):
+                            entries.discard(key)
+                        else:
+                            entries.add(key)
+                    except (ValueError, KeyError, TypeError):
+                        # A torn last line from a killed process is skipped
+                        continue
+        return entries, lines
+    
+    def reload(self):
+        """Re-read the log (picks up entries written by other processes)."""
+        entries, lines = self._read_log()
+        self.entries = entries
+        self.log_lines = lines
+    
+    def contains(self, date: str, symbol: Optional[str] = None) -> bool:
+        if (self.ALL_SYMBOLS, date) in self.entries:
+            return True
+        return symbol is not None and (symbol, date) in self.entries
+    
+    def dates_for(self, symbol: Optional[str] = None) -> Set[str]:
+        """Dates with no data for ``symbol`` (including all-symbol dates)."""
+        return {
+            date for entry_symbol, date in self.entries
+            if entry_symbol == self.ALL_SYMBOLS or entry_symbol == symbol
+        }
+    
+    def add(self, date: str, symbol: Optional[str] = None) -> bool:
+        """
+        Record a no-data date. Returns False if it was already known.
+        """
+        key = (symbol or self.ALL_SYMBOLS, date)
+        if key in self.entries:
+            return False
+        self._append({"symbol": key[0], "date": date}, lambda: self.entries.add(key))
+        return True
+    
+    def discard(self, date: str, symbol: Optional[str] = None) -> bool:
+        """
+        Forget a no-data date, e.g. once the day has downloaded after all.
+        Returns False if it was not known.
+        """
+        key = (symbol or self.ALL_SYMBOLS, date)
+        if key not in self.entries:
+            return False
+        self._append({"symbol": key[0], "date": date, "removed": True},
+                     lambda: self.entries.discard(key))
+        return True
+    
+    def _append(self, record: dict, apply):
+        """Log one record, then ``apply`` it to the in-memory set."""
+        line = json.dumps(record) + "\n"
+        try:
+            with self._locked():
+                # Single O_APPEND write: concurrent appenders never interleave
+                fd = os.open(self.log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, line.encode())
+                finally:
+                    os.close(fd)
+                apply()
+                self.log_lines += 1
+                if (self.log_lines >= self.COMPACT_MIN_LINES
+                        and self.log_lines > self.COMPACT_RATIO * len(self.entries)):
+                    self._compact_locked()
+        except OSError as e:
+            logger.warning(f"Could not persist no-data date {record['date']}: {e}")
+            apply()
+    
+    def compact(self):
+        """Rewrite the log with one line per distinct entry."""
+        with self._locked():
+            self._compact_locked()
+    
+    def _compact_locked(self):
+        # The log holds every process's additions and removals, ours included
+        entries, _ = self._read_log()
+        self.entries = entries
+        temp_path = self.log_file + ".tmp"
+        with open(temp_path, 'w') as f:
+            for symbol, date in sorted(self.entries, key=lambda entry: (entry[1], entry[0])):
+                f.write(json.dumps({"symbol": symbol, "date": date}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.log_file)
+        self.log_lines = len(self.entries)
+
+
 class MarketCalendar:
     """
     Intelligent market calendar that filters out holidays and non-trading days.
@@ -24,61 +268,76 @@ class MarketCalendar:
     def __init__(self):
         # Use NYSE calendar (covers most US equity options trading)
         self.calendar = mcal.get_calendar('NYSE')
+        self._schedule = None
         self.cache_file = "results/market_holidays_cache.json"
-        self.holiday_cache = self._load_holiday_cache()
+        self.no_data = NoDataStore("results/no_data_dates.jsonl")
+        self._migrate_holiday_cache()
     
-    def _load_holiday_cache(self) -> dict:
-        """Load cached holiday data to avoid repeated API calls."""
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.warning(f"Could not load holiday cache: {e}")
-        return {"known_holidays": [], "no_data_dates": []}
-    
-    def _save_holiday_cache(self):
-        """Save holiday cache for future runs."""
-        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+    def _migrate_holiday_cache(self):
+        """
+        Move no-data dates from the old JSON cache into the append-only
+        store (as all-symbol dates, since the old cache had no symbol).
+        """
+        if not os.path.exists(self.cache_file):
+            return
         try:
-            with open(self.cache_file, 'w') as f:
-                json.dump(self.holiday_cache, f, indent=2)
+            with open(self.cache_file, 'r') as f:
+                legacy_dates = json.load(f).get("no_data_dates", [])
         except Exception as e:
-            logger.warning(f"Could not save holiday cache: {e}")
+            logger.warning(f"Could not load holiday cache: {e}")
+            return
+        for date in legacy_dates:
+            self.no_data.add(date)
+        try:
+            os.replace(self.cache_file, self.cache_file + ".migrated")
+        except OSError as e:
+            logger.warning(f"Could not retire old holiday cache: {e}")
+    
+    @property
+    def schedule(self) -> TradingSchedule:
+        """Precomputed NYSE schedule arrays (built once per process)."""
+        if self._schedule is None:
+            self._schedule = TradingSchedule.get(self.calendar)
+        return self._schedule
     
-    def get_trading_days(self, start_date: str, end_date: str) -> List[str]:
+    def get_trading_day_ordinals(self, start_date: str, end_date: str) -> np.ndarray:
+        """
+        Vectorized range query: session ordinals between two dates (inclusive).
+        
+        Known no-data dates are not filtered here.
+        """
+        start_ord = _to_ordinal(start_date)
+        end_ord = _to_ordinal(end_date)
+        schedule = self.schedule
+        if schedule.covers(start_ord) and schedule.covers(end_ord):
+            return schedule.sessions_between(start_ord, end_ord)
+        # Outside the precomputed range: ask the calendar directly
+        trading_schedule = self.calendar.schedule(start_date=start_date, end_date=end_date)
+        return np.fromiter(
+            (day.toordinal() for day in trading_schedule.index.date), dtype=np.int32
+        )
+    
+    def get_trading_days(self, start_date: str, end_date: str,
+                         symbol: Optional[str] = None) -> List[str]:
         """
         Get list of valid trading days between start_date and end_date.
         
         Args:
             start_date: Start date in YYYY-MM-DD format
             end_date: End date in YYYY-MM-DD format
+            symbol: Also drop dates known to have no data for this symbol
             
         Returns:
             List of trading days in YYYY-MM-DD format
         """
         try:
-            # Convert to pandas datetime
-            start_dt = pd.Timestamp(start_date)
-            end_dt = pd.Timestamp(end_date)
-            
-            # Get valid trading days from market calendar
-            trading_schedule = self.calendar.schedule(
-                start_date=start_dt,
-                end_date=end_dt
+            trading_day_strings = _ordinals_to_strings(
+                self.get_trading_day_ordinals(start_date, end_date)
             )
             
-            # Extract just the dates (no times)
-            trading_days = trading_schedule.index.date
-            
-            # Convert to string format
-            trading_day_strings = [day.strftime('%Y-%m-%d') for day in trading_days]
-            
             # Filter out any cached "no data" dates
-            filtered_days = [
-                day for day in trading_day_strings 
-                if day not in self.holiday_cache.get("no_data_dates", [])
-            ]
+            no_data_dates = self.no_data.dates_for(symbol)
+            filtered_days = [day for day in trading_day_strings if day not in no_data_dates]
             
             logger.info(f"Found {len(filtered_days)} trading days between {start_date} and {end_date}")
             if len(trading_day_strings) - len(filtered_days) > 0:
@@ -91,6 +350,43 @@ class MarketCalendar:
             # Fallback: return all days and let API calls handle filtering
             return self._get_all_days_fallback(start_date, end_date)
     
+    def is_trading_day(self, date: str) -> bool:
+        """O(1) check against the precomputed NYSE schedule."""
+        ordinal = _to_ordinal(date)
+        schedule = self.schedule
+        if schedule.covers(ordinal):
+            return schedule.is_trading(ordinal)
+        return len(self.calendar.schedule(start_date=date, end_date=date)) > 0
+    
+    def next_trading_day(self, date: str) -> Optional[str]:
+        """First trading day strictly after ``date`` (None past the schedule)."""
+        ordinal = _to_ordinal(date)
+        if not self.schedule.covers(ordinal):
+            return None
+        result = self.schedule.next_session(ordinal)
+        return date_cls.fromordinal(result).isoformat() if result is not None else None
+    
+    def previous_trading_day(self, date: str) -> Optional[str]:
+        """Last trading day strictly before ``date`` (None before the schedule)."""
+        ordinal = _to_ordinal(date)
+        if not self.schedule.covers(ordinal):
+            return None
+        result = self.schedule.previous_session(ordinal)
+        return date_cls.fromordinal(result).isoformat() if result is not None else None
+    
+    def session_minutes(self, date: str) -> Optional[tuple]:
+        """
+        (open, close) of a session in minutes after midnight US/Eastern,
+        accounting for early closes. None if ``date`` is not a session.
+        """
+        ordinal = _to_ordinal(date)
+        if not self.schedule.covers(ordinal):
+            return None
+        position = self.schedule.index_of(ordinal)
+        if position is None:
+            return None
+        return int(self.schedule.open_minutes[position]), int(self.schedule.close_minutes[position])
+    
     def _get_all_days_fallback(self, start_date: str, end_date: str) -> List[str]:
         """Fallback method if market calendar fails."""
         start_dt = datetime.strptime(start_date, '%Y-%m-%d')
@@ -107,31 +403,41 @@ class MarketCalendar:
         logger.info("Using fallback day calculation (weekends only filtered)")
         return days
     
-    def mark_no_data_date(self, date: str):
+    def mark_no_data_date(self, date: str, symbol: Optional[str] = None):
         """
         Mark a date as having no data (discovered via API response).
         This prevents future attempts to download this date.
         
         Args:
             date: Date in YYYY-MM-DD format that returned no data
+            symbol: Symbol that had no data, or None for every symbol
+        """
+        if self.no_data.add(date, symbol):
+            scope = symbol or "all symbols"
+            logger.info(f"Marked {date} as no-data date for {scope}")
+    
+    def clear_no_data_date(self, date: str, symbol: Optional[str] = None):
+        """
+        Drop a date marked as having no data, e.g. a recent session the
+        terminal had not published yet that has now downloaded.
         """
-        if date not in self.holiday_cache.get("no_data_dates", []):
-            self.holiday_cache.setdefault("no_data_dates", []).append(date)
-            self._save_holiday_cache()
-            logger.info(f"Marked {date} as no-data date (likely holiday or early close)")
+        if self.no_data.discard(date, symbol):
+            scope = symbol or "all symbols"
+            logger.info(f"Cleared no-data mark on {date} for {scope}")
     
-    def is_likely_trading_day(self, date: str) -> bool:
+    def is_likely_trading_day(self, date: str, symbol: Optional[str] = None) -> bool:
         """
         Quick check if a date is likely a trading day.
         
         Args:
             date: Date in YYYY-MM-DD format
+            symbol: Also check dates known to have no data for this symbol
             
         Returns:
             True if likely a trading day, False otherwise
         """
         # Check cache first
-        if date in self.holiday_cache.get("no_data_dates", []):
+        if self.no_data.contains(date, symbol):
             return False
         
         # Check if it's a weekend
@@ -139,11 +445,9 @@ class MarketCalendar:
         if date_obj.weekday() >= 5:  # Saturday=5, Sunday=6
             return False
         
-        # Quick check against NYSE calendar for major holidays
+        # O(1) check against the precomputed NYSE schedule
         try:
-            # Get single day schedule
-            schedule = self.calendar.schedule(start_date=date, end_date=date)
-            return len(schedule) > 0
+            return self.is_trading_day(date)
         except:
             # Fallback to basic weekend check
             return True
@@ -1,15 +1,31 @@
 #!/usr/bin/env python3
 """
 Multi-Symbol Options Downloader
-Downloads options data for multiple symbols sequentially
+Downloads options data for multiple symbols through one shared scheduler
+
+    python multi_symbol_downloader.py            # backfill START_DATE to END_DATE
+    python multi_symbol_downloader.py update     # only sessions newer than the store
 """
 
+import argparse
 import asyncio
 import subprocess
+import sys
 import time
+from datetime import datetime
 from pathlib import Path
-from simple_config import BASE_URL, MAX_CONCURRENT
-from simple_downloader import download_date_range
+from zoneinfo import ZoneInfo
+from simple_config import (
+    BASE_URL, MAX_CONCURRENT, MANIFEST_PATH, DISCOVER_BOUNDARIES, TERMINALS, LOG_LEVEL,
+    UPDATE_RECHECK_SESSIONS
+)
+from simple_downloader import (
+    WorkItem, plan_symbol_work, interleave_work_items, download_work_items, print_worker_utilization
+)
+from download_manifest import DownloadManifest, STATUS_NO_DATA
+from market_calendar import MarketCalendar
+from data_boundaries import discover_boundaries
+from progress import setup_logging
 
 # List of symbols to download
 SYMBOLS = [
@@ -34,82 +50,148 @@ END_DATE = "2025-08-19"    # Today
 INTERVAL = "1m"
 BASE_OUTPUT_DIR = "/Volumes/SSD 4TB/Theta_Data/options"
 
-async def download_symbol(symbol):
-    """Download options data for a single symbol."""
-    print(f"\n{'='*70}")
-    print(f"🚀 Starting download for {symbol}")
-    print(f"{'='*70}\n")
-    
-    # Create output directory
-    output_dir = Path(BASE_OUTPUT_DIR) / f"{symbol}_1m" / f"{START_DATE}_to_{END_DATE}"
-    output_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Check if already complete by looking for recent files
-    existing_files = list(output_dir.glob(f"{symbol}_options_*.csv"))
-    if existing_files:
-        print(f"📂 Found {len(existing_files)} existing files in {output_dir}")
-        # Check if we have a recent file (within last 7 days)
-        recent_dates = ["2025-08-19", "2025-08-16", "2025-08-15", "2025-08-14", "2025-08-13", "2025-08-12", "2025-08-09"]
-        has_recent = any(output_dir / f"{symbol}_options_{date}_{INTERVAL}.csv" for date in recent_dates if (output_dir / f"{symbol}_options_{date}_{INTERVAL}.csv").exists())
-        if has_recent:
-            print(f"✅ {symbol} appears to be complete (has recent files)")
-            return True
-    
-    try:
-        # Download the data
-        await download_date_range(symbol, START_DATE, END_DATE, INTERVAL, output_dir)
-        print(f"✅ {symbol} download complete!")
-        return True
-    except Exception as e:
-        print(f"❌ Error downloading {symbol}: {e}")
-        return False
+# Update mode: a session counts as downloadable this long after its close
+UPDATE_CLOSE_DELAY_MINUTES = 30
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+
+def symbol_output_dir(symbol):
+    """Output directory for one symbol's day files."""
+    return Path(BASE_OUTPUT_DIR) / f"{symbol}_{INTERVAL}" / f"{START_DATE}_to_{END_DATE}"
+
+def plan_symbol(symbol, manifest, market_cal, coverage=None):
+    """Plan the remaining work items for a single symbol."""
+    output_dir = symbol_output_dir(symbol)
+    work_items = plan_symbol_work(symbol, START_DATE, END_DATE, INTERVAL, output_dir, manifest,
+                                  market_cal, coverage)
+    if not work_items:
+        print(f"✅ {symbol} is complete (all trading days resolved in manifest)")
+    return work_items
+
+def latest_closed_session(market_cal, now=None):
+    """Most recent session whose data should be available by ``now``."""
+    now = now or datetime.now(MARKET_TIMEZONE)
+    today = now.date().isoformat()
+    hours = market_cal.session_minutes(today)
+    if hours and now.hour * 60 + now.minute >= hours[1] + UPDATE_CLOSE_DELAY_MINUTES:
+        return today
+    return market_cal.previous_trading_day(today)
+
+def plan_symbol_update(symbol, manifest, market_cal, latest_session):
+    """
+    Plan only the sessions after the symbol's last complete day.
 
-async def main():
-    """Download all symbols sequentially."""
+    New days go next to the symbol's existing files. Gaps before the last
+    complete day are left to a backfill run. Days among the newest
+    UPDATE_RECHECK_SESSIONS recorded as no data are planned again.
+    """
+    last = manifest.last_complete_day(symbol, INTERVAL)
+    if last is None:
+        print(f"⏭️  {symbol}: Nothing downloaded yet - run a backfill first")
+        return []
+    start_date = market_cal.next_trading_day(last["date"])
+    if start_date is None or latest_session is None or start_date > latest_session:
+        print(f"✅ {symbol} is up to date (last complete day {last['date']})")
+        return []
+    output_dir = Path(last["path"]).parent if last["path"] else symbol_output_dir(symbol)
+    work_items = plan_symbol_work(symbol, start_date, latest_session, INTERVAL, output_dir,
+                                  manifest, market_cal)
+
+    recent = []
+    day = latest_session
+    while day is not None and day >= start_date and len(recent) < UPDATE_RECHECK_SESSIONS:
+        recent.append(day)
+        day = market_cal.previous_trading_day(day)
+    no_data = manifest.dates_with_status(symbol, INTERVAL, [STATUS_NO_DATA])
+    planned = {item.date for item in work_items}
+    recheck = [day for day in reversed(recent) if day in no_data and day not in planned]
+    if recheck:
+        print(f"🔁 {symbol}: Asking again for {len(recheck)} recent no-data day(s): {', '.join(recheck)}")
+        work_items += [WorkItem(symbol, day, INTERVAL, output_dir) for day in recheck]
+    return work_items
+
+async def main(mode="backfill", symbols=None):
+    """
+    Download all symbols through one shared scheduler and return the run summary.
+
+    ``mode`` is "backfill" (every missing day from START_DATE to END_DATE) or
+    "update" (only sessions newer than each symbol's last complete day).
+    """
+    manifest = DownloadManifest(MANIFEST_PATH)
+    market_cal = MarketCalendar()
+    latest_session = latest_closed_session(market_cal) if mode == "update" else None
+    
     print("🎯 Multi-Symbol Options Downloader")
-    print(f"   Symbols: {', '.join(SYMBOLS)}")
-    print(f"   Date Range: {START_DATE} to {END_DATE}")
+    print(f"   Symbols: {', '.join(symbols or SYMBOLS)}")
+    if mode == "update":
+        print(f"   Mode: update (new sessions through {latest_session})")
+    else:
+        print(f"   Date Range: {START_DATE} to {END_DATE}")
     print(f"   Interval: {INTERVAL}")
     print(f"   Output Base: {BASE_OUTPUT_DIR}")
+    print(f"   Terminals: {len(TERMINALS)} (starting concurrency {MAX_CONCURRENT} each)")
     print()
     
-    results = {}
+    if symbols is None:
+        symbols = SYMBOLS
+        # Skip SPY if it's already running
+        if mode == "backfill" and symbols[0] == "SPY":
+            print("⏭️  Skipping SPY (already running in separate process)")
+            symbols = symbols[1:]
+    
+    # Plan every symbol up front so all (symbol, date) items share one
+    # connection pool and one concurrency limit
+    if mode == "update":
+        per_symbol_items = [
+            plan_symbol_update(symbol, manifest, market_cal, latest_session) for symbol in symbols
+        ]
+    else:
+        boundaries = {}
+        if DISCOVER_BOUNDARIES:
+            boundaries = await discover_boundaries(symbols, market_cal)
+        per_symbol_items = [
+            plan_symbol(symbol, manifest, market_cal, boundaries.get(symbol)) for symbol in symbols
+        ]
+    work_items = interleave_work_items(per_symbol_items)
     
-    # Skip SPY if it's already running
-    start_idx = 0
-    if SYMBOLS[0] == "SPY":
-        print("⏭️  Skipping SPY (already running in separate process)")
-        start_idx = 1
+    print(f"\n📋 {len(work_items)} days to download across {len(symbols)} symbols\n")
     
-    # Download each symbol
-    for symbol in SYMBOLS[start_idx:]:
-        success = await download_symbol(symbol)
-        results[symbol] = success
-        
-        if success:
-            print(f"✅ {symbol}: Successfully downloaded")
-        else:
-            print(f"❌ {symbol}: Failed to download")
-        
-        # Brief pause between symbols
-        if symbol != SYMBOLS[-1]:
-            print(f"\n⏰ Waiting 5 seconds before next symbol...")
-            await asyncio.sleep(5)
+    summary = None
+    if work_items:
+        summary = await download_work_items(work_items, manifest, market_cal=market_cal)
+        print()
+        print_worker_utilization(summary["worker_busy"], summary["elapsed"], summary["limit_seconds"])
     
     # Print summary
     print(f"\n{'='*70}")
     print("📊 DOWNLOAD SUMMARY")
     print(f"{'='*70}")
     
+    results = {}
+    for symbol in symbols:
+        counts = summary["per_symbol"].get(symbol) if summary else None
+        results[symbol] = counts is None or counts["failed"] == 0
+        if counts:
+            print(f"   {symbol}: {counts['successful']} downloaded, {counts['no_data']} no data, "
+                  f"{counts['failed']} failed")
+    
     successful = [s for s, r in results.items() if r]
     failed = [s for s, r in results.items() if not r]
     
     if successful:
         print(f"✅ Successful ({len(successful)}): {', '.join(successful)}")
     if failed:
-        print(f"❌ Failed ({len(failed)}): {', '.join(failed)}")
+        print(f"❌ With failed days ({len(failed)}): {', '.join(failed)}")
     
     print(f"\nTotal: {len(successful)}/{len(results)} symbols downloaded successfully")
+    return summary
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Download options data for multiple symbols")
+    parser.add_argument("mode", nargs="?", choices=["backfill", "update"], default="backfill",
+                        help="update fetches only sessions newer than the store (for cron)")
+    parser.add_argument("--symbols", nargs="+", help="Override SYMBOLS")
+    args = parser.parse_args()
+    setup_logging(LOG_LEVEL)
+    summary = asyncio.run(main(args.mode, args.symbols))
+    # Non-zero exit when days failed, so cron can alert
+    sys.exit(1 if summary and summary["failed"] else 0)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Parquet Ingest for Theta Data Downloader
+
+Converts downloaded day CSVs into typed, zstd-compressed Parquet files laid
+out as a hive-partitioned dataset:
+
+    {PARQUET_DIR}/{interval}/symbol=QQQ/year=2024/date=2024-01-02/part-0.parquet
+
+Each CSV is read as a stream of record batches, so memory stays bounded by
+PARQUET_ROW_GROUP_ROWS regardless of the day's size. Rows are sorted by
+contract (expiration, strike, right) and time within every row group, which
+keeps per-contract reads to a few row groups. Only that per-group order is
+guaranteed: sorting the whole day would mean holding it in memory, so a
+day larger than one row group is in contract order across groups only if
+the CSV already was. Readers needing a fully ordered day sort it
+themselves, as resample.py does.
+
+Runs inline after each download (PARQUET_INGEST = True) or as a batch over
+the existing CSV store:
+
+    python parquet_ingest.py QQQ SPY --interval 1m
+"""
+
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from progress import format_bytes
+
+logger = logging.getLogger(__name__)
+
+TEMP_SUFFIX = ".part"
+CSV_BLOCK_SIZE = 16 * 1024 * 1024  # Bytes of CSV parsed per record batch
+
+# Types for the quote columns we know; anything else is inferred. Strings
+# such as symbol and right are dictionary-encoded by Parquet on write.
+COLUMN_TYPES = {
+    "symbol": pa.string(),
+    "expiration": pa.date32(),
+    "strike": pa.float64(),
+    "right": pa.string(),
+    "timestamp": pa.timestamp("ms"),
+    "bid_size": pa.int32(),
+    "bid_exchange": pa.int16(),
+    "bid": pa.float64(),
+    "bid_condition": pa.int16(),
+    "ask_size": pa.int32(),
+    "ask_exchange": pa.int16(),
+    "ask": pa.float64(),
+    "ask_condition": pa.int16(),
+}
+
+# Row order within each row group (not across groups): contract, then time
+SORT_COLUMNS = ["expiration", "strike", "right", "timestamp"]
+
+
+def parquet_path(parquet_dir, symbol: str, date: str, interval: str) -> Path:
+    """Location of one day in the partitioned dataset."""
+    return (Path(parquet_dir) / interval / f"symbol={symbol}" / f"year={date[:4]}"
+            / f"date={date}" / "part-0.parquet")
+
+
+def dataset_root(parquet_dir, interval: str) -> Path:
+    """Root of one interval's dataset (open with partitioning="hive")."""
+    return Path(parquet_dir) / interval
+
+
+def open_csv_batches(csv_path, columns: Optional[List[str]] = None):
+    """
+    Stream a day CSV (plain, .zst or .gz) as typed record batches.
+
+    ``csv_path`` may also be an open binary file object. With ``columns``
+    only those columns are converted; the rest of each line is skipped by
+    the parser.
+    """
+    if hasattr(csv_path, "read"):
+        source = csv_path
+    else:
+        source = pa.input_stream(str(csv_path), compression="detect")
+    return pa_csv.open_csv(
+        source,
+        read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+        convert_options=pa_csv.ConvertOptions(column_types=COLUMN_TYPES,
+                                              include_columns=columns),
+    )
+
+
+def _sorted(table: pa.Table) -> pa.Table:
+    keys = [(column, "ascending") for column in SORT_COLUMNS if column in table.column_names]
+    if not keys:
+        return table
+    return table.take(pc.sort_indices(table, sort_keys=keys))
+
+
+def ingest_csv(csv_path, out_path, row_group_rows: int = 1_000_000,
+               compression: str = "zstd", compression_level: int = 3) -> Tuple[int, int]:
+    """
+    Convert one day CSV into a Parquet file, atomically.
+
+    Every ``row_group_rows`` rows are sorted and written as one row group;
+    rows are never reordered across groups.
+
+    Returns:
+        Tuple of (rows written, Parquet file bytes)
+    """
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = out_path.with_name(out_path.name + TEMP_SUFFIX)
+
+    reader = open_csv_batches(csv_path)
+    rows = 0
+    pending = []
+    pending_rows = 0
+    writer = None
+    try:
+        writer = pq.ParquetWriter(temp_path, reader.schema, compression=compression,
+                                  compression_level=compression_level)
+
+        def flush():
+            nonlocal pending, pending_rows, rows
+            if not pending:
+                return
+            table = _sorted(pa.Table.from_batches(pending, schema=reader.schema))
+            writer.write_table(table, row_group_size=len(table))
+            rows += len(table)
+            pending, pending_rows = [], 0
+
+        for batch in reader:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= row_group_rows:
+                flush()
+        flush()
+        writer.close()
+        writer = None
+        with open(temp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(temp_path, out_path)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        temp_path.unlink(missing_ok=True)
+        raise
+    return rows, out_path.stat().st_size
+
+
+def ingest_day(csv_path, symbol: str, date: str, interval: str, parquet_dir,
+               row_group_rows: int = 1_000_000, delete_csv: bool = False) -> dict:
+    """
+    Ingest one downloaded day into the dataset (process pool entry point).
+
+    Returns:
+        Dict with symbol, interval, date, path, rows, bytes and source_bytes
+    """
+    csv_path = Path(csv_path)
+    source_bytes = csv_path.stat().st_size
+    out_path = parquet_path(parquet_dir, symbol, date, interval)
+    rows, size = ingest_csv(csv_path, out_path, row_group_rows)
+    if delete_csv:
+        csv_path.unlink()
+    return {
+        "symbol": symbol,
+        "interval": interval,
+        "date": date,
+        "path": str(out_path),
+        "rows": rows,
+        "bytes": size,
+        "source_bytes": source_bytes,
+    }
+
+
+def ingest_symbol(manifest, symbol: str, interval: str, parquet_dir,
+                  workers: Optional[int] = None, row_group_rows: int = 1_000_000,
+                  delete_csv: bool = False) -> dict:
+    """
+    Batch-ingest every complete day of a symbol not yet in the dataset.
+
+    Returns:
+        Dict with ingested/failed counts and CSV/Parquet byte totals
+    """
+    pending = manifest.parquet_pending(symbol, interval)
+    totals = {"ingested": 0, "failed": 0, "csv_bytes": 0, "parquet_bytes": 0}
+    if not pending:
+        print(f"✅ {symbol}: All {interval} days already in Parquet")
+        return totals
+
+    print(f"🗜️  {symbol}: Converting {len(pending)} {interval} days to Parquet...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(ingest_day, row["path"], symbol, row["date"], interval, parquet_dir,
+                        row_group_rows, delete_csv): row
+            for row in pending
+        }
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                totals["failed"] += 1
+                print(f"❌ {symbol} {row['date']}: Parquet ingest failed - {e}")
+                continue
+            manifest.record_parquet(symbol, interval, row["date"], result["path"],
+                                    result["rows"], result["bytes"], row["bytes"])
+            totals["ingested"] += 1
+            totals["csv_bytes"] += result["source_bytes"]
+            totals["parquet_bytes"] += result["bytes"]
+
+    ratio = totals["csv_bytes"] / totals["parquet_bytes"] if totals["parquet_bytes"] else 0
+    print(f"✅ {symbol}: {totals['ingested']} days ingested "
+          f"({format_bytes(totals['csv_bytes'])} CSV → "
+          f"{format_bytes(totals['parquet_bytes'])} Parquet, {ratio:.1f}x)")
+    return totals
+
+
+def main():
+    from download_manifest import DownloadManifest
+    from simple_config import (
+        INTERVAL, MANIFEST_PATH, PARQUET_DIR, PARQUET_ROW_GROUP_ROWS, PARQUET_DELETE_CSV
+    )
+
+    parser = argparse.ArgumentParser(description="Convert downloaded day CSVs to Parquet")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--interval", default=INTERVAL)
+    parser.add_argument("--parquet-dir", default=PARQUET_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--delete-csv", action="store_true", default=PARQUET_DELETE_CSV,
+                        help="Remove each CSV once its Parquet copy is written")
+    args = parser.parse_args()
+
+    with DownloadManifest(MANIFEST_PATH) as manifest:
+        for symbol in args.symbols:
+            ingest_symbol(manifest, symbol, args.interval, args.parquet_dir,
+                          args.workers, PARQUET_ROW_GROUP_ROWS, args.delete_csv)
+
+
+if __name__ == "__main__":
+    main()
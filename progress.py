@@ -0,0 +1,221 @@
+"""
+Byte-Rate Progress Reporting for Theta Data Downloader
+
+Day files range from tens to hundreds of MB, so progress is tracked in
+bytes as well as files: a moving-window MB/s that includes bytes still
+streaming, and an ETA from the expected size of the days that remain.
+The bar is redrawn by its own task at a fixed low rate instead of on
+every completed request, and log records clear the bar line before they
+are written so the two never interleave.
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+REFRESH_INTERVAL = 1.0        # Seconds between redraws on a terminal
+PLAIN_REFRESH_INTERVAL = 30.0  # Seconds between progress lines when not a TTY
+RATE_WINDOW = 30.0            # Seconds of history behind the MB/s figure
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def format_bytes(nbytes: float) -> str:
+    if nbytes >= 1024 ** 3:
+        return f"{nbytes / 1024 ** 3:.1f} GB"
+    return f"{nbytes / 1024 ** 2:.0f} MB"
+
+
+class ByteRateProgress:
+    """
+    Files and bytes progress for one download run.
+
+    ``expected_bytes`` maps each work item to its expected size (None when
+    the manifest has no nearby days); unknown items are costed at the mean
+    size of the days completed so far.
+    """
+
+    def __init__(self, work_items: List, expected_bytes: Optional[Dict] = None,
+                 stream=None, refresh_interval: Optional[float] = None,
+                 rate_window: float = RATE_WINDOW):
+        self.stream = stream or sys.stdout
+        self.is_tty = hasattr(self.stream, "isatty") and self.stream.isatty()
+        if refresh_interval is None:
+            refresh_interval = REFRESH_INTERVAL if self.is_tty else PLAIN_REFRESH_INTERVAL
+        self.refresh_interval = refresh_interval
+        self.rate_window = rate_window
+
+        expected_bytes = expected_bytes or {}
+        self.total_files = len(work_items)
+        self.pending = {item: expected_bytes.get(item) for item in work_items}
+        self.completed = 0
+        self.completed_bytes = 0
+        self.sized_completed = 0
+        self.in_flight = []
+        self.start_time = time.time()
+        self.samples = deque()
+        self._task = None
+        self._drawn = False
+
+    # ------------------------------------------------------------------
+    # Updates from the workers
+    # ------------------------------------------------------------------
+
+    def start_request(self, request_stats: dict):
+        """Count bytes from ``request_stats["streamed"]`` while it downloads."""
+        self.in_flight.append(request_stats)
+
+    def end_request(self, request_stats: dict):
+        try:
+            self.in_flight.remove(request_stats)
+        except ValueError:
+            pass
+
+    def file_done(self, item, nbytes: int = 0):
+        """Mark one work item settled (downloaded, no data or failed)."""
+        self.pending.pop(item, None)
+        self.completed += 1
+        self.completed_bytes += nbytes
+        if nbytes:
+            self.sized_completed += 1
+
+    # ------------------------------------------------------------------
+    # Figures
+    # ------------------------------------------------------------------
+
+    def bytes_received(self) -> int:
+        return self.completed_bytes + sum(stats.get("streamed", 0) for stats in self.in_flight)
+
+    def rate(self) -> float:
+        """Bytes per second over the last ``rate_window`` seconds."""
+        now = time.time()
+        received = self.bytes_received()
+        self.samples.append((now, received))
+        while len(self.samples) > 2 and now - self.samples[0][0] > self.rate_window:
+            self.samples.popleft()
+        first_time, first_bytes = self.samples[0]
+        if now - first_time < 1e-3:
+            elapsed = now - self.start_time
+            return received / elapsed if elapsed > 0 else 0.0
+        return (received - first_bytes) / (now - first_time)
+
+    def remaining_bytes(self) -> Optional[float]:
+        """Expected bytes still to come, or None before any size is known."""
+        mean = self.completed_bytes / self.sized_completed if self.sized_completed else None
+        remaining = 0.0
+        for expected in self.pending.values():
+            if expected is None:
+                if mean is None:
+                    return None
+                expected = mean
+            remaining += expected
+        streamed = sum(stats.get("streamed", 0) for stats in self.in_flight)
+        return max(0.0, remaining - streamed)
+
+    def render(self) -> str:
+        rate = self.rate()
+        received = self.bytes_received()
+        remaining = self.remaining_bytes()
+        elapsed = time.time() - self.start_time
+        files_rate = self.completed / elapsed if elapsed > 0 else 0.0
+
+        if remaining is not None and received + remaining > 0:
+            fraction = received / (received + remaining)
+        else:
+            fraction = self.completed / self.total_files if self.total_files else 1.0
+        bar_length = 20
+        filled = int(bar_length * fraction)
+        bar = '█' * filled + '░' * (bar_length - filled)
+
+        if remaining is not None and rate > 0:
+            eta = format_duration(remaining / rate)
+        else:
+            eta = "Calculating..."
+        total = f" / ~{format_bytes(received + remaining)}" if remaining is not None else ""
+        return (f"📈 [{bar}] {fraction * 100:.1f}% ({self.completed}/{self.total_files}) | "
+                f"{format_bytes(received)}{total} | {rate / 1024 / 1024:.1f} MB/s | "
+                f"{files_rate:.2f} files/s | ETA: {eta}")
+
+    # ------------------------------------------------------------------
+    # Rendering
+    # ------------------------------------------------------------------
+
+    def draw(self):
+        line = self.render()
+        if self.is_tty:
+            self.stream.write(f"\r\033[K{line}")
+            self._drawn = True
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+
+    def clear(self):
+        """Erase the bar so another line can be written in its place."""
+        if self._drawn:
+            self.stream.write("\r\033[K")
+            self.stream.flush()
+            self._drawn = False
+
+    async def _render_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            self.draw()
+
+    def start(self):
+        global _active_progress
+        _active_progress = self
+        self._task = asyncio.create_task(self._render_loop())
+
+    async def stop(self):
+        """Stop redrawing and leave the final state on its own line."""
+        global _active_progress
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.draw()
+        if self.is_tty:
+            self.stream.write("\n")
+            self.stream.flush()
+            self._drawn = False
+        if _active_progress is self:
+            _active_progress = None
+
+
+# The bar currently on screen, cleared by ProgressAwareHandler before logging
+_active_progress = None
+
+
+class ProgressAwareHandler(logging.StreamHandler):
+    """Log handler that erases the progress bar before each record."""
+
+    def emit(self, record):
+        if _active_progress is not None and _active_progress.stream is self.stream:
+            _active_progress.clear()
+        super().emit(record)
+
+
+def setup_logging(level: str = "WARNING"):
+    """
+    Route log records to stdout without tearing the progress bar.
+
+    Per-request messages are logged at DEBUG/INFO, so they stay hidden
+    unless ``level`` is lowered.
+    """
+    handler = ProgressAwareHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, ProgressAwareHandler):
+            root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, str(level).upper(), logging.WARNING))
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Quote Query API for the Local Option Store
+
+Reads option quotes for a symbol and date range straight from the store the
+downloader builds, without opening whole day CSVs by hand:
+
+    from quote_query import load_quotes
+    df = load_quotes("QQQ", "2024-01-02", "2024-01-31",
+                     expirations=["2024-02-16"], right="C",
+                     time_range=("09:30", "10:30"))
+
+Only the days in range that the manifest lists as complete are opened, and
+every filter is pushed into the reader: days ingested to Parquet skip row
+groups by their column statistics, plain day CSVs with a byte-range index
+(csv_index.py) parse only the ranges holding matching contracts and times,
+and any other day CSV (plain, .zst or .gz) is parsed as a stream of record
+batches with only the requested columns converted, each batch filtered
+before the next is read. Nothing larger than one batch is held unless the
+caller collects the result.
+
+``iter_quotes`` yields Arrow record batches; ``load_quotes`` collects them
+into a pandas DataFrame (or an Arrow table with ``as_arrow=True``).
+"""
+
+import argparse
+import logging
+from datetime import date, datetime, time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+import csv_index
+from day_cache import DayCache, default_cache, source_key
+from download_manifest import DownloadManifest
+from parquet_ingest import COLUMN_TYPES, open_csv_batches
+
+logger = logging.getLogger(__name__)
+
+# Accepted spellings of the option right, mapped to the value in the data
+RIGHTS = {"C": "CALL", "CALL": "CALL", "P": "PUT", "PUT": "PUT"}
+
+# Columns the contract and time filters refer to
+FILTER_COLUMNS = ["expiration", "strike", "right", "timestamp"]
+
+DateLike = Union[str, date]
+TimeLike = Union[str, time]
+
+
+def _to_date(value: DateLike) -> date:
+    """Parse 'YYYY-MM-DD', 'YYYYMMDD' or a date/datetime."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    return datetime.strptime(text, "%Y%m%d" if "-" not in text else "%Y-%m-%d").date()
+
+
+def _to_time(value: TimeLike) -> time:
+    """Parse 'HH:MM', 'HH:MM:SS' or a time."""
+    if isinstance(value, time):
+        return value
+    return time.fromisoformat(str(value).strip())
+
+
+def build_filter(expirations: Optional[Iterable[DateLike]] = None,
+                 strikes: Optional[Iterable[float]] = None,
+                 strike_range: Optional[Tuple[float, float]] = None,
+                 right: Optional[str] = None) -> Optional[pc.Expression]:
+    """
+    Contract filter shared by every day of a query (None matches all rows).
+
+    Args:
+        expirations: Expiration dates to keep
+        strikes: Exact strikes to keep, in dollars
+        strike_range: Inclusive (low, high) strike bounds
+        right: 'C'/'CALL' or 'P'/'PUT'
+    """
+    conditions = []
+    if expirations is not None:
+        values = pa.array(sorted({_to_date(value) for value in expirations}), pa.date32())
+        conditions.append(pc.field("expiration").isin(values))
+    if strikes is not None:
+        values = pa.array(sorted({float(value) for value in strikes}), pa.float64())
+        conditions.append(pc.field("strike").isin(values))
+    if strike_range is not None:
+        low, high = strike_range
+        conditions.append((pc.field("strike") >= float(low)) & (pc.field("strike") <= float(high)))
+    if right is not None:
+        key = str(right).upper()
+        if key not in RIGHTS:
+            raise ValueError(f"Unknown option right {right!r} (use 'C', 'P', 'CALL' or 'PUT')")
+        conditions.append(pc.field("right") == RIGHTS[key])
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def time_filter(day: str, time_range: Optional[Tuple[TimeLike, TimeLike]],
+                first: str = "timestamp", last: str = "timestamp") -> Optional[pc.Expression]:
+    """
+    Inclusive time-of-day bounds for one day.
+
+    Matches rows whose ``first``..``last`` span overlaps the range; for
+    quotes both are ``timestamp``, for CSV index segments first_ts/last_ts.
+    """
+    if time_range is None:
+        return None
+    session_date = _to_date(day)
+    start, end = (datetime.combine(session_date, _to_time(value)) for value in time_range)
+    timestamp_type = COLUMN_TYPES["timestamp"]
+    return ((pc.field(last) >= pa.scalar(start, timestamp_type))
+            & (pc.field(first) <= pa.scalar(end, timestamp_type)))
+
+
+def _combine(*expressions: Optional[pc.Expression]) -> Optional[pc.Expression]:
+    combined = None
+    for expression in expressions:
+        if expression is not None:
+            combined = expression if combined is None else combined & expression
+    return combined
+
+
+def _read_columns(columns: Optional[Sequence[str]], expression: Optional[pc.Expression],
+                  filter_columns: Sequence[str]) -> Optional[List[str]]:
+    """Columns to parse: the requested ones plus any the filter needs."""
+    if columns is None:
+        return None
+    needed = list(columns)
+    if expression is not None:
+        needed += [column for column in filter_columns if column not in needed]
+    return needed
+
+
+def read_parquet_day(path, expression: Optional[pc.Expression] = None,
+                     columns: Optional[Sequence[str]] = None) -> Iterator[pa.RecordBatch]:
+    """Stream one Parquet day, skipping row groups the filter rules out."""
+    dataset = ds.dataset(str(path), format="parquet")
+    yield from dataset.to_batches(columns=list(columns) if columns else None,
+                                  filter=expression)
+
+
+def read_csv_day(path, expression: Optional[pc.Expression] = None,
+                 columns: Optional[Sequence[str]] = None,
+                 index_filter: Optional[pc.Expression] = None) -> Iterator[pa.RecordBatch]:
+    """
+    Stream one day CSV, filtering each parsed batch as it arrives.
+
+    With ``index_filter`` and a current byte-range index only the ranges
+    the index selects are parsed; otherwise the whole file is streamed.
+    """
+    read_columns = _read_columns(columns, expression, FILTER_COLUMNS)
+    ranges = csv_index.lookup(path, index_filter) if index_filter is not None else None
+    if ranges is not None:
+        reader = csv_index.read_ranges(path, ranges, read_columns)
+    else:
+        reader = open_csv_batches(path, read_columns)
+    for batch in reader:
+        if expression is not None:
+            table = pa.Table.from_batches([batch]).filter(expression)
+            if not table.num_rows:
+                continue
+            if columns is not None:
+                table = table.select(list(columns))
+            yield from table.to_batches()
+        else:
+            yield batch
+
+
+def read_cached_day(table: pa.Table, expression: Optional[pc.Expression] = None,
+                    columns: Optional[Sequence[str]] = None) -> Iterator[pa.RecordBatch]:
+    """Filter a memory-mapped day; only matching rows are copied out."""
+    if expression is not None:
+        table = table.filter(expression)
+    if columns is not None:
+        table = table.select(list(columns))
+    yield from table.to_batches()
+
+
+def day_source(day: dict) -> Optional[Tuple[str, str]]:
+    """("parquet" or "csv", path) of the best file on disk for a day."""
+    parquet_path = day.get("parquet_path")
+    if parquet_path and Path(parquet_path).exists():
+        return "parquet", parquet_path
+    if day.get("path") and Path(day["path"]).exists():
+        return "csv", day["path"]
+    return None
+
+
+def decode_day(cache: DayCache, symbol: str, interval: str, day: dict) -> Optional[pa.Table]:
+    """Decode a whole day into the cache and return it memory-mapped."""
+    source = day_source(day)
+    if source is None:
+        return None
+    kind, path = source
+    logger.debug(f"{symbol} {day['date']}: decoding {path} into the day cache")
+    if kind == "parquet":
+        reader = ds.dataset(path, format="parquet").scanner().to_reader()
+    else:
+        reader = open_csv_batches(path)
+    return cache.put(symbol, interval, day["date"], source_key(day), reader.schema, reader)
+
+
+def iter_quotes(symbol: str, start: DateLike, end: DateLike, interval: Optional[str] = None,
+                expirations: Optional[Iterable[DateLike]] = None,
+                strikes: Optional[Iterable[float]] = None,
+                strike_range: Optional[Tuple[float, float]] = None,
+                right: Optional[str] = None,
+                time_range: Optional[Tuple[TimeLike, TimeLike]] = None,
+                columns: Optional[Sequence[str]] = None,
+                manifest: Optional[DownloadManifest] = None,
+                cache: Union[DayCache, bool, None] = None) -> Iterator[pa.RecordBatch]:
+    """
+    Stream quotes for ``symbol`` between ``start`` and ``end`` (inclusive).
+
+    Days are read in date order from their Parquet copy when it is current,
+    otherwise from the downloaded CSV. Days the manifest does not list as
+    complete are skipped.
+
+    With a day cache each day is decoded whole on its first read and
+    memory-mapped from then on. ``cache`` is a DayCache, True for the one
+    in DAY_CACHE_DIR even when DAY_CACHE is off, False to bypass caching,
+    or None to follow DAY_CACHE.
+
+    Yields:
+        Arrow record batches containing only matching rows
+    """
+    from simple_config import INTERVAL, MANIFEST_PATH
+
+    interval = interval or INTERVAL
+    start_date, end_date = _to_date(start).isoformat(), _to_date(end).isoformat()
+    contract_filter = build_filter(expirations, strikes, strike_range, right)
+    if cache is None or cache is True:
+        cache = default_cache(force=cache is True)
+
+    own_manifest = manifest is None
+    if own_manifest:
+        manifest = DownloadManifest(MANIFEST_PATH)
+    try:
+        days = manifest.day_files(symbol, interval, start_date, end_date)
+    finally:
+        if own_manifest:
+            manifest.close()
+
+    for day in days:
+        expression = _combine(contract_filter, time_filter(day["date"], time_range))
+        index_filter = _combine(contract_filter,
+                                time_filter(day["date"], time_range, "first_ts", "last_ts"))
+        source = day_source(day)
+        if source is None:
+            logger.warning(f"⚠️  {symbol} {day['date']}: no day file on disk, skipping")
+            continue
+
+        if cache:
+            table = cache.get(symbol, interval, day["date"], source_key(day))
+            if table is None:
+                table = decode_day(cache, symbol, interval, day)
+            yield from read_cached_day(table, expression, columns)
+            continue
+
+        kind, path = source
+        logger.debug(f"{symbol} {day['date']}: reading {path}")
+        if kind == "parquet":
+            yield from read_parquet_day(path, expression, columns)
+        else:
+            yield from read_csv_day(path, expression, columns, index_filter)
+
+
+def load_quotes(symbol: str, start: DateLike, end: DateLike, interval: Optional[str] = None,
+                expirations: Optional[Iterable[DateLike]] = None,
+                strikes: Optional[Iterable[float]] = None,
+                strike_range: Optional[Tuple[float, float]] = None,
+                right: Optional[str] = None,
+                time_range: Optional[Tuple[TimeLike, TimeLike]] = None,
+                columns: Optional[Sequence[str]] = None,
+                manifest: Optional[DownloadManifest] = None,
+                cache: Union[DayCache, bool, None] = None,
+                as_arrow: bool = False):
+    """
+    Load matching quotes into one pandas DataFrame (or Arrow table).
+
+    Takes the same filters as ``iter_quotes``; use that instead when the
+    result is too large to hold in memory at once.
+    """
+    batches = list(iter_quotes(symbol, start, end, interval, expirations, strikes,
+                               strike_range, right, time_range, columns, manifest, cache))
+    if batches:
+        table = pa.Table.from_batches(batches)
+    else:
+        names = list(columns) if columns else list(COLUMN_TYPES)
+        table = pa.schema([(name, COLUMN_TYPES.get(name, pa.string())) for name in names]).empty_table()
+    return table if as_arrow else table.to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query quotes from the local option store")
+    parser.add_argument("symbol")
+    parser.add_argument("start", help="First date (YYYY-MM-DD)")
+    parser.add_argument("end", help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--interval", default=None)
+    parser.add_argument("--expiration", action="append", dest="expirations",
+                        help="Expiration to keep (repeatable)")
+    parser.add_argument("--strike", action="append", type=float, dest="strikes",
+                        help="Strike to keep (repeatable)")
+    parser.add_argument("--right", choices=sorted(RIGHTS), type=str.upper)
+    parser.add_argument("--time", nargs=2, metavar=("START", "END"),
+                        help="Time-of-day range, e.g. 09:30 10:00")
+    parser.add_argument("--columns", help="Comma-separated columns to return")
+    args = parser.parse_args()
+
+    columns = args.columns.split(",") if args.columns else None
+    rows = 0
+    started = datetime.now()
+    for batch in iter_quotes(args.symbol, args.start, args.end, args.interval,
+                             args.expirations, args.strikes, None, args.right,
+                             tuple(args.time) if args.time else None, columns):
+        if not rows:
+            print(batch.slice(0, 5).to_pandas().to_string())
+        rows += batch.num_rows
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"✅ {rows:,} rows in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Local Resampling of 1m Quotes into Coarser Intervals
+
+Derives 5m/15m/30m/1h and end-of-day quote bars per contract from days
+already downloaded at 1m, instead of downloading each interval again.
+
+A bar labelled T holds the last 1m quote of its contract with a timestamp
+in [T, T + interval), the same "last quote in the bucket" a coarser
+download returns. Intraday buckets are aligned to the 09:30 open, so 1h
+bars start at 09:30, 10:30, ... ; an EOD bar is each contract's final quote
+of the day and keeps that quote's timestamp. Contracts with no quote in a
+bucket get no bar.
+
+Each day is read once as a stream of record batches (keeping only the last
+row of each contract/bucket run per batch) and produces every requested
+interval. Days run in a process pool and are written in the store's normal
+layout: {SYMBOL}_options_{date}_{interval}.csv (compressed per
+COMPRESS_OUTPUT), recorded in the manifest so later runs skip them.
+
+    python resample.py QQQ SPY --intervals 5m 15m 1h eod
+"""
+
+import argparse
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+
+from compression import CODEC_SUFFIXES, StreamCompressor, resolve_codec
+from parquet_ingest import open_csv_batches
+
+TEMP_SUFFIX = ".part"
+SOURCE_INTERVAL = "1m"
+SESSION_OPEN_MS = (9 * 60 + 30) * 60 * 1000   # Intraday buckets align to 09:30
+DAY_MS = 24 * 60 * 60 * 1000
+EOD = "eod"
+
+INTERVAL_MS = {
+    "5m": 5 * 60 * 1000,
+    "15m": 15 * 60 * 1000,
+    "30m": 30 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    EOD: None,
+}
+
+
+def output_directory(source_path, symbol: str, interval: str) -> Path:
+    """
+    Directory for a derived day: the source day's directory with its
+    ``{SYMBOL}_1m`` component renamed for the interval, if it has one.
+    """
+    parts = list(Path(source_path).parent.parts)
+    source_dir = f"{symbol}_{SOURCE_INTERVAL}"
+    return Path(*[f"{symbol}_{interval}" if part == source_dir else part for part in parts])
+
+
+def _bucket(timestamp: np.ndarray, interval: str) -> np.ndarray:
+    day = timestamp // DAY_MS * DAY_MS
+    interval_ms = INTERVAL_MS[interval]
+    if interval_ms is None:
+        return day
+    session_open = day + SESSION_OPEN_MS
+    return session_open + (timestamp - session_open) // interval_ms * interval_ms
+
+
+def _last_in_runs(table: pa.Table, bucket: np.ndarray) -> pa.Table:
+    """Keep the last row of every run of equal (contract, bucket) keys."""
+    n = table.num_rows
+    expiration = table.column("expiration").cast(pa.int32()).to_numpy(zero_copy_only=False)
+    strike = table.column("strike").to_numpy(zero_copy_only=False)
+    call = pc.equal(table.column("right"), "CALL").to_numpy(zero_copy_only=False)
+    last = np.ones(n, dtype=bool)
+    last[:-1] = ((expiration[1:] != expiration[:-1]) | (strike[1:] != strike[:-1])
+                 | (call[1:] != call[:-1]) | (bucket[1:] != bucket[:-1]))
+    indices = np.flatnonzero(last)
+    return table.take(pa.array(indices)).append_column("bucket", pa.array(bucket[indices]))
+
+
+def resample_table(batches, intervals: List[str]) -> Dict[str, pa.Table]:
+    """
+    Build the bars of every interval from a stream of 1m record batches.
+
+    Rows only need to be grouped by contract and in time order within each
+    group for the per-batch pass to discard most rows early; a final sort
+    settles runs split across batches or contracts that appear twice.
+    """
+    partial = {interval: [] for interval in intervals}
+    for batch in batches:
+        if not batch.num_rows:
+            continue
+        table = pa.Table.from_batches([batch])
+        timestamp = table.column("timestamp").cast(pa.int64()).to_numpy(zero_copy_only=False)
+        for interval in intervals:
+            partial[interval].append(_last_in_runs(table, _bucket(timestamp, interval)))
+
+    bars = {}
+    for interval, tables in partial.items():
+        if not tables:
+            bars[interval] = None
+            continue
+        table = pa.concat_tables(tables)
+        order = pc.sort_indices(table, sort_keys=[
+            ("expiration", "ascending"), ("strike", "ascending"), ("right", "ascending"),
+            ("bucket", "ascending"), ("timestamp", "ascending"),
+        ])
+        table = table.take(order)
+        table = _last_in_runs(table.drop(["bucket"]), table.column("bucket").to_numpy())
+        if INTERVAL_MS[interval] is not None:
+            # Label intraday bars by their bucket start
+            index = table.schema.get_field_index("timestamp")
+            table = table.set_column(index, "timestamp",
+                                     table.column("bucket").cast(pa.timestamp("ms")))
+        bars[interval] = table.drop(["bucket"])
+    return bars
+
+
+def _csv_bytes(table: pa.Table) -> bytes:
+    """Serialize bars in the downloaded day file format."""
+    index = table.schema.get_field_index("timestamp")
+    # On millisecond timestamps %S includes the fraction, which gives the
+    # terminal's 2024-01-02T09:30:00.000 form
+    timestamp = table.column("timestamp").cast(pa.timestamp("ms"))
+    table = table.set_column(index, "timestamp", pc.strftime(timestamp, "%Y-%m-%dT%H:%M:%S"))
+    sink = pa.BufferOutputStream()
+    pa_csv.write_csv(table, sink, pa_csv.WriteOptions(include_header=False, quoting_style="none"))
+    header = ",".join(table.column_names) + "\n"
+    return header.encode() + sink.getvalue().to_pybytes()
+
+
+def _write_day(data: bytes, path: Path, codec: Optional[str], level: int):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + TEMP_SUFFIX)
+    try:
+        with open(temp_path, "wb") as f:
+            if codec:
+                compressor = StreamCompressor(codec, level)
+                f.write(compressor.compress(data))
+                f.write(compressor.flush())
+            else:
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+def resample_day(source_kind: str, source_path: str, symbol: str, date: str,
+                 intervals: List[str], output_dirs: Dict[str, str],
+                 codec: Optional[str] = None, level: int = 3) -> List[dict]:
+    """
+    Resample one 1m day into every interval (process pool entry point).
+
+    Returns:
+        One dict per interval with interval, path, bytes, rows and checksum
+        (path None when the day had no rows)
+    """
+    if source_kind == "parquet":
+        batches = ds.dataset(source_path, format="parquet").to_batches()
+    else:
+        batches = open_csv_batches(source_path)
+    bars = resample_table(batches, intervals)
+
+    results = []
+    for interval in intervals:
+        table = bars[interval]
+        if table is None or not table.num_rows:
+            results.append({"interval": interval, "path": None, "bytes": 0, "rows": 0,
+                            "checksum": None})
+            continue
+        data = _csv_bytes(table)
+        path = (Path(output_dirs[interval])
+                / f"{symbol}_options_{date}_{interval}.csv{CODEC_SUFFIXES.get(codec, '')}")
+        _write_day(data, path, codec, level)
+        results.append({
+            "interval": interval,
+            "path": str(path),
+            "bytes": len(data),
+            "rows": table.num_rows,
+            "checksum": hashlib.sha256(data).hexdigest(),
+        })
+    return results
+
+
+def resample_symbol(manifest, symbol: str, intervals: List[str],
+                    output_dir: Optional[str] = None, workers: Optional[int] = None,
+                    codec: Optional[str] = None, level: int = 3) -> dict:
+    """
+    Derive every requested interval for each complete 1m day of a symbol
+    that does not have it yet.
+
+    Returns:
+        Dict with days processed, failed and bars written per interval
+    """
+    from download_manifest import STATUS_COMPLETE
+    from quote_query import day_source
+
+    done = {interval: manifest.completed_dates(symbol, interval) for interval in intervals}
+    pending = []
+    for day in manifest.day_files(symbol, SOURCE_INTERVAL):
+        missing = [interval for interval in intervals if day["date"] not in done[interval]]
+        source = day_source(day)
+        if missing and source is not None:
+            pending.append((day, source, missing))
+
+    totals = {"days": 0, "failed": 0, "rows": {interval: 0 for interval in intervals}}
+    if not pending:
+        print(f"✅ {symbol}: {', '.join(intervals)} already derived for every {SOURCE_INTERVAL} day")
+        return totals
+
+    print(f"🧮 {symbol}: Resampling {len(pending)} {SOURCE_INTERVAL} days into {', '.join(intervals)}...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for day, (kind, path), missing in pending:
+            output_dirs = {
+                interval: str(Path(output_dir) if output_dir
+                              else output_directory(day["path"] or path, symbol, interval))
+                for interval in missing
+            }
+            future = pool.submit(resample_day, kind, path, symbol, day["date"], missing,
+                                 output_dirs, codec, level)
+            futures[future] = day
+        for future in as_completed(futures):
+            day = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                totals["failed"] += 1
+                print(f"❌ {symbol} {day['date']}: Resampling failed - {e}")
+                continue
+            for result in results:
+                if result["path"] is None:
+                    continue
+                manifest.record(symbol, result["interval"], day["date"], STATUS_COMPLETE,
+                                path=result["path"], size=result["bytes"], rows=result["rows"],
+                                checksum=result["checksum"])
+                totals["rows"][result["interval"]] += result["rows"]
+            totals["days"] += 1
+
+    bars = ", ".join(f"{interval}: {rows:,}" for interval, rows in totals["rows"].items())
+    print(f"✅ {symbol}: {totals['days']} days resampled ({bars} bars)")
+    return totals
+
+
+def main():
+    from download_manifest import DownloadManifest
+    from simple_config import COMPRESS_LEVEL, COMPRESS_OUTPUT, MANIFEST_PATH
+
+    parser = argparse.ArgumentParser(description="Derive coarser intervals from 1m day files")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--intervals", nargs="+", default=["5m", "15m", "30m", "1h", EOD],
+                        type=str.lower, choices=list(INTERVAL_MS))
+    parser.add_argument("--output-dir", default=None,
+                        help="Write here instead of next to each symbol's 1m directory")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    codec = resolve_codec(COMPRESS_OUTPUT)
+    with DownloadManifest(MANIFEST_PATH) as manifest:
+        for symbol in args.symbols:
+            resample_symbol(manifest, symbol, args.intervals, args.output_dir, args.workers,
+                            codec, COMPRESS_LEVEL)
+
+
+if __name__ == "__main__":
+    main()
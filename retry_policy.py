@@ -0,0 +1,114 @@
+"""
+Retry Policy for Theta Data Downloader
+
+Classifies failed requests and decides what the download engine does next:
+never retry days with no data, back off and retry transient terminal
+errors, and pause the whole queue while the terminal is unreachable.
+Retries go to a deferred queue so they never block fresh work.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+import aiohttp
+
+# Failure kinds
+NO_DATA = "no_data"            # HTTP 472 / header-only body (e.g. market closure)
+TIMEOUT = "timeout"
+SERVER_ERROR = "server_error"  # 5xx
+RATE_LIMITED = "rate_limited"  # 429
+CONNECTION = "connection"      # Connection refused: terminal is down
+HTTP_ERROR = "http_error"      # Other 4xx: the request itself is wrong
+OTHER = "other"                # Payload errors, resets mid-stream, ...
+
+# Actions
+GIVE_UP = "give_up"
+RETRY = "retry"
+PAUSE = "pause"
+
+RETRYABLE = {TIMEOUT, SERVER_ERROR, RATE_LIMITED, OTHER}
+
+
+def classify_failure(status=None, exc=None):
+    """Map a non-200 status or request exception to a failure kind."""
+    if exc is not None:
+        if isinstance(exc, asyncio.TimeoutError):
+            return TIMEOUT
+        if isinstance(exc, (aiohttp.ClientConnectorError, ConnectionRefusedError)):
+            return CONNECTION
+        return OTHER
+    if status == 472:
+        return NO_DATA
+    if status == 429:
+        return RATE_LIMITED
+    if status is not None and status >= 500:
+        return SERVER_ERROR
+    return HTTP_ERROR
+
+
+class RetryPolicy:
+    """
+    Decide whether and when a failed item is attempted again.
+
+    Transient failures are retried with exponential backoff and full
+    jitter, up to ``max_attempts`` attempts in total. A refused connection
+    pauses the queue instead of spending an attempt.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=2.0, max_delay=120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        """Delay in seconds before retry number ``attempt`` (1-based)."""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    def decide(self, kind, attempt):
+        """
+        Decide what to do after ``attempt`` attempts failed with ``kind``.
+
+        Returns:
+            Tuple of (action, delay_seconds)
+        """
+        if kind == CONNECTION:
+            return PAUSE, 0.0
+        if kind in RETRYABLE and attempt < self.max_attempts:
+            return RETRY, self.backoff(attempt)
+        return GIVE_UP, 0.0
+
+
+class DeferredRetryQueue:
+    """Min-heap of items waiting for their backoff delay to pass."""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, item, delay):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), item))
+
+    def pop_due(self):
+        """Return the next item whose delay has passed, or None."""
+        if self._heap and self._heap[0][0] <= time.monotonic():
+            return heapq.heappop(self._heap)[2]
+        return None
+
+    def seconds_until_next(self):
+        """Seconds until the earliest item is due (None if empty)."""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def drain(self):
+        """Remove and return every waiting item, due or not."""
+        items = [entry[2] for entry in sorted(self._heap)]
+        self._heap.clear()
+        return items
@@ -11,6 +11,106 @@ INTERVAL = "1m"            # 1-minute interval for maximum resolution
 # API settings
 BASE_URL = "http://localhost:25503"
 MAX_CONCURRENT = 4
+CHUNK_SIZE = 1024 * 1024   # Bytes read from the socket and written to disk per chunk
+
+# Terminal pool: one entry per running Theta Terminal (e.g. one per account
+# or host). Each gets its own concurrency limit; work goes to the terminal
+# with the fewest bytes in flight and fails over if one stops answering.
+# Entries are base URLs or (base_url, max_concurrent) tuples.
+TERMINALS = [BASE_URL]
+
+# Adaptive concurrency (learned level is saved per terminal host in
+# results/adaptive_concurrency.json and reused on the next run)
+ADAPTIVE_CONCURRENCY = True
+MIN_CONCURRENT = 2
+ADAPTIVE_MAX_CONCURRENT = 8  # Standard subscription allows 8 concurrent connections
+
+# Timeout settings (there is no total timeout; large days are never killed
+# while bytes are still arriving)
+CONNECT_TIMEOUT = 10.0        # Seconds to open a connection to the terminal
+TTFB_TIMEOUT_BASE = 60.0      # Seconds to first byte for a day with no size history
+TTFB_TIMEOUT_PER_MB = 0.5     # Extra first-byte seconds per MB of the largest nearby day
+TTFB_TIMEOUT_MAX = 600.0      # Upper bound on the first-byte timeout
+STALL_TIMEOUT = 60.0          # Fail if no bytes arrive for this long mid-transfer
+
+# Split mode: fetch heavy days as parallel per-expiration requests and merge
+# them into the same day file (expected size comes from nearby days on record)
+SPLIT_LARGE_DAYS = False
+SPLIT_THRESHOLD_MB = 150      # Only days expected to be at least this big are split
+SPLIT_MAX_PARALLEL = 4        # Sub-requests in flight per split day
+SPLIT_MAX_EXPIRATION_DAYS = 1100  # Horizon used when the day's listed expirations are unavailable
+
+# Retry settings (HTTP 472 / no-data days are never retried)
+MAX_ATTEMPTS = 5              # Attempts per day for timeouts, 5xx and 429
+RETRY_BASE_DELAY = 2.0        # Seconds; doubles each attempt, with full jitter
+RETRY_MAX_DELAY = 120.0       # Cap on a single backoff delay
+TERMINAL_PROBE_INTERVAL = 5.0     # Seconds between checks while the terminal is down
+TERMINAL_DOWN_TIMEOUT = 600.0     # Give up if the terminal stays down this long
+
+# Data boundary discovery: binary-search each symbol's first/last dates with
+# data (cached in results/data_boundaries.json) and never plan outside them
+DISCOVER_BOUNDARIES = True
+BOUNDARY_SEARCH_START = "2012-01-03"  # Earliest session probed
+PROBE_INTERVAL = "5m"                # Coarse interval for cheap probe requests
+
+# Telemetry: per-request timings as Prometheus histograms on
+# http://127.0.0.1:TELEMETRY_PORT/metrics and one JSONL line per request
+TELEMETRY_PORT = 9464         # None disables the endpoint
+TELEMETRY_LOG = "results/request_metrics.jsonl"  # None disables the log
+
+# Console output: per-request messages are logged at DEBUG/INFO, so the
+# default only shows warnings next to the progress bar
+LOG_LEVEL = "WARNING"         # "INFO" adds retries/no-data days, "DEBUG" every request
+
+# Compress-on-write: save days as .csv.zst ("zstd", falls back to gzip if the
+# zstandard package is missing) or .csv.gz ("gzip"); None keeps plain CSV
+COMPRESS_OUTPUT = None
+COMPRESS_LEVEL = 3            # zstd 1-22 / gzip 1-9; low levels keep up with the network
+
+# Parquet ingest: convert each completed day into a typed, zstd-compressed
+# Parquet dataset ({PARQUET_DIR}/{interval}/symbol=/year=/date=). Existing
+# CSVs can be converted in bulk with `python parquet_ingest.py SYMBOL`.
+PARQUET_INGEST = False
+PARQUET_DIR = "/Volumes/SSD 4TB/Theta_Data/parquet"
+PARQUET_WORKERS = 2           # Processes converting days alongside the downloads
+PARQUET_ROW_GROUP_ROWS = 1_000_000  # Rows per row group (bounds memory per conversion)
+PARQUET_DELETE_CSV = False    # Remove each CSV once its Parquet copy is written
+
+# Byte-range index: write a small .idx sidecar next to each plain day CSV so
+# quote_query reads only the rows of the contracts/times asked for. Existing
+# CSVs can be indexed with `python csv_index.py SYMBOL`.
+CSV_INDEX = False
+CSV_INDEX_BUCKET_MINUTES = 30  # Time granularity of the index within each contract
+
+# Decoded-day cache: quote_query keeps each day it reads as an uncompressed
+# Arrow IPC file that later reads (from any process) memory-map instead of
+# re-parsing. Least recently read days are evicted beyond the size cap.
+DAY_CACHE = False
+DAY_CACHE_DIR = "/Volumes/SSD 4TB/Theta_Data/day_cache"
+DAY_CACHE_MAX_GB = 50
+
+# Store validation (validate_store.py): minutes past the equity close that
+# options on a symbol keep quoting, so those quotes are not flagged as
+# outside the session (broad index ETF options trade until 16:15)
+SESSION_CLOSE_GRACE_MINUTES = {"SPY": 15, "QQQ": 15, "IWM": 15, "DIA": 15}
+
+# Newest sessions whose "no data" answer is not trusted yet: the terminal
+# may not have published them, so every update run asks again and the
+# caching proxy keeps their responses only for PROXY_RECENT_TTL
+UPDATE_RECHECK_SESSIONS = 3
+
+# Caching proxy (caching_proxy.py): point BASE_URL, scripts and MCP clients at
+# http://localhost:PROXY_PORT to serve historical requests from the store or
+# cache; misses go to PROXY_UPSTREAM with at most MAX_CONCURRENT in flight
+PROXY_PORT = 25510
+PROXY_UPSTREAM = "http://localhost:25503"
+PROXY_CACHE_DIR = "/Volumes/SSD 4TB/Theta_Data/proxy_cache"
+PROXY_CACHE_MAX_GB = 100
+PROXY_LIST_TTL = 6 * 3600     # Seconds a /list/ response without a past date is reused
+PROXY_RECENT_TTL = 30 * 60    # Seconds a response naming a recent session is reused
+
+# Resume settings
+MANIFEST_PATH = "results/download_manifest.db"  # SQLite index of downloaded days
 
 # Output settings
 OUTPUT_DIR = "/Volumes/SSD 4TB/Theta_Data/options/ASML_1m/2012-09-04_to_2025-08-19"
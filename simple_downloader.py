@@ -4,69 +4,499 @@ Simple Theta Data Downloader - Bare Bones Version
 
 Downloads QQQ options data from start to end date.
 One CSV file per trading day, directly in the QQQ folder.
-Shows progress bar. No complex logic.
+Shows a files/bytes progress bar; per-request detail is logged at
+DEBUG/INFO (see LOG_LEVEL). No complex logic.
 """
 
 import asyncio
 import aiohttp
+import bisect
+import hashlib
+import logging
+import os
 import sys
 import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime, timedelta
 from pathlib import Path
 import pandas as pd
 from market_calendar import MarketCalendar
+from data_boundaries import discover_boundaries, clip_to_coverage
+from terminal_pool import TerminalPool
+from telemetry import Telemetry
+from progress import ByteRateProgress, setup_logging
+from compression import CODEC_SUFFIXES, StreamCompressor, resolve_codec
+from retry_policy import (
+    RetryPolicy, DeferredRetryQueue, classify_failure, NO_DATA, OTHER, PAUSE, RETRY
+)
+from download_manifest import DownloadManifest, STATUS_COMPLETE, STATUS_NO_DATA, STATUS_FAILED
 from simple_config import *
 
-class SimpleProgressBar:
-    def __init__(self, total_files):
-        self.total_files = total_files
-        self.completed = 0
-        self.start_time = time.time()
-        
-    def update(self, increment=1):
-        self.completed += increment
-        elapsed = time.time() - self.start_time
-        rate = self.completed / elapsed if elapsed > 0 else 0
-        
-        # Calculate percentage and progress bar
-        percent = (self.completed / self.total_files) * 100
-        bar_length = 20
-        filled_length = int(bar_length * self.completed // self.total_files)
-        bar = '█' * filled_length + '░' * (bar_length - filled_length)
-        
-        # ETA calculation
-        if rate > 0:
-            remaining = self.total_files - self.completed
-            eta_seconds = remaining / rate
-            if eta_seconds < 60:
-                eta = f"{eta_seconds:.0f}s"
-            elif eta_seconds < 3600:
-                eta = f"{eta_seconds/60:.1f}m"
+logger = logging.getLogger(__name__)
+
+TEMP_SUFFIX = ".part"
+
+# Expirations per symbol, fetched once per process for split mode
+_expiration_cache = {}
+
+# One day of one symbol to download
+WorkItem = namedtuple("WorkItem", ["symbol", "date", "interval", "output_dir"])
+
+def day_file_path(output_dir, symbol, date, interval, codec=None):
+    """Path of one downloaded day file (.csv.zst / .csv.gz when compressed)."""
+    return Path(output_dir) / f"{symbol}_options_{date}_{interval}.csv{CODEC_SUFFIXES.get(codec, '')}"
+
+def size_aware_timeouts(manifest, symbol, interval, date):
+    """
+    Pick (ttfb_timeout, stall_timeout) for one day from its size history.
+
+    The terminal takes longer to start answering for bigger days, so the
+    time-to-first-byte budget grows with the largest nearby day on record.
+    It covers the response headers and the first body byte. Once bytes are
+    flowing there is no total limit; the request only fails if no bytes
+    arrive for STALL_TIMEOUT seconds.
+    """
+    ttfb_timeout = TTFB_TIMEOUT_BASE
+    if manifest is not None:
+        sizes = manifest.nearby_sizes(symbol, interval, date)
+        if sizes:
+            expected_mb = max(sizes) / 1024 / 1024
+            ttfb_timeout = min(TTFB_TIMEOUT_MAX, TTFB_TIMEOUT_BASE + expected_mb * TTFB_TIMEOUT_PER_MB)
+    return ttfb_timeout, STALL_TIMEOUT
+
+async def stall_guarded(chunks, stall_timeout, first_timeout=None):
+    """
+    Yield chunks, raising TimeoutError if none arrives for ``stall_timeout``
+    seconds (``first_timeout`` for the first chunk, when given).
+    """
+    timeout = first_timeout if first_timeout is not None else stall_timeout
+    first = True
+    while True:
+        try:
+            chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            if first and first_timeout is not None:
+                raise asyncio.TimeoutError(f"no body bytes within {first_timeout:.0f}s of the response")
+            raise asyncio.TimeoutError(f"stalled: no bytes for {stall_timeout:.0f}s")
+        yield chunk
+        first = False
+        timeout = stall_timeout
+
+async def stream_response_to_file(response, filepath, chunk_size=CHUNK_SIZE, stall_timeout=None,
+                                  timings=None, codec=None, first_byte_timeout=None):
+    """
+    Stream a response body to disk in bounded chunks as it arrives.
+
+    Only the first chunk is inspected: a body of 100 bytes or less is just
+    the CSV header (no data), so nothing is written. Memory use stays at
+    one chunk regardless of how large the trading day is.
+
+    The body is written to a temporary ``.part`` file, fsynced and renamed
+    into place only once it has fully arrived, so ``filepath`` never exists
+    in a truncated state. A last row the terminal sent without a newline
+    gets one, so every day file ends in a complete line.
+
+    A row count and SHA-256 checksum are computed on the fly for the
+    download manifest. With ``stall_timeout`` the transfer fails only if
+    the body stops arriving, never because it is large; the first body
+    byte may take ``first_byte_timeout`` instead. Time spent writing
+    and fsyncing is added to ``timings["write"]`` when a dict is given.
+
+    With ``codec`` ("zstd"/"gzip") each chunk is compressed in a worker
+    thread as it arrives; size, rows and checksum still describe the
+    uncompressed CSV.
+
+    Returns:
+        Tuple of (body bytes received, data rows, hex checksum). Rows and
+        checksum are 0/None when the body was header-only.
+    """
+    chunks = response.content.iter_chunked(chunk_size)
+    if stall_timeout is not None:
+        chunks = stall_guarded(chunks, stall_timeout, first_byte_timeout)
+    first_chunk = b""
+    # iter_chunked may hand back a short first read, so accumulate
+    # until we can tell header-only bodies from real data
+    async for chunk in chunks:
+        first_chunk += chunk
+        if len(first_chunk) > 100:
+            break
+    
+    content_size = len(first_chunk)
+    if content_size <= 100:
+        return content_size, 0, None
+    
+    digest = hashlib.sha256(first_chunk)
+    newlines = first_chunk.count(b"\n")
+    ends_with_newline = first_chunk.endswith(b"\n")
+    temp_path = filepath.with_name(filepath.name + TEMP_SUFFIX)
+    compressor = StreamCompressor(codec, COMPRESS_LEVEL) if codec else None
+    write_time = 0.0
+    try:
+        with open(temp_path, 'wb') as f:
+            async def write(data):
+                nonlocal write_time
+                started = time.perf_counter()
+                if compressor is not None:
+                    # zstd/zlib release the GIL, so this keeps the event loop free
+                    data = await asyncio.to_thread(compressor.compress, data)
+                f.write(data)
+                write_time += time.perf_counter() - started
+            
+            await write(first_chunk)
+            if timings is not None:
+                timings["streamed"] = timings.get("streamed", 0) + len(first_chunk)
+            async for chunk in chunks:
+                await write(chunk)
+                if timings is not None:
+                    timings["streamed"] = timings.get("streamed", 0) + len(chunk)
+                digest.update(chunk)
+                newlines += chunk.count(b"\n")
+                ends_with_newline = chunk.endswith(b"\n")
+                content_size += len(chunk)
+            if not ends_with_newline:
+                # The body arrived in full, so only the last row's newline
+                # is missing; a day file that ends mid-line means truncated
+                # to import and validate_store.py
+                await write(b"\n")
+                digest.update(b"\n")
+                newlines += 1
+                content_size += 1
+            started = time.perf_counter()
+            if compressor is not None:
+                f.write(compressor.flush())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, filepath)
+    except BaseException:
+        # Never leave a half-written temp file behind (includes cancellation)
+        temp_path.unlink(missing_ok=True)
+        raise
+    fsync_directory(filepath.parent)
+    write_time += time.perf_counter() - started
+    if timings is not None:
+        timings["write"] = timings.get("write", 0.0) + write_time
+    
+    # Line count minus the header
+    rows = newlines - 1
+    return content_size, rows, digest.hexdigest()
+
+def fsync_directory(directory):
+    """Flush a directory entry so a completed rename survives a crash."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Some filesystems (e.g. exFAT external drives) do not support this
+        pass
+    finally:
+        os.close(fd)
+
+def sweep_stale_temp_files(output_dir):
+    """
+    Remove temporary files left behind by a killed or crashed run.
+
+    Returns:
+        Number of stale temp files removed
+    """
+    removed = 0
+    for temp_path in output_dir.glob(f"*{TEMP_SUFFIX}"):
+        try:
+            temp_path.unlink()
+            removed += 1
+        except OSError as e:
+            print(f"⚠️  Could not remove stale temp file {temp_path.name}: {e}")
+    if removed:
+        print(f"🧹 Removed {removed} stale partial download(s) from {output_dir}")
+    return removed
+
+async def fetch_to_file(session, url, params, filepath, request_timeout, ttfb_timeout, stall_timeout,
+                        request_stats, codec=None):
+    """
+    Issue one quote request and stream a 200 body into ``filepath``.
+
+    The headers and the first body byte must arrive within ``ttfb_timeout``
+    of the request; after that only gaps longer than ``stall_timeout`` fail it.
+
+    Returns:
+        Tuple of (http_status, body bytes, data rows, checksum)
+    """
+    request_start = time.time()
+    try:
+        response = await asyncio.wait_for(
+            session.get(url, params=params, timeout=request_timeout, trace_request_ctx=request_stats),
+            ttfb_timeout,
+        )
+    except asyncio.TimeoutError:
+        raise asyncio.TimeoutError(f"no response within {ttfb_timeout:.0f}s")
+    async with response:
+        request_stats.setdefault("ttfb", time.time() - request_start)
+        if response.status != 200:
+            return response.status, 0, 0, None
+        first_byte_timeout = max(0.0, ttfb_timeout - (time.time() - request_start))
+        content_size, rows, checksum = await stream_response_to_file(
+            response, filepath, stall_timeout=stall_timeout, timings=request_stats, codec=codec,
+            first_byte_timeout=first_byte_timeout
+        )
+        return 200, content_size, rows, checksum
+
+def expected_day_bytes(manifest, symbol, interval, date):
+    """Median size of the nearest complete days on record (None without history)."""
+    if manifest is None:
+        return None
+    sizes = sorted(manifest.nearby_sizes(symbol, interval, date))
+    if not sizes:
+        return None
+    return sizes[len(sizes) // 2]
+
+def expected_bytes_for_items(work_items, manifest, sample=20):
+    """
+    Expected size of every work item: the median of the ``sample`` complete
+    days on record closest to its date (None without history).
+
+    Loads each symbol's size history once instead of querying per day.
+    """
+    histories = {}
+    expected = {}
+    for item in work_items:
+        key = (item.symbol, item.interval)
+        if key not in histories:
+            histories[key] = manifest.size_history(*key) if manifest is not None else []
+        history = histories[key]
+        if not history:
+            expected[item] = None
+            continue
+        index = bisect.bisect_left(history, (item.date,))
+        window = history[max(0, index - sample // 2):index + sample // 2]
+        sizes = sorted(size for _, size in window)
+        expected[item] = sizes[len(sizes) // 2]
+    return expected
+
+async def list_expirations(session, symbol, base_url=BASE_URL):
+    """
+    Return all of a symbol's expirations as sorted YYYYMMDD strings.
+
+    Cached per symbol for the life of the process.
+    """
+    if symbol in _expiration_cache:
+        return _expiration_cache[symbol]
+    url = f"{base_url}/v3/option/list/expirations"
+    async with session.get(url, params={'symbol': symbol},
+                           timeout=aiohttp.ClientTimeout(total=60)) as response:
+        if response.status != 200:
+            raise aiohttp.ClientResponseError(
+                response.request_info, response.history, status=response.status,
+                message="could not list expirations"
+            )
+        text = await response.text()
+    _expiration_cache[symbol] = parse_expirations(text)
+    return _expiration_cache[symbol]
+
+async def expirations_for_day(session, symbol, api_date, base_url=BASE_URL):
+    """
+    Return the expirations listed on one day (YYYYMMDD) for a split download.
+
+    Asks the terminal for the contracts quoted that day. If that list is
+    unavailable, falls back to every expiration from the day through
+    SPLIT_MAX_EXPIRATION_DAYS later, so one split day never fans out over
+    the symbol's whole expiration history.
+    """
+    url = f"{base_url}/v3/option/list/contracts/quote"
+    try:
+        async with session.get(url, params={'symbol': symbol, 'date': api_date},
+                               timeout=aiohttp.ClientTimeout(total=60)) as response:
+            if response.status == 200:
+                listed = [e for e in parse_expirations(await response.text()) if e >= api_date]
+                if listed:
+                    return listed
             else:
-                eta = f"{eta_seconds/3600:.1f}h"
-        else:
-            eta = "Calculating..."
+                logger.debug(f"{symbol} {api_date}: contract list returned {response.status}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.debug(f"{symbol} {api_date}: contract list failed - {e}")
+    
+    horizon = (datetime.strptime(api_date, "%Y%m%d")
+               + timedelta(days=SPLIT_MAX_EXPIRATION_DAYS)).strftime("%Y%m%d")
+    return [e for e in await list_expirations(session, symbol, base_url) if api_date <= e <= horizon]
+
+def parse_expirations(text):
+    """Sorted unique YYYYMMDD expirations from a CSV with an expiration column."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    header = [column.strip().lower() for column in lines[0].split(",")] if lines else []
+    column = header.index("expiration") if "expiration" in header else 0
+    expirations = set()
+    for line in lines[1:]:
+        fields = line.split(",")
+        if column < len(fields):
+            digits = "".join(ch for ch in fields[column] if ch.isdigit())
+            if len(digits) == 8:
+                expirations.add(digits)
+    return sorted(expirations)
+
+def merge_part_files(part_paths, filepath, codec=None):
+    """
+    Concatenate per-expiration part files into ``filepath`` atomically.
+
+    Parts are merged in the order given and only the first CSV header is
+    kept, so the row order is deterministic: by expiration, then as the
+    terminal returned it. With ``codec`` the merged file is compressed.
+
+    Returns:
+        Tuple of (bytes written, data rows, hex checksum)
+    """
+    temp_path = filepath.with_name(filepath.name + TEMP_SUFFIX)
+    digest = hashlib.sha256()
+    content_size = 0
+    rows = 0
+    header_written = False
+    compressor = StreamCompressor(codec, COMPRESS_LEVEL) if codec else None
+    try:
+        with open(temp_path, 'wb') as out:
+            def write(block):
+                nonlocal content_size
+                out.write(compressor.compress(block) if compressor else block)
+                digest.update(block)
+                content_size += len(block)
+            
+            for part_path in part_paths:
+                with open(part_path, 'rb') as f:
+                    header = f.readline()
+                    if not header_written:
+                        write(header)
+                        header_written = True
+                    last = b"\n"
+                    for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        write(block)
+                        rows += block.count(b"\n")
+                        last = block[-1:]
+                    if last != b"\n":
+                        write(b"\n")
+                        rows += 1
+            if compressor is not None:
+                out.write(compressor.flush())
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temp_path, filepath)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    fsync_directory(filepath.parent)
+    return content_size, rows, digest.hexdigest()
+
+async def fetch_split_day(session, url, params, filepath, expirations, request_timeout,
+                          ttfb_timeout, stall_timeout, request_stats, codec=None, extra_slot=None):
+    """
+    Download one day as parallel per-expiration sub-requests and merge them.
+
+    Up to SPLIT_MAX_PARALLEL lanes take expirations from a shared queue.
+    The first lane runs in the slot the day already holds; with
+    ``extra_slot`` (a callable returning an async context manager, e.g.
+    ``pool.acquire_on``) every other lane first waits for a slot of its
+    own, so the fan-out counts against the terminal's limit, and lanes
+    still waiting when the queue runs dry are dropped. Expirations with no
+    data that day (472 or header-only) are skipped; any other failure
+    fails the whole day.
+
+    Returns:
+        Tuple of (http_status, body bytes, data rows, checksum)
+    """
+    part_paths = {
+        expiration: filepath.with_name(f"{filepath.name}.{expiration}{TEMP_SUFFIX}")
+        for expiration in expirations
+    }
+    
+    pending = deque(expirations)
+    results = []
+    waiting_for_slot = set()
+    
+    async def drain():
+        while pending:
+            expiration = pending.popleft()
+            results.append(await fetch_to_file(
+                session, url, dict(params, expiration=expiration), part_paths[expiration],
+                request_timeout, ttfb_timeout, stall_timeout, request_stats
+            ))
+        for task in waiting_for_slot:
+            task.cancel()
+    
+    async def extra_lane():
+        task = asyncio.current_task()
+        waiting_for_slot.add(task)
+        async with extra_slot() if extra_slot is not None else nullcontext():
+            waiting_for_slot.discard(task)
+            await drain()
+    
+    lanes = [asyncio.create_task(drain())]
+    lanes += [asyncio.create_task(extra_lane())
+              for _ in range(min(SPLIT_MAX_PARALLEL, len(expirations)) - 1)]
+    try:
+        try:
+            done, _ = await asyncio.wait(lanes, return_when=asyncio.FIRST_EXCEPTION)
+            for lane in done:
+                if not lane.cancelled() and lane.exception() is not None:
+                    raise lane.exception()
+        except BaseException:
+            for lane in lanes:
+                lane.cancel()
+            await asyncio.gather(*lanes, return_exceptions=True)
+            raise
         
-        # Print progress line
-        sys.stdout.write(f"\r📈 [{bar}] {percent:.1f}% ({self.completed}/{self.total_files}) | {rate:.1f} files/s | ETA: {eta} | 🔄 DOWNLOADING")
-        sys.stdout.flush()
+        for status, _, _, _ in results:
+            if status not in (200, 472):
+                return status, 0, 0, None
+        
+        with_data = [part_paths[expiration] for expiration in expirations if part_paths[expiration].exists()]
+        if not with_data:
+            return 200, 0, 0, None
+        merge_start = time.perf_counter()
+        content_size, rows, checksum = await asyncio.to_thread(merge_part_files, with_data, filepath, codec)
+        request_stats["write"] = request_stats.get("write", 0.0) + time.perf_counter() - merge_start
+        return 200, content_size, rows, checksum
+    finally:
+        for part_path in part_paths.values():
+            part_path.unlink(missing_ok=True)
+
+async def download_single_date(session, symbol, date, interval, output_dir, manifest=None,
+                               request_stats=None, base_url=None, extra_slot=None):
+    """
+    Download options data for a single date.
+
+    Resume decisions are made by the caller from the download manifest;
+    this function always requests the day and records the outcome in
+    ``manifest`` when one is given. If ``request_stats`` is a dict it is
+    filled with ttfb, bytes, http_status and failure kind for feedback.
+
+    With SPLIT_LARGE_DAYS, days whose expected size (from nearby days in
+    the manifest) is at least SPLIT_THRESHOLD_MB are fetched as parallel
+    per-expiration sub-requests and merged into the same file.
+
+    With COMPRESS_OUTPUT the day is written as ``.csv.zst`` (or ``.csv.gz``)
+    and any copy of the day in another format is removed once it is saved.
+
+    ``base_url`` selects the terminal (defaults to BASE_URL); ``extra_slot``
+    provides the further slots on it that a split day's sub-requests hold
+    (see fetch_split_day).
+    """
+    if request_stats is None:
+        request_stats = {}
+    if base_url is None:
+        base_url = BASE_URL
+    codec = resolve_codec(COMPRESS_OUTPUT)
 
-async def download_single_date(session, symbol, date, interval, output_dir):
-    """Download options data for a single date."""
     # Format date for API (remove dashes)
     api_date = date.replace("-", "")
     
     # Create filename
-    filename = f"{symbol}_options_{date}_{interval}.csv"
-    filepath = output_dir / filename
-    
-    # Skip if file already exists
-    if filepath.exists():
-        print(f"⏭️  {date}: File already exists")
-        return True
+    filepath = day_file_path(output_dir, symbol, date, interval, codec)
+    filename = filepath.name
     
     # Construct URL
-    url = f"{BASE_URL}/v3/option/history/quote"
+    url = f"{base_url}/v3/option/history/quote"
     params = {
         'symbol': symbol,
         'expiration': '*',
@@ -74,76 +504,446 @@ async def download_single_date(session, symbol, date, interval, output_dir):
         'interval': interval
     }
     
+    def record(status, **fields):
+        if manifest is not None:
+            manifest.record(symbol, interval, date, status,
+                            started_at=started_at, **fields)
+    
+    # Connect limit here; fetch_to_file enforces the first-byte limit and,
+    # once the body is flowing, the stall limit
+    ttfb_timeout, stall_timeout = size_aware_timeouts(manifest, symbol, interval, date)
+    request_timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=None)
+    
+    started_at = datetime.now().isoformat(timespec="seconds")
     try:
-        print(f"🔍 {date}: Requesting {url}?{params}")
-        async with session.get(url, params=params) as response:
-            print(f"📡 {date}: Response status {response.status}")
-            if response.status == 200:
-                content = await response.text()
-                content_size = len(content) if content else 0
-                print(f"📦 {date}: Content size {content_size} bytes")
-                if content and content_size > 100:  # Has actual data beyond just headers
-                    # Save to file
-                    with open(filepath, 'w') as f:
-                        f.write(content)
-                    print(f"✅ {date}: Saved {filename} ({content_size:,} bytes)")
-                    return True
-                else:
-                    print(f"⚠️  {date}: No data available (content too small)")
-                    return False
+        expected = expected_day_bytes(manifest, symbol, interval, date) if SPLIT_LARGE_DAYS else None
+        expirations = None
+        if expected is not None and expected >= SPLIT_THRESHOLD_MB * 1024 * 1024:
+            expirations = await expirations_for_day(session, symbol, api_date, base_url)
+        if expirations:
+            logger.info(f"🔀 {symbol} {date}: Splitting ~{expected / 1024 / 1024:.0f} MB day into "
+                        f"{len(expirations)} expiration requests")
+            status, content_size, rows, checksum = await fetch_split_day(
+                session, url, params, filepath, expirations,
+                request_timeout, ttfb_timeout, stall_timeout, request_stats, codec, extra_slot
+            )
+        else:
+            logger.debug(f"🔍 {symbol} {date}: Requesting {url}?{params}")
+            status, content_size, rows, checksum = await fetch_to_file(
+                session, url, params, filepath, request_timeout, ttfb_timeout, stall_timeout,
+                request_stats, codec
+            )
+        request_stats["http_status"] = status
+        logger.debug(f"📡 {symbol} {date}: Response status {status}")
+        if status == 200:
+            request_stats["bytes"] = content_size
+            if content_size > 100:  # Has actual data beyond just headers
+                logger.debug(f"✅ {symbol} {date}: Saved {filename} ({content_size:,} bytes)")
+                for other in (None, *CODEC_SUFFIXES):
+                    if other != codec:
+                        day_file_path(output_dir, symbol, date, interval, other).unlink(missing_ok=True)
+                record(STATUS_COMPLETE, path=str(filepath), size=content_size,
+                       rows=rows, checksum=checksum, http_status=200,
+                       completed_at=datetime.now().isoformat(timespec="seconds"))
+                return True
             else:
-                print(f"❌ {date}: HTTP {response.status}")
+                logger.info(f"⚠️  {symbol} {date}: No data available (content too small)")
+                request_stats["failure"] = NO_DATA
+                record(STATUS_NO_DATA, size=content_size, rows=0, http_status=200)
                 return False
+        else:
+            logger.info(f"❌ {symbol} {date}: HTTP {status}")
+            request_stats["failure"] = classify_failure(status=status)
+            record(STATUS_NO_DATA if status == 472 else STATUS_FAILED, http_status=status)
+            return False
     except Exception as e:
-        print(f"💥 {date}: Error - {str(e)}")
+        logger.info(f"💥 {symbol} {date}: Error - {str(e)}")
+        request_stats["failure"] = classify_failure(exc=e)
+        record(STATUS_FAILED)
         return False
 
-async def download_date_range(symbol, start_date, end_date, interval, output_dir):
-    """Download options data for a date range."""
-    # Get trading days
-    market_cal = MarketCalendar()
-    trading_days = market_cal.get_trading_days(start_date, end_date)
+def plan_symbol_work(symbol, start_date, end_date, interval, output_dir, manifest, market_cal=None,
+                     coverage=None):
+    """
+    Plan the days still to download for one symbol.
+
+    Prepares the output directory (sweeping partial files and importing
+    existing files into the manifest once) and returns a WorkItem for every
+    trading day the manifest does not yet have resolved. With ``coverage``
+    from data_boundaries, days outside the symbol's data range are skipped.
+    """
+    if market_cal is None:
+        market_cal = MarketCalendar()
+    
+    clipped = clip_to_coverage(start_date, end_date, coverage)
+    if clipped is None:
+        print(f"⏭️  {symbol}: No data between {start_date} and {end_date} "
+              f"(coverage {coverage['first']} to {coverage['last']})")
+        return []
+    if clipped != (start_date, end_date):
+        print(f"📍 {symbol}: Limiting to known coverage {clipped[0]} to {clipped[1]}")
+        start_date, end_date = clipped
+    trading_days = market_cal.get_trading_days(start_date, end_date, symbol)
     
     print(f"🎯 {symbol}: {start_date} to {end_date} ({len(trading_days)} trading days)")
     
     # Create output directory
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # Initialize progress bar
-    progress = SimpleProgressBar(len(trading_days))
+    # Partial files from an interrupted run are never valid data
+    sweep_stale_temp_files(output_dir)
+    
+    # Resume from the manifest instead of stat-ing every file
+    manifest.import_existing_files(symbol, interval, output_dir)
+    pending_days = manifest.missing_dates(symbol, interval, trading_days)
+    already_done = len(trading_days) - len(pending_days)
+    if already_done:
+        print(f"⏭️  {symbol}: {already_done} days already resolved in manifest, {len(pending_days)} to download")
+    
+    return [WorkItem(symbol, date, interval, output_dir) for date in pending_days]
+
+def interleave_work_items(per_symbol_items):
+    """
+    Merge per-symbol work lists round-robin so every symbol is in flight
+    at once and small symbols fill the gaps left by large days.
+    """
+    merged = []
+    lists = [items for items in per_symbol_items if items]
+    for i in range(max((len(items) for items in lists), default=0)):
+        for items in lists:
+            if i < len(items):
+                merged.append(items[i])
+    return merged
+
+async def download_work_items(work_items, manifest, max_concurrent=None, retry_policy=None,
+                              market_cal=None, terminals=None):
+    """
+    Download a list of WorkItems through one shared session and worker pool.
+
+    Items may belong to any number of symbols; all of them share the same
+    connection pool. Requests are spread across the TERMINALS (or
+    ``terminals``) pool: each terminal has its own limit of
+    ``max_concurrent`` requests in flight, adjusted between MIN_CONCURRENT
+    and that maximum by an adaptive controller with ADAPTIVE_CONCURRENCY,
+    and each request goes to the healthy terminal with the fewest expected
+    bytes outstanding.
+
+    Failures are classified by retry_policy: no-data days are never
+    retried, transient errors go to a deferred retry queue with backoff
+    (fresh work keeps flowing meanwhile) and a refused connection takes
+    that terminal out of rotation, failing its work over to the others.
+    Only when every terminal is down does the whole queue pause. The
+    manifest is the record of every day's outcome; with ``market_cal``
+    no-data days are also marked in its per-symbol store (so planning
+    skips them without a query), and a marked day that now downloads,
+    such as a recent session asked for again in update mode, is cleared
+    there.
+
+    Every settled request is recorded in telemetry (TELEMETRY_PORT and
+    TELEMETRY_LOG): slot wait, connect, TTFB, transfer and write times.
+    With PARQUET_INGEST each completed day is also converted to Parquet in
+    a process pool while the downloads continue.
+
+    Returns:
+        Summary dict with successful/no_data/failed/retried counts,
+        per-symbol results, per-terminal status, elapsed seconds,
+        per-worker busy time and the slot-seconds of concurrency limit
+        in force (limit_seconds)
+    """
+    if max_concurrent is None:
+        max_concurrent = ADAPTIVE_MAX_CONCURRENT if ADAPTIVE_CONCURRENCY else MAX_CONCURRENT
+    if retry_policy is None:
+        retry_policy = RetryPolicy(MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+    
+    pool = TerminalPool(
+        terminals or TERMINALS,
+        max_concurrent,
+        adaptive=ADAPTIVE_CONCURRENCY,
+        min_concurrent=MIN_CONCURRENT,
+        initial=MAX_CONCURRENT,
+        probe_interval=TERMINAL_PROBE_INTERVAL,
+    )
+    workers = pool.capacity
+    telemetry = Telemetry(TELEMETRY_LOG, pool)
+    
+    # Inline Parquet ingest and CSV indexing run in worker processes, off
+    # the event loop. Indexes need a plain CSV that stays on disk.
+    index_inline = (CSV_INDEX and not resolve_codec(COMPRESS_OUTPUT)
+                    and not (PARQUET_INGEST and PARQUET_DELETE_CSV))
+    ingest_executor = None
+    ingest_tasks = []
+    if PARQUET_INGEST or index_inline:
+        import csv_index
+        import parquet_ingest
+        ingest_executor = ProcessPoolExecutor(max_workers=PARQUET_WORKERS)
+    
+    # Progress in files and bytes, redrawn by its own task
+    expected_bytes = expected_bytes_for_items(work_items, manifest)
+    progress = ByteRateProgress(work_items, expected_bytes)
     
     # Create session with connection limits
-    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT)
-    timeout = aiohttp.ClientTimeout(total=30)
+    connector = aiohttp.TCPConnector(limit=workers)
+    # No total timeout: large days must never be cut off while bytes are
+    # arriving. Per-request first-byte and stall limits come from
+    # size_aware_timeouts().
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT)
     
-    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-        # Process dates in chunks to respect concurrency limits
-        chunk_size = MAX_CONCURRENT
-        successful_downloads = 0
+    summary = {
+        "successful": 0,
+        "no_data": 0,
+        "failed": 0,
+        "retried": 0,
+        "per_symbol": {},
+        "worker_busy": [0.0] * workers,
+        "elapsed": 0.0,
+        "ingested": 0,
+        "indexed": 0,
+    }
+    
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                     trace_configs=[telemetry.trace_config()]) as session:
+        await telemetry.start(TELEMETRY_PORT)
+        progress.start()
+        # Sliding window: every worker pulls the next item as soon as it
+        # finishes one, so a single slow day never leaves other slots idle
+        queue = asyncio.Queue()
+        for item in work_items:
+            queue.put_nowait(item)
+        retry_queue = DeferredRetryQueue()
+        attempts = {}
+        in_flight = 0
+        stopped = False
         
-        for i in range(0, len(trading_days), chunk_size):
-            chunk_dates = trading_days[i:i + chunk_size]
-            
-            # Create tasks for this chunk
-            tasks = [
-                download_single_date(session, symbol, date, interval, output_dir)
-                for date in chunk_dates
-            ]
-            
-            # Execute chunk
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Update progress for each completed download
-            for result in results:
+        def finish(item, outcome, nbytes=0):
+            symbol_counts = summary["per_symbol"].setdefault(
+                item.symbol, {"successful": 0, "no_data": 0, "failed": 0}
+            )
+            summary[outcome] += 1
+            symbol_counts[outcome] += 1
+            progress.file_done(item, nbytes)
+        
+        async def next_item():
+            """Due retries first, then fresh work; None once everything is settled."""
+            nonlocal stopped
+            while True:
+                if not stopped and not await pool.wait_until_available(TERMINAL_DOWN_TIMEOUT):
+                    if not stopped:
+                        print(f"\n🛑 No Theta Terminal reachable after {TERMINAL_DOWN_TIMEOUT:.0f}s - stopping")
+                        stopped = True
+                        await pool.close()
+                if stopped:
+                    return None
+                item = retry_queue.pop_due()
+                if item is None:
+                    try:
+                        item = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        pass
+                if item is not None:
+                    return item
+                if not retry_queue and in_flight == 0:
+                    return None
+                # Wait for a backoff to expire or an in-flight item to settle
+                wait = retry_queue.seconds_until_next()
+                await asyncio.sleep(min(wait, 0.5) if wait is not None else 0.5)
+        
+        async def ingest(item, source_bytes):
+            """Index and/or convert one completed day to Parquet and record it."""
+            loop = asyncio.get_running_loop()
+            csv_path = day_file_path(item.output_dir, item.symbol, item.date, item.interval,
+                                     resolve_codec(COMPRESS_OUTPUT))
+            if index_inline:
+                try:
+                    await loop.run_in_executor(ingest_executor, csv_index.build_index,
+                                               str(csv_path), CSV_INDEX_BUCKET_MINUTES)
+                except Exception as e:
+                    logger.warning(f"❌ {item.symbol} {item.date}: CSV indexing failed - {e}")
+                else:
+                    summary["indexed"] += 1
+            if not PARQUET_INGEST:
+                return
+            try:
+                result = await loop.run_in_executor(
+                    ingest_executor, parquet_ingest.ingest_day, str(csv_path), item.symbol,
+                    item.date, item.interval, PARQUET_DIR, PARQUET_ROW_GROUP_ROWS,
+                    PARQUET_DELETE_CSV
+                )
+            except Exception as e:
+                logger.warning(f"❌ {item.symbol} {item.date}: Parquet ingest failed - {e}")
+                return
+            if manifest is not None:
+                manifest.record_parquet(item.symbol, item.interval, item.date, result["path"],
+                                        result["rows"], result["bytes"], source_bytes)
+            summary["ingested"] += 1
+        
+        async def worker(worker_id):
+            while True:
+                item = await next_item()
+                if item is None:
+                    return
+                await run_item(worker_id, item)
+        
+        async def run_item(worker_id, item):
+            nonlocal in_flight
+            in_flight += 1
+            try:
+                request_stats = {}
+                wait_start = time.time()
+                async with pool.acquire(expected_bytes.get(item)) as endpoint:
+                    if endpoint is None:
+                        # Pool closed while waiting; counted as failed below
+                        retry_queue.push(item, 0)
+                        return
+                    started = time.time()
+                    request_stats["queue_wait"] = started - wait_start
+                    progress.start_request(request_stats)
+                    try:
+                        result = await download_single_date(
+                            session, item.symbol, item.date, item.interval, item.output_dir,
+                            manifest, request_stats, base_url=endpoint.base_url,
+                            extra_slot=lambda: pool.acquire_on(endpoint)
+                        )
+                    except Exception as e:
+                        logger.warning(f"💥 {item.symbol} {item.date}: Worker {worker_id} error - {str(e)}")
+                        result = False
+                        request_stats.setdefault("failure", OTHER)
+                    finally:
+                        progress.end_request(request_stats)
+                    duration = time.time() - started
+                    summary["worker_busy"][worker_id] += duration
+                    if "ttfb" in request_stats:
+                        request_stats["transfer"] = max(0.0, duration - request_stats["ttfb"])
+                    
+                    # Feedback before the slot is released so a new limit applies at once
+                    kind = request_stats.get("failure")
+                    if result is True:
+                        endpoint.record_success(request_stats.get("ttfb"), request_stats.get("bytes", 0))
+                        pool.record_size(request_stats.get("bytes", 0))
+                    elif kind:
+                        endpoint.record_failure(kind)
+                
+                attempt = attempts.get(item, 0) + 1
+                telemetry.record(item, endpoint.host, "complete" if result is True else kind or OTHER,
+                                 request_stats, attempt)
                 if result is True:
-                    successful_downloads += 1
-                progress.update(1)
+                    finish(item, "successful", request_stats.get("bytes", 0))
+                    if market_cal is not None:
+                        market_cal.clear_no_data_date(item.date, item.symbol)
+                    if ingest_executor is not None:
+                        ingest_tasks.append(asyncio.create_task(
+                            ingest(item, request_stats.get("bytes"))
+                        ))
+                elif kind == NO_DATA:
+                    finish(item, "no_data")
+                    if market_cal is not None:
+                        market_cal.mark_no_data_date(item.date, item.symbol)
+                else:
+                    action, delay = retry_policy.decide(kind, attempt)
+                    if action == PAUSE:
+                        # Terminal down: fail over without spending an attempt
+                        retry_queue.push(item, 0)
+                        pool.mark_down(endpoint, session)
+                    elif action == RETRY:
+                        attempts[item] = attempt
+                        summary["retried"] += 1
+                        logger.info(f"🔁 {item.symbol} {item.date}: {kind}, retry {attempt} in {delay:.1f}s")
+                        retry_queue.push(item, delay)
+                    else:
+                        logger.warning(f"❌ {item.symbol} {item.date}: Giving up after {attempt} "
+                                       f"attempt(s) ({kind})")
+                        finish(item, "failed")
+            finally:
+                in_flight -= 1
+        
+        run_start = time.time()
+        limit_seconds_start = pool.limit_seconds
+        try:
+            await asyncio.gather(*(worker(i) for i in range(workers)))
+            if ingest_tasks:
+                await asyncio.gather(*ingest_tasks)
+        finally:
+            if ingest_executor is not None:
+                ingest_executor.shutdown(wait=True, cancel_futures=True)
+            await pool.close()
+            await telemetry.close()
+            await progress.stop()
+        summary["elapsed"] = time.time() - run_start
+        summary["limit_seconds"] = pool.limit_seconds - limit_seconds_start
         
-        # Final newline and summary
-        print(f"\n✅ Download complete! {successful_downloads} files downloaded to {output_dir}")
+        # Anything left when the run was stopped counts as failed
+        for item in retry_queue.drain():
+            finish(item, "failed")
+        while not queue.empty():
+            finish(queue.get_nowait(), "failed")
+    
+    pool.save()
+    summary["terminals"] = pool.get_status_summary()
+    print_terminal_summary(pool)
+    telemetry.print_summary()
+    if PARQUET_INGEST:
+        print(f"🗜️  {summary['ingested']} days ingested to Parquet under {PARQUET_DIR}")
+    if index_inline:
+        print(f"🗂️  {summary['indexed']} day CSVs indexed")
+    return summary
+
+def print_terminal_summary(pool):
+    """Print how the work was shared between terminals."""
+    print()
+    for endpoint in pool.endpoints:
+        state = "up" if endpoint.healthy else "down"
+        print(f"🖥️  {endpoint.host}: {endpoint.completed} days, "
+              f"{endpoint.bytes_downloaded / 1024 / 1024:,.0f} MB, {endpoint.failures} failures, "
+              f"concurrency {endpoint.limit} ({state})")
+
+async def download_date_range(symbol, start_date, end_date, interval, output_dir, manifest=None):
+    """Download options data for a date range."""
+    if manifest is None:
+        manifest = DownloadManifest(MANIFEST_PATH)
+    
+    market_cal = MarketCalendar()
+    coverage = None
+    if DISCOVER_BOUNDARIES:
+        coverage = (await discover_boundaries([symbol], market_cal)).get(symbol)
+    work_items = plan_symbol_work(symbol, start_date, end_date, interval, output_dir, manifest,
+                                  market_cal, coverage)
+    if not work_items:
+        print(f"✅ {symbol}: Nothing to download")
+        return
+    
+    summary = await download_work_items(work_items, manifest, market_cal=market_cal)
+    
+    # Final newline and summary
+    print(f"\n✅ Download complete! {summary['successful']} files downloaded to {output_dir}")
+    if summary["no_data"] or summary["failed"]:
+        print(f"   {summary['no_data']} days without data, {summary['failed']} failed "
+              f"after retries ({summary['retried']} retries)")
+    print_worker_utilization(summary["worker_busy"], summary["elapsed"], summary["limit_seconds"])
+    return summary
+
+def print_worker_utilization(worker_busy, elapsed, limit_seconds=None):
+    """
+    Print how much of the run each worker slot spent on a request.
+
+    There is one worker per slot of pool capacity (ADAPTIVE_MAX_CONCURRENT
+    per terminal when adaptive), so with ``limit_seconds`` (from
+    TerminalPool.limit_seconds) busy time is also given against the
+    concurrency limit actually in force.
+    """
+    if elapsed <= 0:
+        return
+    print(f"🧵 Worker utilization over {elapsed:.1f}s:")
+    for worker_id, busy in enumerate(worker_busy):
+        print(f"   Worker {worker_id}: {busy / elapsed * 100:.1f}% busy ({busy:.1f}s)")
+    total_busy = sum(worker_busy)
+    if limit_seconds:
+        print(f"   Concurrency limit in use: {total_busy / limit_seconds * 100:.1f}% "
+              f"(average limit {limit_seconds / elapsed:.1f})")
+    overall = total_busy / (elapsed * len(worker_busy))
+    print(f"   Capacity in use: {overall * 100:.1f}% of {len(worker_busy)} slots")
 
 def main():
     """Main function."""
+    setup_logging(LOG_LEVEL)
     print("🚀 Simple Theta Data Downloader")
     print(f"   Symbol: {SYMBOL}")
     print(f"   Date Range: {START_DATE} to {END_DATE}")
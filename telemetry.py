@@ -0,0 +1,297 @@
+"""
+Request Telemetry for Theta Data Downloader
+
+Per-request timings (slot wait, connect, time-to-first-byte, transfer,
+disk write), bytes and outcome, aggregated into histograms that are served
+live in Prometheus text format and appended to a JSONL log. Together with
+an event-loop lag probe this tells whether a long backfill is bound by the
+terminal, the disk or the client itself.
+"""
+
+import asyncio
+import bisect
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_FILE = "results/request_metrics.jsonl"
+
+# Histogram bucket upper bounds
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+BYTES_BUCKETS = [1024 * 1024 * mb for mb in (1, 5, 10, 25, 50, 100, 200, 400, 800)]
+
+# Timings recorded for every request: (stats key, metric name, help text)
+TIMINGS = [
+    ("queue_wait", "theta_request_queue_wait_seconds", "Time waiting for a terminal slot"),
+    ("connect", "theta_request_connect_seconds", "Time opening a new connection (0 when reused)"),
+    ("ttfb", "theta_request_ttfb_seconds", "Time from sending the request to the response headers"),
+    ("transfer", "theta_request_transfer_seconds", "Time from the response headers to the end of the body"),
+    ("write", "theta_request_write_seconds", "Time spent writing and fsyncing the day file"),
+]
+
+LOOP_LAG_INTERVAL = 0.25       # Seconds between event loop lag samples
+LOG_FLUSH_INTERVAL = 1.0       # Flush the JSONL log at most this often
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, name: str, help_text: str, buckets: List[float]):
+        self.name = name
+        self.help_text = help_text
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (approximate)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum:.6f}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+def _label_string(labels: Dict[str, str]) -> str:
+    return ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+
+class Telemetry:
+    """
+    Collects per-request metrics for one download run.
+
+    Workers put timings into their ``request_stats`` dict (the aiohttp
+    trace from ``trace_config()`` adds connect time) and hand it to
+    ``record()`` once the request is settled.
+    """
+
+    def __init__(self, log_file: Optional[str] = DEFAULT_LOG_FILE, pool=None):
+        self.pool = pool
+        self.histograms = {
+            key: Histogram(name, help_text, SECONDS_BUCKETS) for key, name, help_text in TIMINGS
+        }
+        self.histograms["bytes"] = Histogram(
+            "theta_request_body_bytes", "Response body size of completed days", BYTES_BUCKETS
+        )
+        self.loop_lag = Histogram(
+            "theta_event_loop_lag_seconds", "Event loop scheduling delay", SECONDS_BUCKETS
+        )
+        self.outcomes = {}
+        self.bytes_total = {}
+        self.started = time.time()
+
+        self.log_file = log_file
+        self._log = None
+        self._last_flush = 0.0
+        if log_file:
+            os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+            self._log = open(log_file, "a")
+
+        self._runner = None
+        self._lag_task = None
+
+    # ------------------------------------------------------------------
+    # Collection
+    # ------------------------------------------------------------------
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """aiohttp trace hooks that put connect time into ``request_stats``."""
+        trace = aiohttp.TraceConfig()
+
+        async def on_create_start(session, ctx, params):
+            ctx.connect_start = time.perf_counter()
+
+        async def on_create_end(session, ctx, params):
+            stats = ctx.trace_request_ctx
+            if isinstance(stats, dict):
+                stats["connect"] = stats.get("connect", 0.0) + time.perf_counter() - ctx.connect_start
+
+        async def on_reuse(session, ctx, params):
+            stats = ctx.trace_request_ctx
+            if isinstance(stats, dict):
+                stats.setdefault("connect", 0.0)
+
+        trace.on_connection_create_start.append(on_create_start)
+        trace.on_connection_create_end.append(on_create_end)
+        trace.on_connection_reuseconn.append(on_reuse)
+        return trace
+
+    def record(self, item, terminal: str, outcome: str, stats: dict, attempt: int = 1):
+        """Record one settled request (complete, no_data or a failure kind)."""
+        for key, _, _ in TIMINGS:
+            value = stats.get(key)
+            if value is not None:
+                self.histograms[key].observe(value)
+        nbytes = stats.get("bytes") or 0
+        if outcome == "complete":
+            self.histograms["bytes"].observe(nbytes)
+        self.outcomes[(terminal, outcome)] = self.outcomes.get((terminal, outcome), 0) + 1
+        self.bytes_total[terminal] = self.bytes_total.get(terminal, 0) + nbytes
+
+        if self._log:
+            entry = {
+                "ts": datetime.now().isoformat(timespec="milliseconds"),
+                "symbol": item.symbol,
+                "date": item.date,
+                "interval": item.interval,
+                "terminal": terminal,
+                "attempt": attempt,
+                "outcome": outcome,
+                "http_status": stats.get("http_status"),
+                "bytes": nbytes,
+            }
+            for key, _, _ in TIMINGS:
+                value = stats.get(key)
+                entry[key] = round(value, 6) if value is not None else None
+            self._log.write(json.dumps(entry) + "\n")
+            now = time.time()
+            if now - self._last_flush >= LOG_FLUSH_INTERVAL:
+                self._log.flush()
+                self._last_flush = now
+
+    async def _sample_loop_lag(self):
+        while True:
+            expected = time.perf_counter() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag.observe(max(0.0, time.perf_counter() - expected))
+
+    # ------------------------------------------------------------------
+    # Exposition
+    # ------------------------------------------------------------------
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for histogram in list(self.histograms.values()) + [self.loop_lag]:
+            lines += histogram.render()
+
+        lines.append("# HELP theta_requests_total Settled requests by terminal and outcome")
+        lines.append("# TYPE theta_requests_total counter")
+        for (terminal, outcome), count in sorted(self.outcomes.items()):
+            labels = _label_string({"terminal": terminal, "outcome": outcome})
+            lines.append(f"theta_requests_total{{{labels}}} {count}")
+
+        lines.append("# HELP theta_downloaded_bytes_total Body bytes received by terminal")
+        lines.append("# TYPE theta_downloaded_bytes_total counter")
+        for terminal, nbytes in sorted(self.bytes_total.items()):
+            lines.append(f'theta_downloaded_bytes_total{{terminal="{terminal}"}} {nbytes}')
+
+        if self.pool is not None:
+            gauges = [
+                ("theta_terminal_active_requests", "Requests in flight", lambda e: e.active),
+                ("theta_terminal_concurrency_limit", "Current concurrency limit", lambda e: e.limit),
+                ("theta_terminal_healthy", "1 if the terminal is in rotation", lambda e: int(e.healthy)),
+                ("theta_terminal_outstanding_bytes", "Expected bytes in flight",
+                 lambda e: e.outstanding_bytes),
+            ]
+            for name, help_text, value in gauges:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                for endpoint in self.pool.endpoints:
+                    lines.append(f'{name}{{terminal="{endpoint.host}"}} {value(endpoint)}')
+
+        lines.append("# HELP theta_run_uptime_seconds Seconds since the run started")
+        lines.append("# TYPE theta_run_uptime_seconds gauge")
+        lines.append(f"theta_run_uptime_seconds {time.time() - self.started:.1f}")
+        return "\n".join(lines) + "\n"
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=self.render_prometheus(),
+                            content_type="text/plain", charset="utf-8")
+
+    async def start(self, port: Optional[int] = None, host: str = "127.0.0.1"):
+        """Start the loop lag probe and, with ``port``, the /metrics endpoint."""
+        self._lag_task = asyncio.create_task(self._sample_loop_lag())
+        if port is None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, host, port).start()
+        except OSError as e:
+            print(f"⚠️  Metrics endpoint not started on port {port}: {e}")
+            await self._runner.cleanup()
+            self._runner = None
+            return
+        print(f"📡 Metrics at http://{host}:{port}/metrics")
+
+    async def close(self):
+        if self._lag_task:
+            self._lag_task.cancel()
+            await asyncio.gather(self._lag_task, return_exceptions=True)
+        if self._runner:
+            await self._runner.cleanup()
+        if self._log:
+            self._log.close()
+            self._log = None
+
+    # ------------------------------------------------------------------
+    # Diagnosis
+    # ------------------------------------------------------------------
+
+    def diagnose(self) -> Optional[str]:
+        """Best guess at what limited the run, from mean request timings."""
+        means = {key: histogram.mean for key, histogram in self.histograms.items()}
+        ttfb, transfer, write = means["ttfb"], means["transfer"], means["write"]
+        if ttfb is None or transfer is None:
+            return None
+        lag = self.loop_lag.quantile(0.9) or 0.0
+        if lag >= 0.1:
+            return f"client-bound: event loop lag p90 {lag:.2f}s (CPU or blocking calls)"
+        if write and transfer and write / transfer > 0.5:
+            return f"disk-bound: writing takes {write / transfer * 100:.0f}% of transfer time"
+        queue_wait = means["queue_wait"] or 0.0
+        if queue_wait > ttfb + transfer:
+            return "terminal-bound: requests wait longer for a free terminal slot than they take"
+        if ttfb > transfer:
+            return "terminal-bound: the terminal takes longer to answer than to send"
+        return "network/terminal-bound: most time is spent receiving bodies"
+
+    def print_summary(self):
+        parts = []
+        for key, _, _ in TIMINGS:
+            mean = self.histograms[key].mean
+            if mean is not None:
+                parts.append(f"{key} {mean:.2f}s")
+        if not parts:
+            return
+        print(f"🔬 Mean request timings: {', '.join(parts)}")
+        diagnosis = self.diagnose()
+        if diagnosis:
+            print(f"   Likely bottleneck: {diagnosis}")
+        if self.log_file:
+            print(f"   Per-request log: {self.log_file}")
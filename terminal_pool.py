@@ -0,0 +1,303 @@
+"""
+Terminal Pool for Theta Data Downloader
+
+Spreads downloads across one or more Theta Terminal instances (e.g. one per
+account or host). Each terminal has its own concurrency limit - adaptive
+when ADAPTIVE_CONCURRENCY is on - and its own health status. Requests go to
+the healthy terminal with the fewest bytes in flight, and a terminal that
+stops accepting connections is taken out of rotation until it answers again.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+from adaptive_concurrency import AdaptiveConcurrencyController
+
+logger = logging.getLogger(__name__)
+
+
+class TerminalEndpoint:
+    """One Theta Terminal: base URL, concurrency limit, load and health."""
+
+    def __init__(self, base_url: str, max_limit: int,
+                 controller: Optional[AdaptiveConcurrencyController] = None):
+        self.base_url = base_url.rstrip("/")
+        self.host = urlparse(self.base_url).netloc
+        self.max_limit = max_limit
+        self.controller = controller
+
+        self.active = 0
+        self.outstanding_bytes = 0
+        self.healthy = True
+        self.down_since = None
+
+        self.completed = 0
+        self.failures = 0
+        self.bytes_downloaded = 0
+
+    @property
+    def limit(self) -> int:
+        return self.controller.limit if self.controller else self.max_limit
+
+    def has_capacity(self) -> bool:
+        return self.healthy and self.active < self.limit
+
+    def record_success(self, ttfb: Optional[float], nbytes: int):
+        self.completed += 1
+        self.bytes_downloaded += nbytes
+        if self.controller:
+            self.controller.record_success(ttfb, nbytes)
+
+    def record_failure(self, kind: str):
+        self.failures += 1
+        if self.controller:
+            self.controller.record_failure(kind)
+
+    def get_status_summary(self) -> dict:
+        summary = {
+            "base_url": self.base_url,
+            "limit": self.limit,
+            "healthy": self.healthy,
+            "completed": self.completed,
+            "failures": self.failures,
+            "bytes": self.bytes_downloaded,
+        }
+        if self.controller:
+            summary["concurrency"] = self.controller.get_status_summary()
+        return summary
+
+
+class TerminalPool:
+    """
+    Route requests across several terminals by least outstanding bytes.
+
+    Workers wrap each request in ``async with pool.acquire(expected) as
+    endpoint:`` and send it to ``endpoint.base_url``. A slot is only handed
+    out on a healthy terminal below its limit; among those the one with the
+    fewest expected bytes in flight wins, so one terminal busy with a few
+    huge days keeps receiving less work than an idle one.
+    """
+
+    def __init__(self, terminals: List, max_concurrent: int, adaptive: bool = False,
+                 min_concurrent: int = 1, initial: Optional[int] = None,
+                 probe_interval: float = 5.0):
+        """
+        Args:
+            terminals: Base URLs, or (base_url, max_concurrent) tuples for
+                terminals whose subscription allows a different limit
+            max_concurrent: Default per-terminal limit
+        """
+        self.endpoints = []
+        for entry in terminals:
+            base_url, limit = (entry, max_concurrent) if isinstance(entry, str) else entry
+            controller = None
+            if adaptive:
+                controller = AdaptiveConcurrencyController(
+                    urlparse(base_url).netloc,
+                    min_limit=min_concurrent,
+                    max_limit=limit,
+                    initial=initial,
+                )
+            self.endpoints.append(TerminalEndpoint(base_url, limit, controller))
+        if not self.endpoints:
+            raise ValueError("TerminalPool needs at least one terminal")
+
+        self.probe_interval = probe_interval
+        self.closed = False
+        self._cond = asyncio.Condition()
+        self._monitors = {}
+        self._sized_requests = 0
+        self._sized_bytes = 0
+        self._limit_seconds = 0.0
+        self._accounted_at = time.monotonic()
+        self._accounted_limit = self._open_limit()
+
+    @property
+    def capacity(self) -> int:
+        """Most requests the pool can ever have in flight at once."""
+        return sum(endpoint.max_limit for endpoint in self.endpoints)
+
+    @property
+    def limit_seconds(self) -> float:
+        """
+        Concurrency limit of the healthy terminals integrated over time,
+        in slot-seconds: what busy time is measured against once adaptive
+        limits sit below ``capacity``.
+        """
+        self._account()
+        return self._limit_seconds
+
+    def _open_limit(self) -> int:
+        return sum(endpoint.limit for endpoint in self.endpoints if endpoint.healthy)
+
+    def _account(self):
+        """Charge the time since the last change at the limit then in force."""
+        now = time.monotonic()
+        self._limit_seconds += (now - self._accounted_at) * self._accounted_limit
+        self._accounted_at = now
+        self._accounted_limit = self._open_limit()
+
+    def any_healthy(self) -> bool:
+        return any(endpoint.healthy for endpoint in self.endpoints)
+
+    def typical_bytes(self) -> int:
+        """Mean completed size, used as the cost of days with no size history."""
+        if not self._sized_requests:
+            return 1
+        return self._sized_bytes // self._sized_requests
+
+    def _pick(self) -> Optional[TerminalEndpoint]:
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.has_capacity()]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda e: (e.outstanding_bytes, e.active / e.limit))
+
+    # ------------------------------------------------------------------
+    # Slot gating
+    # ------------------------------------------------------------------
+
+    @asynccontextmanager
+    async def acquire(self, expected_bytes: Optional[int] = None):
+        """
+        Hold a request slot on the least-loaded healthy terminal.
+
+        Yields the TerminalEndpoint, or None if the pool was closed while
+        waiting (e.g. every terminal stayed down too long).
+        """
+        cost = expected_bytes or self.typical_bytes()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.closed or self._pick() is not None)
+            if self.closed:
+                endpoint = None
+            else:
+                endpoint = self._pick()
+                endpoint.active += 1
+                endpoint.outstanding_bytes += cost
+                self._account()
+        if endpoint is None:
+            yield None
+            return
+        try:
+            yield endpoint
+        finally:
+            async with self._cond:
+                endpoint.active -= 1
+                endpoint.outstanding_bytes -= cost
+                # Limits may also have moved with the feedback just recorded
+                self._account()
+                self._cond.notify_all()
+
+    @asynccontextmanager
+    async def acquire_on(self, endpoint: TerminalEndpoint):
+        """
+        Hold one more slot on a terminal a request already holds a slot on,
+        e.g. for the extra sub-requests of a split day.
+
+        The bytes are already counted by the holder's own slot, so only the
+        request count grows. Raises RuntimeError if the pool is closed while
+        waiting.
+        """
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.closed or endpoint.has_capacity())
+            if self.closed:
+                raise RuntimeError("terminal pool closed")
+            endpoint.active += 1
+        try:
+            yield endpoint
+        finally:
+            async with self._cond:
+                endpoint.active -= 1
+                self._cond.notify_all()
+
+    def record_size(self, nbytes: int):
+        """Feed a completed day's size into the default request cost."""
+        self._sized_requests += 1
+        self._sized_bytes += nbytes
+
+    # ------------------------------------------------------------------
+    # Health
+    # ------------------------------------------------------------------
+
+    def mark_down(self, endpoint: TerminalEndpoint, session):
+        """Take a terminal out of rotation and poll it until it is back."""
+        if not endpoint.healthy:
+            return
+        endpoint.healthy = False
+        endpoint.down_since = time.time()
+        self._account()
+        others = sum(1 for e in self.endpoints if e.healthy)
+        if others:
+            print(f"\n⏸️  Theta Terminal at {endpoint.base_url} is unreachable - "
+                  f"failing over to {others} other terminal(s)")
+        else:
+            print(f"\n⏸️  Theta Terminal at {endpoint.base_url} is unreachable - pausing queue")
+        self._monitors[endpoint.base_url] = asyncio.create_task(self._monitor(endpoint, session))
+
+    async def _monitor(self, endpoint: TerminalEndpoint, session):
+        """Any HTTP response means the terminal is back."""
+        while not self.closed:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                async with session.get(endpoint.base_url,
+                                       timeout=aiohttp.ClientTimeout(total=10)) as response:
+                    await response.read()
+            except aiohttp.ClientConnectorError:
+                continue
+            except Exception:
+                # Timeouts etc. still mean something is listening
+                pass
+            down_for = time.time() - endpoint.down_since
+            print(f"\n▶️  Theta Terminal at {endpoint.base_url} is back after {down_for:.0f}s")
+            async with self._cond:
+                endpoint.healthy = True
+                endpoint.down_since = None
+                self._account()
+                self._cond.notify_all()
+            return
+
+    async def wait_until_available(self, max_wait: float) -> bool:
+        """
+        Block while every terminal is down.
+
+        Returns:
+            False if none came back within ``max_wait`` seconds
+        """
+        if self.any_healthy():
+            return True
+        async with self._cond:
+            try:
+                await asyncio.wait_for(
+                    self._cond.wait_for(lambda: self.closed or self.any_healthy()), max_wait
+                )
+            except asyncio.TimeoutError:
+                return False
+        return self.any_healthy()
+
+    async def close(self):
+        """Stop health monitors and release any worker waiting for a slot."""
+        self.closed = True
+        for task in self._monitors.values():
+            task.cancel()
+        await asyncio.gather(*self._monitors.values(), return_exceptions=True)
+        self._monitors.clear()
+        async with self._cond:
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def save(self):
+        """Persist learned concurrency levels for every adaptive terminal."""
+        for endpoint in self.endpoints:
+            if endpoint.controller:
+                endpoint.controller.save()
+
+    def get_status_summary(self) -> List[dict]:
+        return [endpoint.get_status_summary() for endpoint in self.endpoints]
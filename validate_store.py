@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Integrity Validation and Repair for the Day File Store
+
+At download time a day only has to be more than a header. This pass checks
+the files already in the store, in a process pool, for problems that slip
+through or appear later:
+
+- the file is readable (including .zst/.gz) with the expected columns,
+  has data rows and ends in a complete line
+- timestamps belong to the file's date, fall within the session (early
+  closes included, from MarketCalendar.session_minutes, plus the symbol's
+  SESSION_CLOSE_GRACE_MINUTES) and increase within every contract
+- the row count is close to contracts x bars per session
+
+Each result is recorded in the manifest with the file's size and mtime, so
+files unchanged since their last check are skipped. Days that fail are
+marked failed in the manifest, which queues them for the next download run;
+with --repair they are re-downloaded straight away.
+
+    python validate_store.py                 # every symbol in the manifest
+    python validate_store.py QQQ SPY --repair
+"""
+
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from parquet_ingest import open_csv_batches
+
+VALID = "ok"
+INVALID = "failed"
+
+# Bars per contract may fall short of the full session by this fraction
+# (contracts listed or first quoted during the day)
+MIN_ROW_RATIO = 0.98
+
+KEY_COLUMNS = ["expiration", "strike", "right", "timestamp"]
+
+
+def interval_minutes(interval: str) -> Optional[int]:
+    """Bar length in minutes ("5m" -> 5, "1h" -> 60), or None for EOD."""
+    if interval.lower() == "eod":
+        return None
+    unit = interval[-1].lower()
+    return int(interval[:-1]) * (60 if unit == "h" else 1)
+
+
+class _TailTracker:
+    """Decompressing reader that remembers the last byte the parser read."""
+
+    def __init__(self, path):
+        self._f = pa.input_stream(str(path), compression="detect")
+        self.last_byte = b""
+        self.closed = False
+
+    def read(self, size=-1):
+        data = self._f.read(size if size is not None and size >= 0 else None)
+        if data:
+            self.last_byte = data[-1:]
+        return data
+
+    def readable(self):
+        return True
+
+    def close(self):
+        self._f.close()
+        self.closed = True
+
+
+def validate_day(path: str, date: str, interval: str,
+                 session: Optional[tuple] = None, close_grace: int = 0) -> dict:
+    """
+    Check one day file (process pool entry point).
+
+    Args:
+        session: (open, close) in minutes after midnight, or None to skip
+            the session-hours and row-count checks
+        close_grace: Minutes past the close that quotes are still expected
+            (the row-count check keeps using the regular session)
+
+    Returns:
+        Dict with status, problems (list of strings), rows and contracts
+    """
+    problems = []
+    rows = 0
+    contracts = set()
+    out_of_session = 0
+    wrong_date = 0
+    out_of_order = 0
+
+    tracker = None
+    try:
+        tracker = _TailTracker(path)
+        reader = open_csv_batches(tracker, KEY_COLUMNS)
+        day_ms = int(np.datetime64(date, "ms").astype(np.int64))
+        previous = None
+        for batch in reader:
+            n = batch.num_rows
+            if not n:
+                continue
+            expiration = batch.column("expiration").cast(pa.int32()).to_numpy(zero_copy_only=False)
+            strike = batch.column("strike").to_numpy(zero_copy_only=False)
+            call = pc.equal(batch.column("right"), "CALL").to_numpy(zero_copy_only=False)
+            timestamp = batch.column("timestamp").cast(pa.int64()).to_numpy(zero_copy_only=False)
+
+            same = np.zeros(n, dtype=bool)
+            same[1:] = ((expiration[1:] == expiration[:-1]) & (strike[1:] == strike[:-1])
+                        & (call[1:] == call[:-1]))
+            step = np.zeros(n, dtype=np.int64)
+            step[1:] = np.diff(timestamp)
+            if previous is not None and previous[:3] == (expiration[0], strike[0], call[0]):
+                same[0] = True
+                step[0] = timestamp[0] - previous[3]
+            out_of_order += int(np.count_nonzero(same & (step <= 0)))
+
+            starts = np.flatnonzero(~same)
+            contracts.update(zip(expiration[starts].tolist(), strike[starts].tolist(),
+                                 call[starts].tolist()))
+
+            offset = timestamp - day_ms
+            wrong_date += int(np.count_nonzero((offset < 0) | (offset >= 24 * 60 * 60 * 1000)))
+            if session is not None:
+                minute = offset // 60000
+                out_of_session += int(np.count_nonzero(
+                    (minute < session[0]) | (minute > session[1] + close_grace)
+                ))
+
+            previous = (expiration[-1], strike[-1], call[-1], timestamp[-1])
+            rows += n
+    except (pa.ArrowInvalid, OSError, ValueError, KeyError) as e:
+        problems.append(f"unreadable: {str(e).splitlines()[0]}")
+    finally:
+        if tracker is not None:
+            tracker.close()
+
+    if not problems:
+        if tracker.last_byte != b"\n":
+            problems.append("truncated: last line is incomplete")
+        if not rows:
+            problems.append("empty: header only")
+        if wrong_date:
+            problems.append(f"{wrong_date} rows dated outside {date}")
+        if out_of_session:
+            problems.append(f"{out_of_session} rows outside session hours")
+        if out_of_order:
+            problems.append(f"{out_of_order} rows out of time order within their contract")
+        minutes = interval_minutes(interval)
+        if session is not None and rows and contracts:
+            bars = 1 if minutes is None else -(-(session[1] - session[0]) // minutes)
+            expected = len(contracts) * bars
+            if rows < expected * MIN_ROW_RATIO:
+                problems.append(f"short: {rows} rows for {len(contracts)} contracts "
+                                f"x {bars} bars ({rows / expected:.0%})")
+
+    return {
+        "status": INVALID if problems else VALID,
+        "problems": problems,
+        "rows": rows,
+        "contracts": len(contracts),
+    }
+
+
+def validate_symbol(manifest, market_cal, symbol: str, interval: str,
+                    workers: Optional[int] = None, recheck: bool = False,
+                    close_grace: int = 0) -> List[dict]:
+    """
+    Validate every complete day of a symbol changed since its last check.
+
+    Failed days are marked failed in the manifest (queueing a re-download).
+
+    Args:
+        close_grace: Minutes past the close the symbol's options keep quoting
+
+    Returns:
+        Manifest rows of the days that failed
+    """
+    from download_manifest import STATUS_FAILED
+
+    previous = {} if recheck else manifest.validations(symbol, interval)
+    pending = []
+    skipped = 0
+    missing = []
+    for day in manifest.day_files(symbol, interval):
+        path = day["path"]
+        try:
+            stat = os.stat(path) if path else None
+        except FileNotFoundError:
+            stat = None
+        if stat is None:
+            missing.append(day)
+            continue
+        last = previous.get(day["date"])
+        if (last and last["status"] == VALID and last["path"] == path
+                and last["bytes"] == stat.st_size and last["mtime_ns"] == stat.st_mtime_ns):
+            skipped += 1
+            continue
+        pending.append((day, stat))
+
+    failed = []
+    for day in missing:
+        # Removed or moved since it was downloaded
+        if day.get("parquet_path"):
+            continue
+        print(f"❌ {symbol} {day['date']}: missing - {day['path']}")
+        manifest.set_status(symbol, interval, day["date"], STATUS_FAILED)
+        failed.append(day)
+
+    if not pending:
+        print(f"✅ {symbol}: {skipped} days unchanged since their last check")
+        return failed
+
+    print(f"🔍 {symbol}: Checking {len(pending)} {interval} days ({skipped} unchanged)...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(validate_day, day["path"], day["date"], interval,
+                        market_cal.session_minutes(day["date"]), close_grace): (day, stat)
+            for day, stat in pending
+        }
+        for future in as_completed(futures):
+            day, stat = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"status": INVALID, "problems": [f"check crashed: {e}"], "rows": None}
+            manifest.record_validation(symbol, interval, day["date"], day["path"], stat.st_size,
+                                       stat.st_mtime_ns, result["status"],
+                                       "; ".join(result["problems"]) or None, result["rows"])
+            if result["status"] == INVALID:
+                print(f"❌ {symbol} {day['date']}: {'; '.join(result['problems'])}")
+                manifest.set_status(symbol, interval, day["date"], STATUS_FAILED)
+                failed.append(day)
+
+    print(f"{'⚠️ ' if failed else '✅'} {symbol}: {len(pending) - len(failed)} days valid, "
+          f"{len(failed)} queued for re-download")
+    return failed
+
+
+async def repair(failed_days, manifest, market_cal, interval: str):
+    """Re-download failed days in place through the normal download engine."""
+    from simple_downloader import WorkItem, download_work_items, interleave_work_items
+
+    per_symbol = {}
+    for symbol, day in failed_days:
+        output_dir = Path(day["path"]).parent
+        per_symbol.setdefault(symbol, []).append(WorkItem(symbol, day["date"], interval, output_dir))
+    work_items = interleave_work_items(list(per_symbol.values()))
+    print(f"\n🔧 Re-downloading {len(work_items)} days...")
+    return await download_work_items(work_items, manifest, market_cal=market_cal)
+
+
+def main():
+    from download_manifest import DownloadManifest
+    from market_calendar import MarketCalendar
+    from progress import setup_logging
+    from simple_config import INTERVAL, LOG_LEVEL, MANIFEST_PATH, SESSION_CLOSE_GRACE_MINUTES
+
+    parser = argparse.ArgumentParser(description="Validate day files and queue bad days for re-download")
+    parser.add_argument("symbols", nargs="*", help="Default: every symbol in the manifest")
+    parser.add_argument("--interval", default=INTERVAL)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--close-grace", type=int, default=None,
+                        help="Minutes past the close to accept quotes for every symbol "
+                             "(default: SESSION_CLOSE_GRACE_MINUTES per symbol)")
+    parser.add_argument("--recheck", action="store_true",
+                        help="Check every file, even if unchanged since its last check")
+    parser.add_argument("--repair", action="store_true",
+                        help="Re-download failed days now instead of on the next run")
+    args = parser.parse_args()
+    setup_logging(LOG_LEVEL)
+
+    market_cal = MarketCalendar()
+    with DownloadManifest(MANIFEST_PATH) as manifest:
+        symbols = args.symbols or manifest.symbols(args.interval)
+        failed = []
+        for symbol in symbols:
+            close_grace = args.close_grace
+            if close_grace is None:
+                close_grace = SESSION_CLOSE_GRACE_MINUTES.get(symbol, 0)
+            failed += [(symbol, day) for day in validate_symbol(
+                manifest, market_cal, symbol, args.interval, args.workers, args.recheck,
+                close_grace
+            )]
+        print(f"\n📊 {len(failed)} days failed validation across {len(symbols)} symbols")
+        if failed and args.repair:
+            asyncio.run(repair(failed, manifest, market_cal, args.interval))
+        elif failed:
+            print("   They will be downloaded again on the next downloader run "
+                  "(or re-run with --repair)")
+
+
+if __name__ == "__main__":
+    main()